@@ -0,0 +1,151 @@
+"""
+Benchmark: parsing of the dates in the files downloaded from banks.
+
+For each bank, writes a download of 100,000 transactions and compares the time spent reading it
+with a per-value `strptime` date parser (as done before `finance_toolkit.dates`) and with the
+current reader of the bank.
+
+Usage:
+  python -m benchmarks.date_parsing
+"""
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pandas as pd
+
+from finance_toolkit.bnp import BnpAccount, BnpTransactionPipeline
+from finance_toolkit.caisse_epargne import CaisseEpargneAccount, CaisseEpargneTransactionPipeline
+from finance_toolkit.fortuneo import FortuneoAccount, FortuneoTransactionPipeline
+from finance_toolkit.models import Configuration, ExchangeRateConfig
+
+ROWS = 100_000
+# a download usually covers a few months of transactions
+DAYS = 90
+
+
+def new_configuration(root_dir: Path) -> Configuration:
+    return Configuration(
+        accounts=[],
+        categories=[],
+        categories_to_rename={},
+        autocomplete=[],
+        download_dir=root_dir,
+        root_dir=root_dir,
+        exchange_rate_cfg=ExchangeRateConfig(watched_currencies=[]),
+    )
+
+
+def new_dates(date_format: str):
+    start = datetime(2019, 1, 1)
+    return [(start + timedelta(days=i % DAYS)).strftime(date_format) for i in range(ROWS)]
+
+
+def strptime_parser(date_format: str):
+    return lambda s: datetime.strptime(s, date_format)
+
+
+def write_bnp(path: Path):
+    lines = ["Compte de chèques;Compte de chèques;****1234;31/03/2019;;1 000,00"]
+    lines += [f"{d};;;LABEL {i % 100};-12,34" for i, d in enumerate(new_dates("%d/%m/%Y"))]
+    path.write_text("\n".join(lines) + "\n", encoding="ISO-8859-1")
+
+
+def legacy_bnp(path: Path):
+    pd.read_csv(
+        path,
+        date_parser=strptime_parser("%d/%m/%Y"),
+        decimal=",",
+        delimiter=";",
+        encoding="ISO-8859-1",
+        names=["Date", "bnpMainCategory", "bnpSubCategory", "Label", "Amount"],
+        parse_dates=["Date"],
+        skipinitialspace=True,
+        skiprows=1,
+        thousands=" ",
+    )
+
+
+def write_caisse_epargne(path: Path):
+    lines = [
+        "Date de comptabilisation;Libelle simplifie;Libelle operation;Reference;"
+        "Informations complementaires;Type operation;Categorie;Sous categorie;Debit;Credit;"
+        "Date operation;Date de valeur;Pointage operation"
+    ]
+    lines += [
+        f"{d};LABEL;CB LABEL {i % 100};;;Carte bancaire;Alimentation;Restaurant;-12,34;;{d};{d};0"
+        for i, d in enumerate(new_dates("%d/%m/%Y"))
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding="ISO-8859-1")
+
+
+def legacy_caisse_epargne(path: Path):
+    pd.read_csv(
+        path,
+        date_parser=strptime_parser("%d/%m/%Y"),
+        decimal=",",
+        delimiter=";",
+        encoding="ISO-8859-1",
+        parse_dates=["Date de comptabilisation", "Date operation", "Date de valeur"],
+        skipinitialspace=True,
+    )
+
+
+def write_fortuneo(path: Path):
+    lines = ["Date opération;Date valeur;libellé;Débit;Crédit;"]
+    lines += [
+        f"{d};{d};CARTE LABEL {i % 100};-12,34;;" for i, d in enumerate(new_dates("%d/%m/%Y"))
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding="UTF-8")
+
+
+def legacy_fortuneo(path: Path):
+    tx = pd.read_csv(
+        path, decimal=",", delimiter=";", encoding="UTF-8", skipinitialspace=True, thousands=" "
+    )
+    tx.columns = ["Date opération", "Date valeur", "libellé", "Débit", "Crédit", "empty"]
+    tx["Date opération"].apply(lambda s: pd.to_datetime(s, format="%d/%m/%Y"))
+    tx["Date valeur"].apply(lambda s: pd.to_datetime(s, format="%d/%m/%Y"))
+    tx.astype({"Date opération": "datetime64", "Date valeur": "datetime64"})
+
+
+def measure(fn, path: Path) -> float:
+    start = time.perf_counter()
+    fn(path)
+    return time.perf_counter() - start
+
+
+def main():
+    with TemporaryDirectory() as tmp:
+        root_dir = Path(tmp)
+        cfg = new_configuration(root_dir)
+        bnp = BnpTransactionPipeline(BnpAccount("CHQ", "user-BNP-CHQ", "****1234"), cfg)
+        caisse_epargne = CaisseEpargneTransactionPipeline(
+            CaisseEpargneAccount("CHQ", "user-CEP-CHQ", "12345678"), cfg
+        )
+        fortuneo = FortuneoTransactionPipeline(
+            FortuneoAccount("CHQ", "user-FTN-CHQ", "12345"), cfg
+        )
+        banks = [
+            ("BNP", write_bnp, legacy_bnp, bnp.read_new_transactions),
+            (
+                "Caisse d'Epargne",
+                write_caisse_epargne,
+                legacy_caisse_epargne,
+                caisse_epargne.read_new_transactions,
+            ),
+            ("Fortuneo", write_fortuneo, legacy_fortuneo, fortuneo.read_new_transactions),
+        ]
+
+        print(f"{'bank':<18} {'rows':>8} {'strptime':>10} {'current':>10} {'speedup':>8}")
+        for name, write, legacy, current in banks:
+            path = root_dir / f"{name}.csv"
+            write(path)
+            t1 = measure(legacy, path)
+            t2 = measure(current, path)
+            print(f"{name:<18} {ROWS:>8} {t1:>9.3f}s {t2:>9.3f}s {t1 / t2:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: scaling of the merge of monthly transactions and balances.
+
+Merges from 100 to 5,000 input files and prints the time spent per file, which should remain
+roughly constant if the merge scales linearly with the number of files.
+
+Usage:
+  python -m benchmarks.merge_scaling
+"""
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pandas as pd
+
+from finance_toolkit.bnp import BnpAccount
+from finance_toolkit.models import Configuration, ExchangeRateConfig
+from finance_toolkit.tx import merge_balances, merge_bank_tx
+
+SIZES = [100, 500, 1000, 2000, 5000]
+ROWS_PER_FILE = 30
+
+
+def new_configuration(root_dir: Path, n: int) -> Configuration:
+    return Configuration(
+        accounts=[BnpAccount("CHQ", f"user-BNP-{i:04d}", f"{i:08d}") for i in range(n)],
+        categories=["food/restaurant"],
+        categories_to_rename={"food/resto": "food/restaurant"},
+        autocomplete=[],
+        download_dir=root_dir,
+        root_dir=root_dir,
+        exchange_rate_cfg=ExchangeRateConfig(watched_currencies=[]),
+    )
+
+
+def new_transactions(i: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Date": pd.date_range("2019-01-01", periods=ROWS_PER_FILE, freq="D"),
+            "Account": f"user-BNP-{i:04d}",
+            "Label": [f"label {j}" for j in range(ROWS_PER_FILE)],
+            "Amount": -1.0 * i,
+            "Type": "expense",
+            "MainCategory": "food",
+            "SubCategory": "resto",
+        }
+    )
+
+
+def bench_merge_bank_tx(cfg: Configuration, n: int) -> float:
+    dfs = [new_transactions(i) for i in range(n)]
+    start = time.perf_counter()
+    merge_bank_tx(dfs, cfg)
+    return time.perf_counter() - start
+
+
+def bench_merge_balances(cfg: Configuration, n: int) -> float:
+    paths = []
+    for i in range(n):
+        path = cfg.root_dir / f"balance.user-BNP-{i:04d}.EUR.csv"
+        path.write_text("Date,Amount,Currency\n2019-01-01,100.00,EUR\n2019-02-01,200.00,EUR\n")
+        paths.append(path)
+    start = time.perf_counter()
+    merge_balances(paths, cfg)
+    return time.perf_counter() - start
+
+
+def main():
+    print(
+        f"{'files':>6} {'merge_bank_tx':>14} {'per file':>10}"
+        f" {'merge_balances':>15} {'per file':>10}"
+    )
+    for n in SIZES:
+        with TemporaryDirectory() as tmp:
+            cfg = new_configuration(Path(tmp), n)
+            t1 = bench_merge_bank_tx(cfg, n)
+            t2 = bench_merge_balances(cfg, n)
+        print(f"{n:>6} {t1:>13.3f}s {t1 / n * 1e3:>8.3f}ms {t2:>14.3f}s {t2 / n * 1e3:>8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,10 @@ Usage:
   finance-toolkit [options] (cat|categories) [<prefix>]
   finance-toolkit [options] convert
   finance-toolkit [options] convert-and-merge
+  finance-toolkit [options] export
   finance-toolkit [options] merge
   finance-toolkit [options] move
+  finance-toolkit [options] serve
 
 Arguments:
   cat|categories      Print all categories, or categories starting with the given prefix.
@@ -16,23 +18,72 @@ Arguments:
                       base currency is euro (EUR) and cannot be changed for now.
   merge               Merge staging data.
   convert-and-merge   Running the 'convert' and 'merge' commands sequentially.
+  export              Export the data of the SQLite database as CSV files (storage: sqlite).
+  serve               Keep the data of the finance root in memory and run the other commands
+                      sent to it, so that they complete faster.
 
 Options:
   --finance-root FOLDER    Folder where the configuration file is stored (default: $HOME/finances).
+  --columnar               Also write the merged data as Feather files (requires pyarrow).
+  --full                   Convert the whole balance history, not only the changed balances.
+  -j --jobs N              Number of parallel jobs for commands move and merge [default: 1].
   -X --debug               Enable debugging logs. Default: false.
 
 """
 
 import os
+import sys
 from pathlib import Path
+from typing import Dict
 
 from docopt import docopt
 
-from .tx import Configurator, merge, move, convert
+from . import client
+
+# Only the configuration is loaded eagerly, so that commands which do not read data such as
+# "cat" start quickly. The data pipelines and their dependencies (pandas, numpy) are imported by
+# the commands which need them.
+from .configurator import Configurator
 
 import logging
 
 
+def send_to_server(root: Path, args: Dict) -> bool:
+    """
+    Send the command to the server of the finance root, see command "serve".
+
+    :return: true if the command ran on the server, false if no server is running
+    """
+    jobs = int(args["--jobs"])
+    if args["cat"] or args["categories"]:
+        requests = [("categories", {"prefix": args["<prefix>"] or ""})]
+    elif args["merge"]:
+        requests = [("merge", {"columnar": args["--columnar"], "jobs": jobs})]
+    elif args["move"]:
+        requests = [("move", {"jobs": jobs})]
+    elif args["convert"]:
+        requests = [("convert", {"full": args["--full"]})]
+    elif args["export"]:
+        requests = [("export", {})]
+    else:
+        requests = [
+            ("convert", {"full": args["--full"]}),
+            ("merge", {"columnar": args["--columnar"], "jobs": jobs}),
+        ]
+
+    for i, (command, options) in enumerate(requests):
+        try:
+            output = client.send(root, command, options)
+        except client.ServerError as e:
+            sys.exit(f"Failed to run {command!r} on the server:\n{e}")
+        if output is None:
+            if i == 0:
+                return False
+            sys.exit(f"The server stopped before running {command!r}")
+        print(output, end="")
+    return True
+
+
 def main():
     args = docopt(__doc__)
 
@@ -64,6 +115,14 @@ def main():
     logging.debug(f"finance-root={finance_root}")
 
     cfg_path = root / "finance-tools.yml"
+    if args["serve"]:
+        from .server import serve
+
+        serve(cfg_path)
+        return
+    if send_to_server(root, args):
+        return
+
     cfg = Configurator.load(cfg_path)
 
     if args["cat"] or args["categories"]:
@@ -71,14 +130,29 @@ def main():
         for c in cfg.categories(lambda s: s.startswith(prefix)):
             print(c)
     elif args["merge"]:
-        merge(cfg)
+        from .tx import merge
+
+        merge(cfg, columnar=args["--columnar"], jobs=int(args["--jobs"]))
     elif args["move"]:
-        move(cfg)
+        from .tx import move
+
+        move(cfg, jobs=int(args["--jobs"]))
     elif args["convert"]:
-        convert(cfg)
-    elif args["cm"] or args["convert-and-merge"]:
-        convert(cfg)
-        merge(cfg)
+        from .tx import convert
+
+        convert(cfg, full=args["--full"])
+    elif args["convert-and-merge"]:
+        from .catalog import Catalog
+        from .tx import convert, merge
+
+        # the files are listed once, merge also sees the balances written by convert
+        catalog = Catalog.scan(cfg)
+        convert(cfg, full=args["--full"], catalog=catalog)
+        merge(cfg, columnar=args["--columnar"], jobs=int(args["--jobs"]), catalog=catalog)
+    elif args["export"]:
+        from .tx import export
+
+        export(cfg)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,8 @@
 import logging
 import re
+from datetime import datetime
 from pathlib import Path
-from typing import Pattern, List
+from typing import Dict, List, Optional, Pattern, Tuple
 
 
 class Account:
@@ -78,14 +79,15 @@ class Account:
         return account_full_num.endswith(self.num)
 
     def match(self, path: Path) -> bool:
-        logging.debug(f"{path}")
+        # lazy formatting: this is called for every account and every downloaded file
+        logging.debug("%s", path)
         for p in self.patterns:
             matched = p.match(path.name)
             if matched:
-                logging.debug(f"{p.pattern}: matched")
+                logging.debug("%s: matched", p.pattern)
                 return True
             else:
-                logging.debug(f"{p.pattern}: not matched")
+                logging.debug("%s: not matched", p.pattern)
         return False
 
     @property
@@ -141,3 +143,248 @@ class OctoberAccount(Account):
             currency=currency,
             patterns=[f"remboursements-{account_num}.xlsx"],
         )
+
+
+def literal_prefix(regex: Pattern) -> str:
+    """
+    Extract the literal prefix of a filename pattern, e.g. "export-operations-" for
+    "export-operations-(?P<date>\\d{2}-\\d{2}-\\d{4})_.+\\.csv". A filename which does not start
+    with this prefix cannot match the pattern.
+    """
+    if regex.flags & (re.IGNORECASE | re.VERBOSE):
+        return ""
+    if has_top_level_alternation(regex.pattern):
+        # e.g. "foo\.csv|bar\.csv": the first alternative is not a prefix of the others
+        return ""
+    prefix = ""
+    for c in regex.pattern:
+        if c in ".^$*+?{}[]\\|()":
+            # a quantifier makes the previous character optional
+            return prefix[:-1] if c in "*?{" else prefix
+        prefix += c
+    return prefix
+
+
+def has_top_level_alternation(pattern: str) -> bool:
+    """Returns true if the pattern contains a "|" outside of groups and character classes."""
+    depth = 0
+    in_class = escaped = False
+    for c in pattern:
+        if escaped:
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return True
+    return False
+
+
+class BnpAccount(Account):
+    def __init__(
+        self,
+        account_type: str,
+        account_id: str,
+        account_num: str,
+        currency: str = "EUR",
+    ):
+        super().__init__(
+            account_type=account_type,
+            account_id=account_id,
+            account_num=account_num,
+            currency=currency,
+            patterns=["E\\d{,3}%s\\.csv" % account_num[-4:]],
+        )
+
+
+class BoursoramaAccount(Account):
+    def __init__(
+        self,
+        account_type: str,
+        account_id: str,
+        account_num: str,
+        currency: str = "EUR",
+    ):
+        super().__init__(
+            account_type=account_type,
+            account_id=account_id,
+            account_num=account_num,
+            currency=currency,
+            patterns=[r"export-operations-(?P<date>\d{2}-\d{2}-\d{4})_.+\.csv"],
+        )
+
+    def get_operations_date(self, filename: str) -> datetime:
+        for pattern in self.patterns:
+            match = pattern.match(filename)
+            if match:
+                d = match.groupdict()["date"]
+                return datetime.strptime(d, "%d-%m-%Y")
+        raise ValueError(f"failed to find date from the filename: {filename}")
+
+
+class CaisseEpargneAccount(Account):
+    def __init__(
+        self,
+        account_type: str,
+        account_id: str,
+        account_num: str,
+        currency: str = "EUR",
+    ):
+        super().__init__(
+            account_type=account_type,
+            account_id=account_id,
+            account_num=account_num,
+            currency=currency,
+            patterns=[
+                # e.g. "123456789_01112025_07122025.csv"
+                # format: {account}_{startDate}_{endDate}.csv
+                # where dates are DDMMYYYY (start and end of operations period)
+                # account_num is the suffix of the full account number, e.g. "6789"
+                # matches any digits before the suffix
+                "\\d*%s_\\d{8}_\\d{8}\\.csv"
+                % re.escape(account_num)
+            ],
+        )
+
+
+class FortuneoAccount(Account):
+    def __init__(
+        self,
+        account_type: str,
+        account_id: str,
+        account_num: str,
+        currency: str = "EUR",
+    ):
+        super().__init__(
+            account_type=account_type,
+            account_id=account_id,
+            account_num=account_num,
+            currency=currency,
+            patterns=[
+                r"HistoriqueOperations_(\d+)_du_\d{2}_\d{2}_\d{4}_au_\d{2}_\d{2}_\d{4}\.csv"
+            ],
+        )
+
+
+class RevolutAccount(Account):
+    # Account type "cash"
+    # A cash account contains cash in one single currency.
+    TYPE_CASH = "cash"
+
+    # Account type "commodities"
+    # A commodities account is an investment account for commodities, such as gold.
+    TYPE_COMMODITIES = "commodities"
+
+    default_pattern = r"account-statement_(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})_undefined-undefined_(\w+)\.csv"  # noqa
+
+    def __init__(
+        self,
+        account_type: str,
+        account_id: str,
+        account_num: str,
+        currency: str,
+        extra_patterns: List[str] = None,
+    ):
+        """
+        Initialize a new account for Revolut.
+
+        :param account_type: the type of the account, known types are listed as class variables
+            "TYPE_*".
+        :param account_id: the internal identifier of the account used by Finance Toolkit
+        :param account_num: the external identifier of the account used by Revolut
+        :param currency: the currency used by this account.
+        :param extra_patterns: the additional regular expression patterns used for CSV-file lookup
+            on top of the default ones.
+        """
+        patterns = [
+            r"Revolut-(.*)-Statement-(.*)\.csv",
+            self.default_pattern,
+        ]
+        if extra_patterns:
+            patterns.extend(extra_patterns)
+        super().__init__(
+            account_type=account_type,
+            account_id=account_id,
+            account_num=account_num,
+            currency=currency,
+            patterns=patterns,
+        )
+        self.skip_integration = account_type != self.TYPE_CASH
+
+
+class FileRouter:
+    """
+    Router finding the accounts of downloaded files.
+
+    The router is built once from the patterns of all the accounts. Accounts of the same company
+    usually share the same patterns, so each distinct pattern is evaluated once per file, and
+    only if the filename starts with its literal prefix (e.g. "E", "export-operations-",
+    "HistoriqueOperations_"). Before that, a combined regular expression of all the patterns
+    rejects unrelated files, such as most of the files in a download directory, in one call.
+    """
+
+    def __init__(self, accounts: List[Account]):
+        self.accounts = accounts
+        self.patterns: List[Pattern] = []
+        self.pattern_accounts: List[List[int]] = []
+        indices: Dict[Pattern, int] = {}
+        for a, account in enumerate(accounts):
+            for p in account.patterns:
+                if p not in indices:
+                    indices[p] = len(self.patterns)
+                    self.patterns.append(p)
+                    self.pattern_accounts.append([])
+                self.pattern_accounts[indices[p]].append(a)
+
+        # dispatch table: first character of the literal prefix -> (prefix, pattern index)
+        self.dispatch: Dict[str, List[Tuple[str, int]]] = {}
+        for i, p in enumerate(self.patterns):
+            prefix = literal_prefix(p)
+            self.dispatch.setdefault(prefix[:1], []).append((prefix, i))
+        self.regex: Optional[Pattern] = self._combine(self.patterns)
+
+    @staticmethod
+    def _combine(patterns: List[Pattern]) -> Optional[Pattern]:
+        if not patterns or len({p.flags for p in patterns}) > 1:
+            return None
+        for p in patterns:
+            # group references are numbered relatively to the pattern, they would be shifted
+            if re.search(r"\\[1-9]|\(\?P=|\(\?\(", p.pattern):
+                return None
+        try:
+            return re.compile(
+                "|".join(f"(?P<_p{i}>{p.pattern})" for i, p in enumerate(patterns)),
+                patterns[0].flags,
+            )
+        except re.error:  # e.g. the same group name used by different patterns
+            return None
+
+    def route(self, path: Path) -> List[Account]:
+        """
+        Find the accounts matching the given file.
+
+        :param path: the path of the downloaded file
+        :return: the matching accounts, in the same order as the accounts of the router
+        """
+        name = path.name
+        first = 0
+        if self.regex is not None:
+            m = self.regex.match(name)
+            if not m:
+                return []
+            # patterns before the matched alternative did not match
+            first = int(m.lastgroup[2:])
+
+        candidates = self.dispatch.get("", []) + self.dispatch.get(name[:1], [])
+        matched = set()
+        for prefix, i in candidates:
+            if i >= first and name.startswith(prefix) and self.patterns[i].match(name):
+                matched.update(self.pattern_accounts[i])
+        return [self.accounts[a] for a in sorted(matched)]
@@ -1,5 +1,4 @@
 from abc import ABCMeta
-from datetime import datetime
 from html import unescape
 from pathlib import Path
 from typing import Tuple
@@ -7,28 +6,12 @@ from typing import Tuple
 import pandas as pd
 from pandas import DataFrame
 
-from .account import Account
+from .account import BnpAccount  # noqa: F401, re-exported for compatibility
+from .dates import FR_DATE_FORMAT, parse_dates
 from .models import TxType
 from .pipeline import Pipeline, TransactionPipeline, BalancePipeline
 
 
-class BnpAccount(Account):
-    def __init__(
-        self,
-        account_type: str,
-        account_id: str,
-        account_num: str,
-        currency: str = "EUR",
-    ):
-        super().__init__(
-            account_type=account_type,
-            account_id=account_id,
-            account_num=account_num,
-            currency=currency,
-            patterns=["E\\d{,3}%s\\.csv" % account_num[-4:]],
-        )
-
-
 class BnpPipeline(Pipeline, metaclass=ABCMeta):
     @classmethod
     def parse_fr_float(cls, s: str) -> float:
@@ -57,7 +40,7 @@ class BnpPipeline(Pipeline, metaclass=ABCMeta):
                 "Amount",
             ],
         )
-        balances["Date"] = pd.to_datetime(balances["Date"], format="%d/%m/%Y")
+        balances["Date"] = parse_dates(balances["Date"], FR_DATE_FORMAT)
         balances["Amount"] = balances["Amount"].apply(self.parse_fr_float)
         # BNP Paribas does not provide currency information explicitly, so we create it ourselves.
         balances = balances.assign(Currency=lambda row: self.account.currency_symbol)
@@ -69,16 +52,16 @@ class BnpPipeline(Pipeline, metaclass=ABCMeta):
         # BNP > Transaction
         tx = pd.read_csv(
             csv,
-            date_parser=lambda s: datetime.strptime(s, "%d/%m/%Y"),
             decimal=",",
             delimiter=";",
             encoding="ISO-8859-1",
+            dtype={"Date": "str"},
             names=["Date", "bnpMainCategory", "bnpSubCategory", "Label", "Amount"],
-            parse_dates=["Date"],
             skipinitialspace=True,
             skiprows=1,
             thousands=" ",
         )
+        tx["Date"] = parse_dates(tx["Date"], FR_DATE_FORMAT)
 
         del tx["bnpMainCategory"]
         del tx["bnpSubCategory"]
@@ -99,21 +82,12 @@ class BnpTransactionPipeline(BnpPipeline, TransactionPipeline):
         elif self.account.type == "CHQ":
             df["Type"] = TxType.EXPENSE.value
 
-        for i, row in df.iterrows():
-            for c in self.cfg.autocomplete:
-                if c.match(row.Label):
-                    df.loc[i, "Type"] = c.tx_type
-                    df.loc[i, "MainCategory"] = c.main_category
-                    df.loc[i, "SubCategory"] = c.sub_category
-                    break
-        return df
+        return self.autocomplete(df)
 
     def read_new_transactions(self, path: Path) -> DataFrame:
-        _, tx = self.read_raw(path)
-        return tx
+        return self.select_transactions(self.read_raw_cached(path))
 
 
 class BnpBalancePipeline(BnpPipeline, BalancePipeline):
     def read_new_balances(self, csv: Path) -> DataFrame:
-        balances, _ = self.read_raw(csv)
-        return balances
+        return self.select_balances(self.read_raw_cached(csv))
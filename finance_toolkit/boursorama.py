@@ -1,41 +1,15 @@
 from abc import ABCMeta
-from datetime import datetime
 from pathlib import Path
 from typing import Tuple
 
 import pandas as pd
 from pandas import DataFrame
 
-from .account import Account
+from .account import BoursoramaAccount
 from .models import TxType, Configuration
 from .pipeline import Pipeline, TransactionPipeline, BalancePipeline, PipelineDataError
 
 
-class BoursoramaAccount(Account):
-    def __init__(
-        self,
-        account_type: str,
-        account_id: str,
-        account_num: str,
-        currency: str = "EUR",
-    ):
-        super().__init__(
-            account_type=account_type,
-            account_id=account_id,
-            account_num=account_num,
-            currency=currency,
-            patterns=[r"export-operations-(?P<date>\d{2}-\d{2}-\d{4})_.+\.csv"],
-        )
-
-    def get_operations_date(self, filename: str) -> datetime:
-        for pattern in self.patterns:
-            match = pattern.match(filename)
-            if match:
-                d = match.groupdict()["date"]
-                return datetime.strptime(d, "%d-%m-%Y")
-        raise ValueError(f"failed to find date from the filename: {filename}")
-
-
 class BoursoramaPipeline(Pipeline, metaclass=ABCMeta):
     def __init__(self, account: BoursoramaAccount, cfg: Configuration):
         super().__init__(account, cfg)
@@ -109,21 +83,12 @@ class BoursoramaTransactionPipeline(BoursoramaPipeline, TransactionPipeline):
         elif self.account.type == "CHQ":
             df["Type"] = TxType.EXPENSE.value
 
-        for i, row in df.iterrows():
-            for c in self.cfg.autocomplete:
-                if c.match(row.Label):
-                    df.loc[i, "Type"] = c.tx_type
-                    df.loc[i, "MainCategory"] = c.main_category
-                    df.loc[i, "SubCategory"] = c.sub_category
-                    break
-        return df
+        return self.autocomplete(df)
 
     def read_new_transactions(self, path: Path):
-        _, tx = self.read_raw(path)
-        return tx
+        return self.select_transactions(self.read_raw_cached(path))
 
 
 class BoursoramaBalancePipeline(BoursoramaPipeline, BalancePipeline):
     def read_new_balances(self, csv: Path) -> DataFrame:
-        balances, _ = self.read_raw(csv)
-        return balances
+        return self.select_balances(self.read_raw_cached(csv))
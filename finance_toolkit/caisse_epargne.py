@@ -1,42 +1,16 @@
-import re
 from abc import ABCMeta
-from datetime import datetime
 from pathlib import Path
 from typing import Tuple
 
 import pandas as pd
 from pandas import DataFrame
 
-from .account import Account
+from .account import CaisseEpargneAccount
+from .dates import FR_DATE_FORMAT, parse_dates
 from .models import Configuration, TxType
 from .pipeline import Pipeline, TransactionPipeline, BalancePipeline, PipelineDataError
 
 
-class CaisseEpargneAccount(Account):
-    def __init__(
-        self,
-        account_type: str,
-        account_id: str,
-        account_num: str,
-        currency: str = "EUR",
-    ):
-        super().__init__(
-            account_type=account_type,
-            account_id=account_id,
-            account_num=account_num,
-            currency=currency,
-            patterns=[
-                # e.g. "123456789_01112025_07122025.csv"
-                # format: {account}_{startDate}_{endDate}.csv
-                # where dates are DDMMYYYY (start and end of operations period)
-                # account_num is the suffix of the full account number, e.g. "6789"
-                # matches any digits before the suffix
-                "\\d*%s_\\d{8}_\\d{8}\\.csv"
-                % re.escape(account_num)
-            ],
-        )
-
-
 class CaisseEpargnePipeline(Pipeline, metaclass=ABCMeta):
     def __init__(self, account: CaisseEpargneAccount, cfg: Configuration):
         super().__init__(account, cfg)
@@ -44,19 +18,23 @@ class CaisseEpargnePipeline(Pipeline, metaclass=ABCMeta):
 
     def read_raw(self, csv: Path) -> Tuple[DataFrame, DataFrame]:
         kwargs = {
-            "date_parser": lambda s: datetime.strptime(s, "%d/%m/%Y"),
             "decimal": ",",
             "delimiter": ";",
             "encoding": "ISO-8859-1",
-            "parse_dates": [
-                "Date de comptabilisation",
-                "Date operation",
-                "Date de valeur",
-            ],
+            "dtype": {
+                "Date de comptabilisation": "str",
+                "Date operation": "str",
+                "Date de valeur": "str",
+            },
             "skipinitialspace": True,
         }
         try:
             tx_df = pd.read_csv(csv, **kwargs)
+            missing = [c for c in kwargs["dtype"] if c not in tx_df.columns]
+            if missing:
+                raise ValueError(f"Missing date columns: {missing}")
+            for column in kwargs["dtype"]:
+                tx_df[column] = parse_dates(tx_df[column], FR_DATE_FORMAT)
         except ValueError as e:
             with csv.open(encoding=kwargs["encoding"]) as f:
                 headers = next(f).strip()
@@ -91,21 +69,12 @@ class CaisseEpargneTransactionPipeline(CaisseEpargnePipeline, TransactionPipelin
         if self.account.type == "CHQ":
             df["Type"] = TxType.EXPENSE.value
 
-        for i, row in df.iterrows():
-            for c in self.cfg.autocomplete:
-                if c.match(row.Label):
-                    df.loc[i, "Type"] = c.tx_type
-                    df.loc[i, "MainCategory"] = c.main_category
-                    df.loc[i, "SubCategory"] = c.sub_category
-                    break
-        return df
+        return self.autocomplete(df)
 
     def read_new_transactions(self, csv: Path) -> DataFrame:
-        _, tx = self.read_raw(csv)
-        return tx
+        return self.select_transactions(self.read_raw_cached(csv))
 
 
 class CaisseEpargneBalancePipeline(CaisseEpargnePipeline, BalancePipeline):
     def read_new_balances(self, csv: Path) -> DataFrame:
-        balances, _ = self.read_raw(csv)
-        return balances
+        return self.select_balances(self.read_raw_cached(csv))
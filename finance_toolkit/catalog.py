@@ -0,0 +1,134 @@
+"""
+Catalog of the data files of the finance root.
+
+The commands used to look for their files on their own, each one globbing the finance root and
+resolving the account of every file. The catalog lists the finance root once per run, with one
+`os.scandir` pass over the root and its monthly directories, classifies every data file and keeps
+its stat information. It is shared by the commands of the run, e.g. `convert-and-merge`.
+"""
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .account import Account
+from .models import Configuration
+from .pipeline import AccountParser
+
+# Directories of monthly files, e.g. "2019-08"
+MONTH_DIR_PATTERN = re.compile(r"20[1-9]")
+
+
+@dataclass
+class CatalogFile:
+    path: Path
+    # the path relative to the finance root, e.g. "2019-08/2019-08.astark-BNP-CHQ.csv"
+    key: str
+    stat: os.stat_result
+
+
+@dataclass
+class AccountFile(CatalogFile):
+    # the account of the file, or the "unknown" account if it is not configured
+    account: Account
+    is_known: bool
+
+
+@dataclass
+class MonthlyFile(AccountFile):
+    month: str
+
+
+@dataclass
+class BalanceFile(AccountFile):
+    currency: str
+
+    @property
+    def is_original(self) -> bool:
+        """Returns true if the balance is in the currency of the account, i.e. not converted."""
+        return self.is_known and self.account.currency_symbol == self.currency
+
+    @property
+    def is_currency_conversion_needed(self) -> bool:
+        return self.is_original and self.account.is_currency_conversion_needed
+
+
+class Catalog:
+    """
+    Data files of the finance root, classified by kind:
+
+    - monthly transaction files: `${year}-${month}/${year}-${month}.${account_id}.csv`
+    - balance files, original or converted: `balance.${account_id}.${currency}.csv`
+    - the exchange rate file: `exchange-rate.csv`
+
+    The files written by a command are added back with `add`, so that the next commands of the
+    run see them.
+    """
+
+    def __init__(self, cfg: Configuration):
+        self.cfg = cfg
+        self.parser = AccountParser(cfg)
+        self.monthly_files: Dict[str, MonthlyFile] = {}
+        self.balance_files: Dict[str, BalanceFile] = {}
+        self.exchange_rate_file: Optional[CatalogFile] = None
+
+    @classmethod
+    def scan(cls, cfg: Configuration) -> "Catalog":
+        catalog = cls(cfg)
+        with os.scandir(cfg.root_dir) as entries:
+            for entry in entries:
+                if entry.is_dir() and MONTH_DIR_PATTERN.match(entry.name):
+                    with os.scandir(entry.path) as children:
+                        for child in children:
+                            if child.is_file():
+                                catalog._classify(Path(child.path), child.stat())
+                elif entry.is_file():
+                    catalog._classify(Path(entry.path), entry.stat())
+        return catalog
+
+    def add(self, path: Path):
+        """Add a file written during the run, or update its stat information."""
+        self._classify(path, path.stat())
+
+    def _classify(self, path: Path, stat: os.stat_result):
+        key = path.relative_to(self.cfg.root_dir).as_posix()
+        parts = path.name.split(".")
+        if path.suffix != ".csv" or path.name.startswith("."):
+            return
+        if path.parent != self.cfg.root_dir:
+            # monthly files: `${year}-${month}.${account_id}.csv`
+            account = self.parser.parse(path)
+            self.monthly_files[key] = MonthlyFile(
+                path=path,
+                key=key,
+                stat=stat,
+                account=account,
+                is_known=parts[1] in self.parser.accounts,
+                month=parts[0],
+            )
+        elif parts[0] == "balance" and len(parts) == 4:
+            account = self.parser.parse(path)
+            self.balance_files[key] = BalanceFile(
+                path=path,
+                key=key,
+                stat=stat,
+                account=account,
+                is_known=parts[1] in self.parser.accounts,
+                currency=parts[2],
+            )
+        elif path == self.cfg.exchange_rate_csv_path:
+            self.exchange_rate_file = CatalogFile(path=path, key=key, stat=stat)
+
+    def monthly(self) -> List[MonthlyFile]:
+        """Returns the monthly transaction files, sorted by path."""
+        return [self.monthly_files[k] for k in sorted(self.monthly_files)]
+
+    def balances(self, currency: Optional[str] = None) -> List[BalanceFile]:
+        """
+        Returns the balance files, sorted by path.
+
+        :param currency: the currency of the balances, all the currencies if not provided
+        """
+        files = [self.balance_files[k] for k in sorted(self.balance_files)]
+        return [f for f in files if currency is None or f.currency == currency]
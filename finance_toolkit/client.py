@@ -0,0 +1,75 @@
+"""
+Client of the Finance Toolkit server, see module `server`.
+
+The client only depends on the standard library, so that sending a command to the server does not
+pay the import of the data pipelines.
+"""
+import json
+import os
+import socket
+from pathlib import Path
+from typing import Dict, Optional
+
+SOCKET_NAME = ".finance-toolkit.sock"
+
+# Seconds to wait for the connection to the server. When the server cannot be reached, the
+# command runs in the client process instead.
+CONNECT_TIMEOUT = 5
+
+# While running a command, the server sends an empty line every `HEARTBEAT_INTERVAL` seconds, so
+# that a long command is not mistaken for a hanging server. A server which does not send anything
+# for `TIMEOUT` seconds is considered hanging.
+HEARTBEAT_INTERVAL = 5
+TIMEOUT = 30
+
+
+class ServerError(Exception):
+    """Raised when a command failed on the server."""
+
+
+def socket_path(root_dir: Path) -> Path:
+    return root_dir / SOCKET_NAME
+
+
+def send(
+    root_dir: Path, command: str, options: Dict, timeout: Optional[float] = None
+) -> Optional[str]:
+    """
+    Send a command to the server of the finance root.
+
+    :param root_dir: the root directory of the finance data
+    :param command: the name of the command, e.g. "merge"
+    :param options: the options of the command
+    :param timeout: the seconds to wait for a line of the server, `TIMEOUT` if not provided
+    :return: the output of the command, or None if no server is running
+    :raises ServerError: if the command failed on the server, or if the server stopped answering
+        once the command was sent: the server may still be running it, so it must not run again
+    """
+    path = socket_path(root_dir)
+    if not path.exists():
+        return None
+
+    request = {"command": command, "options": options, "download_dir": os.getenv("DOWNLOAD_DIR")}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(CONNECT_TIMEOUT)
+        try:
+            s.connect(str(path))
+        except (ConnectionRefusedError, FileNotFoundError, socket.timeout):  # the server stopped
+            return None
+
+        s.settimeout(TIMEOUT if timeout is None else timeout)
+        try:
+            s.sendall(json.dumps(request).encode() + b"\n")
+            with s.makefile("rb") as f:
+                line = f.readline()
+                while line == b"\n":  # heartbeat
+                    line = f.readline()
+        except (socket.timeout, ConnectionError) as e:  # e.g. the server hangs or crashed
+            raise ServerError(f"The server did not answer while running {command!r}: {e!r}")
+
+    if not line:
+        raise ServerError(f"The server closed the connection while running {command!r}")
+    response = json.loads(line)
+    if not response["ok"]:
+        raise ServerError(response["error"])
+    return response["output"]
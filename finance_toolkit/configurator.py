@@ -0,0 +1,303 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import yaml
+
+from . import __version__
+
+from .account import (
+    Account,
+    BnpAccount,
+    BoursoramaAccount,
+    CaisseEpargneAccount,
+    DegiroAccount,
+    FortuneoAccount,
+    OctoberAccount,
+    RevolutAccount,
+)
+from .models import Configuration, ExchangeRateConfig, Storage, TxCompletion
+
+# The loader implemented in C by LibYAML is much faster, but it is not always available.
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class ConfigurationCache:
+    """
+    JSON cache of the content of a YAML configuration file, stored next to the file.
+
+    Only the plain data read from the YAML file is cached, never objects: the configuration is
+    built from it on each load, see `Configurator.load`. The cache is valid as long as the YAML
+    file has the same modification time and size, or the same content hash. It is also bound to
+    the path of the YAML file and to the version of Finance Toolkit.
+    """
+
+    VERSION = 3
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.cache_path = path.with_name(f".{path.name}.cache")
+
+    def load(self, read: Callable[[Path], Dict]) -> Dict:
+        """
+        Load the content of the YAML file from the cache, or read it and update the cache.
+
+        :param read: the function reading the YAML file
+        :return: the content of the YAML file
+        """
+        stat = self.path.stat()
+        cached = self._read()
+        if cached and (cached["mtime_ns"], cached["size"]) == (stat.st_mtime_ns, stat.st_size):
+            return cached["data"]
+
+        sha256 = hashlib.sha256(self.path.read_bytes()).hexdigest()
+        if cached and cached["sha256"] == sha256:
+            data = cached["data"]
+        else:
+            data = read(self.path)
+        self._write(stat, sha256, data)
+        return data
+
+    def _key(self) -> Dict:
+        return {"version": self.VERSION, "package": __version__, "path": str(self.path.resolve())}
+
+    def _read(self) -> Optional[Dict]:
+        if not self.cache_path.exists():
+            return None
+        try:
+            cached = json.loads(self.cache_path.read_text())
+            if cached["key"] != self._key():
+                logging.debug(f"Configuration cache {self.cache_path} is outdated, ignore it")
+                return None
+            return cached
+        except Exception as e:  # corrupted cache, start from scratch
+            logging.debug(f"Failed to load configuration cache {self.cache_path}: {e}")
+            return None
+
+    def _write(self, stat: os.stat_result, sha256: str, data: Dict):
+        cached = {
+            "key": self._key(),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": sha256,
+            "data": data,
+        }
+        try:
+            text = json.dumps(cached)
+        except (TypeError, ValueError) as e:  # e.g. a date in the YAML file
+            logging.debug(f"Failed to write configuration cache {self.cache_path}: {e}")
+            return
+        if json.loads(text)["data"] != data:  # e.g. numbers used as keys, turned into strings
+            logging.debug(f"Configuration {self.path} cannot be cached as JSON")
+            return
+        tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        try:
+            tmp.write_text(text)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:  # e.g. read-only finance root, the cache is optional
+            logging.debug(f"Failed to write configuration cache {self.cache_path}: {e}")
+
+
+class Configurator:
+    """
+    Configurator parses and validates user configuration.
+    """
+
+    @classmethod
+    def load_accounts(cls, raw: Dict) -> List[Account]:
+        accounts = []
+        for symbolic_name, fields in raw.items():
+            company = fields["company"]
+            if company == "BNP":
+                if "expr" in fields:
+                    print(
+                        "BNP Paribas has its own naming convention for downloaded files,"
+                        f" you cannot overwrite it: expr={fields['expr']!r}"
+                    )
+                accounts.append(
+                    BnpAccount(
+                        account_type=fields["type"],
+                        account_id=symbolic_name,
+                        account_num=fields["id"],
+                    )
+                )
+            elif company == "Boursorama":
+                if "expr" in fields:
+                    print(
+                        "Boursorama has its own naming convention for downloaded files,"
+                        f" you cannot overwrite it: expr={fields['expr']!r}"
+                    )
+                accounts.append(
+                    BoursoramaAccount(
+                        account_type=fields["type"],
+                        account_id=symbolic_name,
+                        account_num=fields["id"],
+                    )
+                )
+            elif company == "Caisse d'Epargne":
+                if "expr" in fields:
+                    print(
+                        "Caisse d'Epargne has its own naming convention for downloaded files,"
+                        f" you cannot overwrite it: expr={fields['expr']!r}"
+                    )
+                accounts.append(
+                    CaisseEpargneAccount(
+                        account_type=fields["type"],
+                        account_id=symbolic_name,
+                        account_num=fields["id"],
+                    )
+                )
+            elif company == "Degiro":
+                accounts.append(
+                    DegiroAccount(
+                        account_type=fields["type"],
+                        account_id=symbolic_name,
+                        account_num=fields["id"],
+                    )
+                )
+            elif company == "Fortuneo":
+                if "expr" in fields:
+                    print(
+                        "Fortuneo has its own naming convention for downloaded files,"
+                        f" you cannot overwrite it: expr={fields['expr']!r}"
+                    )
+                accounts.append(
+                    FortuneoAccount(
+                        account_type=fields["type"],
+                        account_id=symbolic_name,
+                        account_num=fields["id"],
+                    )
+                )
+            elif company == "Revolut":
+                if "expr" in fields:
+                    print(
+                        "Revolut has its own naming convention for downloaded files,"
+                        f" you cannot overwrite it: expr={fields['expr']!r}"
+                    )
+                accounts.append(
+                    RevolutAccount(
+                        account_type=fields["type"],
+                        account_id=symbolic_name,
+                        account_num=fields["id"],
+                        currency=fields["currency"],
+                        extra_patterns=(
+                            fields["expressions"] if "expressions" in fields else None
+                        ),
+                    )
+                )
+            elif company == "October":
+                if "expr" in fields:
+                    print(
+                        "October has its own naming convention for downloaded files,"
+                        f" you cannot overwrite it: expr={fields['expr']!r}"
+                    )
+                accounts.append(
+                    OctoberAccount(
+                        account_type=fields["type"],
+                        account_id=symbolic_name,
+                        account_num=fields["id"],  # full id required by data lookup
+                    )
+                )
+            else:
+                accounts.append(
+                    Account(
+                        account_type=fields["type"],
+                        account_id=symbolic_name,
+                        account_num=fields["id"],
+                        patterns=["unknown"],
+                        currency=fields["currency"],
+                    )
+                )
+
+        # Validate no duplicate Caisse d'Epargne account IDs (suffixes)
+        cls._validate_no_duplicate_caisse_epargne_accounts(accounts)
+
+        accounts.sort(key=lambda a: a.id)
+        return accounts
+
+    @classmethod
+    def _validate_no_duplicate_caisse_epargne_accounts(cls, accounts: List[Account]):
+        """
+        Validate that no two Caisse d'Epargne accounts have the same account number (suffix).
+        Since account numbers are suffixes, duplicates would cause ambiguous file matching.
+        """
+        ce_accounts = [a for a in accounts if isinstance(a, CaisseEpargneAccount)]
+        seen_nums: Dict[str, List[str]] = {}
+        for account in ce_accounts:
+            if account.num not in seen_nums:
+                seen_nums[account.num] = []
+            seen_nums[account.num].append(account.id)
+
+        dup_details = [
+            f"  - Account ID suffix '{num}' is used by: {', '.join(ids)}"
+            for num, ids in seen_nums.items()
+            if len(ids) > 1
+        ]
+        if dup_details:
+            raise ValueError(
+                "Duplicate Caisse d'Epargne account ID suffixes found. "
+                "This would cause ambiguous file matching.\n" + "\n".join(dup_details)
+            )
+
+    @classmethod
+    def load_categories(cls, raw: List[str]) -> List[str]:
+        return [] if raw is None else raw
+
+    @classmethod
+    def load_autocomplete(cls, raw: List) -> List[TxCompletion]:
+        return [] if raw is None else [TxCompletion.load(p) for p in raw]
+
+    @classmethod
+    def load_exchange_rates(cls, raw: Dict) -> ExchangeRateConfig:
+        return ExchangeRateConfig(watched_currencies=raw["watched-currencies"])
+
+    @classmethod
+    def load_storage(cls, raw: Optional[str]) -> Storage:
+        return Storage.CSV if raw is None else Storage(raw)
+
+    @classmethod
+    def read_yaml(cls, path: Path) -> Dict:
+        return yaml.load(path.read_text(), Loader=SafeLoader)
+
+    @classmethod
+    def parse_yaml(cls, path: Path) -> Configuration:
+        return cls.parse_data(cls.read_yaml(path), path)
+
+    @classmethod
+    def parse_data(cls, data: Dict, path: Path) -> Configuration:
+        """
+        Build the configuration from the content of its YAML file.
+
+        :param data: the content of the YAML file
+        :param path: the path of the YAML file
+        """
+        accounts = cls.load_accounts(data["accounts"])
+        categories = cls.load_categories(data["categories"])
+        categories_to_rename = data["categories_to_rename"]
+        autocomplete = cls.load_autocomplete(data["auto-complete"])
+        download_dir = Path(data["download-dir"]).expanduser()
+        root_dir = path.parent
+        exchange_rate_cfg = cls.load_exchange_rates(data["exchange-rate"])
+        storage = cls.load_storage(data.get("storage"))
+        return Configuration(
+            accounts=accounts,
+            categories=categories,
+            categories_to_rename=categories_to_rename,
+            autocomplete=autocomplete,
+            download_dir=download_dir,
+            root_dir=root_dir,
+            exchange_rate_cfg=exchange_rate_cfg,
+            storage=storage,
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> Configuration:
+        # the accounts are still validated on each load, so that their warnings are printed
+        cfg = cls.parse_data(ConfigurationCache(path).load(cls.read_yaml), path)
+        # override download directory
+        if os.getenv("DOWNLOAD_DIR"):
+            cfg.download_dir = Path(os.getenv("DOWNLOAD_DIR")).expanduser()
+        return cfg
@@ -0,0 +1,329 @@
+"""
+SQLite storage of the finance data, an alternative to the CSV files of the finance root.
+
+By default, `move` reads, deduplicates and rewrites every monthly file and balance file it
+touches, and `merge` reads all the monthly files again. When the configuration declares
+`storage: sqlite`, the transactions, the balances and the exchange rates are stored in a SQLite
+database instead (`finance.db` in the finance root): new rows are inserted in place, and `merge`
+reads all the transactions with a single query. The database uses write-ahead logging, so that
+reading it does not block a concurrent import.
+
+When the database is created, the CSV files already in the finance root are imported into it, so
+that switching the storage keeps the history of the finance root. The command `export` writes
+the content of the database using the CSV layout of the finance root, for the tools relying on it.
+"""
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from pandas import DataFrame
+
+from .account import Account
+from .dates import ISO_DATE_FORMAT, parse_dates
+from .models import Configuration, Storage
+
+# The unique keys also index the rows by account and date, which is how they are queried.
+SCHEMA = """\
+CREATE TABLE IF NOT EXISTS transactions (
+    account TEXT NOT NULL,
+    date TEXT NOT NULL,
+    label TEXT NOT NULL DEFAULT '',
+    amount REAL,
+    currency TEXT,
+    type TEXT,
+    main_category TEXT,
+    sub_category TEXT,
+    UNIQUE (account, date, label, amount)
+);
+CREATE TABLE IF NOT EXISTS balances (
+    account TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    date TEXT NOT NULL,
+    amount REAL,
+    PRIMARY KEY (account, currency, date)
+);
+CREATE TABLE IF NOT EXISTS exchange_rates (
+    date TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    rate REAL,
+    PRIMARY KEY (date, currency)
+);
+"""
+
+TRANSACTION_COLUMNS = {
+    "account": "Account",
+    "date": "Date",
+    "label": "Label",
+    "amount": "Amount",
+    "currency": "Currency",
+    "type": "Type",
+    "main_category": "MainCategory",
+    "sub_category": "SubCategory",
+}
+
+
+def _records(df: DataFrame, columns: List[str]) -> List[Tuple]:
+    """Convert the given columns of a data-frame to SQLite values, NaN being converted to NULL."""
+    df = df[columns].astype(object)
+    return list(df.where(df.notna(), None).itertuples(index=False, name=None))
+
+
+def _iso_dates(dates: pd.Series) -> pd.Series:
+    """
+    Format dates as ISO 8601 strings, so that they are sorted as text. The time is only kept when
+    there is one, e.g. in the balances of Revolut.
+    """
+    formatted = pd.to_datetime(dates).dt.strftime(f"{ISO_DATE_FORMAT} %H:%M:%S")
+    return formatted.str.replace(" 00:00:00", "", regex=False)
+
+
+def _parse_iso_dates(values: pd.Series) -> pd.Series:
+    # the dates may have a time or not, see `_iso_dates`
+    return pd.to_datetime(values)
+
+
+class Database:
+    """
+    SQLite database storing the transactions, the balances and the exchange rates.
+
+    As for the CSV files, the rows already stored win over the new ones: importing the same
+    download twice, or an older download, does not change the data. The database can be shared
+    by the threads of a run, the writes are serialized.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # with write-ahead logging, a crash cannot corrupt the database in this mode
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _write(self, sql: str, records: List[Tuple]) -> int:
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(sql, records)
+            return self._conn.total_changes - before
+
+    def _read(self, sql: str, params: Tuple = ()) -> DataFrame:
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def insert_transactions(self, account_id: str, df: DataFrame) -> int:
+        """
+        Insert new transactions, skipping the ones already stored.
+
+        :param account_id: the id of the account
+        :param df: the transactions, as written into the monthly files
+        :return: the number of inserted transactions
+        """
+        # NULL values are distinct in a unique key: a missing label would defeat it
+        df = df.assign(Label=df["Label"].fillna(""))
+        df = df.drop_duplicates(subset=["Date", "Label", "Amount"], keep="last")
+        df = df.assign(Account=account_id, Date=_iso_dates(df["Date"]))
+        return self._write(
+            "INSERT OR IGNORE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            _records(df, list(TRANSACTION_COLUMNS.values())),
+        )
+
+    def read_transactions(self) -> DataFrame:
+        """
+        Read the transactions of all the accounts.
+
+        :return: the transactions, sorted by account and date
+        """
+        columns = ", ".join(f"{c} AS {name}" for c, name in TRANSACTION_COLUMNS.items())
+        df = self._read(
+            f"SELECT {columns} FROM transactions ORDER BY account, date, label, amount"
+        )
+        df["Date"] = _parse_iso_dates(df["Date"])
+        return df
+
+    def insert_balances(
+        self, account_id: str, currency: str, df: DataFrame, replace: bool = False
+    ) -> int:
+        """
+        Insert balances of an account.
+
+        :param account_id: the id of the account
+        :param currency: the currency of the balances
+        :param df: the balances, with columns "Date" and "Amount"
+        :param replace: replace the balances already stored for the same dates, instead of
+            skipping the new ones
+        :return: the number of inserted or replaced balances
+        """
+        df = df.drop_duplicates(subset=["Date"], keep="last")
+        df = df.assign(Account=account_id, Currency=currency, Date=_iso_dates(df["Date"]))
+        return self._write(
+            f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO balances VALUES (?, ?, ?, ?)",
+            _records(df, ["Account", "Currency", "Date", "Amount"]),
+        )
+
+    def read_balances(self, currency: str, account_id: Optional[str] = None) -> DataFrame:
+        """
+        Read the balances in the given currency.
+
+        :param currency: the currency of the balances, e.g. "EUR"
+        :param account_id: the id of the account, all the accounts if not provided
+        :return: the balances with columns "Date", "Account", "Amount" and "Currency", sorted
+            by account and date
+        """
+        sql = "SELECT date AS Date, account AS Account, amount AS Amount, currency AS Currency"
+        sql += " FROM balances WHERE currency = ?"
+        params = (currency,)
+        if account_id is not None:
+            sql += " AND account = ?"
+            params += (account_id,)
+        df = self._read(sql + " ORDER BY account, date", params)
+        df["Date"] = _parse_iso_dates(df["Date"])
+        return df
+
+    def balance_files(self) -> List[Tuple[str, str]]:
+        """Returns the account id and the currency of each balance, as in the balance files."""
+        df = self._read("SELECT DISTINCT account, currency FROM balances ORDER BY 1, 2")
+        return list(df.itertuples(index=False, name=None))
+
+    def write_exchange_rates(self, rate_df: DataFrame) -> int:
+        """
+        Insert new exchange rates, replacing the ones already stored for the same dates.
+
+        :param rate_df: the exchange rates, with one column "Date" and one column per currency
+        :return: the number of inserted or replaced rates
+        """
+        df = rate_df.drop_duplicates(subset=["Date"], keep="last")
+        df = df.melt(id_vars=["Date"], var_name="Currency", value_name="Rate")
+        df["Date"] = _iso_dates(df["Date"])
+        return self._write(
+            "INSERT OR REPLACE INTO exchange_rates VALUES (?, ?, ?)",
+            _records(df, ["Date", "Currency", "Rate"]),
+        )
+
+    def read_exchange_rates(self, currencies: List[str]) -> DataFrame:
+        """
+        Read the exchange rates of the given currencies.
+
+        :return: the exchange rates, with one column "Date" and one column per currency, as in
+            the exchange rate file
+        """
+        df = self._read("SELECT date, currency, rate FROM exchange_rates")
+        df = df.pivot(index="date", columns="currency", values="rate")
+        df = df.reindex(columns=currencies).rename_axis(index="Date", columns=None).reset_index()
+        df["Date"] = parse_dates(df["Date"], ISO_DATE_FORMAT)
+        return df.sort_values(by=["Date"], ignore_index=True)
+
+
+@contextmanager
+def open_database(cfg: Configuration) -> Iterator[Optional[Database]]:
+    """
+    Open the database of the finance root.
+
+    :return: the database, or None if the data are stored as CSV files
+    """
+    if cfg.storage != Storage.SQLITE:
+        yield None
+        return
+    created = not cfg.database_path.exists()
+    database = Database(cfg.database_path)
+    try:
+        if created:
+            import_files(database, cfg)
+        yield database
+    finally:
+        database.close()
+
+
+def import_files(database: Database, cfg: Configuration) -> List[Path]:
+    """
+    Import the CSV files of the finance root into the database: the monthly transaction files,
+    the balance files and the exchange rate file. This is the reverse of `export`, so that the
+    files written by the default storage are kept when switching to the database.
+
+    :return: the paths of the imported files
+    """
+    # imported here to avoid a circular import, the catalog depends on the pipelines
+    from .catalog import Catalog
+
+    catalog = Catalog.scan(cfg)
+    sources = []
+
+    for f in catalog.monthly():
+        if not f.is_known:
+            logging.warning(f"Skipping {f.path}: unknown account")
+            continue
+        df = pd.read_csv(f.path, parse_dates=["Date"])
+        # same defaults as `TransactionPipeline.append_transactions` for older files
+        df = df.reindex(columns=list(TRANSACTION_COLUMNS.values())[1:])
+        df = df.fillna({"Currency": f.account.currency_symbol})
+        database.insert_transactions(f.account.id, df)
+        sources.append(f.path)
+
+    for f in catalog.balances():
+        if not f.is_known:
+            logging.warning(f"Skipping {f.path}: unknown account")
+            continue
+        df = pd.read_csv(f.path, parse_dates=["Date"])
+        database.insert_balances(f.account.id, f.currency, df)
+        sources.append(f.path)
+
+    if catalog.exchange_rate_file is not None:
+        rate_df = pd.read_csv(catalog.exchange_rate_file.path)
+        rate_df["Date"] = parse_dates(rate_df["Date"], ISO_DATE_FORMAT)
+        database.write_exchange_rates(rate_df)
+        sources.append(catalog.exchange_rate_file.path)
+
+    if sources:
+        logging.info(f"Imported {len(sources)} files of {cfg.root_dir} into {database.path}")
+    return sources
+
+
+def export(database: Database, cfg: Configuration) -> List[Path]:
+    """
+    Write the content of the database using the CSV layout of the finance root: the monthly
+    transaction files, the balance files and the exchange rate file.
+
+    :return: the paths of the written files
+    """
+    # imported here to avoid a circular import, the pipelines depend on this module
+    from .exchange_rate import extend_rates, get_today
+
+    accounts: Dict[str, Account] = cfg.as_dict()
+    targets = []
+
+    tx = database.read_transactions()
+    tx["Month"] = tx["Date"].dt.strftime("%Y-%m")
+    for (account_id, month), df in tx.groupby(["Account", "Month"], sort=True):
+        filename = accounts[account_id].filename if account_id in accounts else f"{account_id}.csv"
+        (cfg.root_dir / month).mkdir(exist_ok=True)
+        target = cfg.root_dir / month / f"{month}.{filename}"
+        # same format as `TransactionPipeline.append_transactions`
+        df.sort_values(by=["Date", "Label"], kind="stable").to_csv(
+            target,
+            columns=["Date", "Label", "Amount", "Currency", "Type", "MainCategory", "SubCategory"],
+            index=None,
+            date_format="%Y-%m-%d",
+        )
+        targets.append(target)
+
+    for account_id, currency in database.balance_files():
+        target = cfg.root_dir / f"balance.{account_id}.{currency}.csv"
+        # same format as `BalancePipeline.write_balance`
+        database.read_balances(currency, account_id).to_csv(
+            target, index=None, columns=["Date", "Amount", "Currency"], float_format="%.2f"
+        )
+        targets.append(target)
+
+    rate_df = database.read_exchange_rates(cfg.exchange_rate_currencies)
+    if not rate_df.empty:
+        target = cfg.exchange_rate_csv_path
+        extend_rates(rate_df, get_today()).to_csv(target, index=False, date_format="%Y-%m-%d")
+        targets.append(target)
+
+    return targets
@@ -0,0 +1,40 @@
+"""
+Parsing of the dates found in the files downloaded from banks and other institutions.
+
+Passing a `date_parser` such as `lambda s: datetime.strptime(s, fmt)` to `pandas.read_csv` makes
+pandas call Python once per cell. Instead, the readers load dates as strings and parse them with
+`parse_dates`, which relies on the vectorized parser of pandas with an explicit format.
+"""
+from typing import Union
+
+import numpy as np
+import pandas as pd
+from pandas import Series
+
+# Format used by French banks, e.g. "31/12/2019"
+FR_DATE_FORMAT = "%d/%m/%Y"
+
+# Format used by ISO 8601, e.g. "2019-12-31"
+ISO_DATE_FORMAT = "%Y-%m-%d"
+
+
+def parse_dates(values: Union[Series, list], date_format: str) -> Series:
+    """
+    Parse date strings having the given format.
+
+    A download contains many transactions for the same date, so each distinct string is parsed
+    only once and the result is broadcast to all the rows having it. Missing values are parsed
+    as `NaT`.
+
+    :param values: the date strings to parse
+    :param date_format: the format of the dates, as accepted by `datetime.strptime`
+    :return: the parsed dates, sharing the index and the name of the values
+    :raises ValueError: if a value does not match the format
+    """
+    values = Series(values)
+    codes, uniques = pd.factorize(values)
+    if len(uniques) == 0:  # no value, or only missing ones
+        return Series(pd.NaT, index=values.index, name=values.name, dtype="datetime64[ns]")
+    parsed = pd.to_datetime(uniques, format=date_format).values.take(codes)
+    parsed[codes < 0] = np.datetime64("NaT")
+    return Series(parsed, index=values.index, name=values.name)
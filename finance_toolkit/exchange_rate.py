@@ -1,12 +1,17 @@
+import io
 import logging
 from abc import ABCMeta
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, Optional
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 import re
 
-from .pipeline import Pipeline
+from .dates import ISO_DATE_FORMAT, parse_dates
+from .manifest import ConvertManifest
+from .pipeline import Pipeline, file_lock, write_tail
 from .models import Summary
 
 
@@ -36,28 +41,75 @@ class ExchangeRatePipeline(Pipeline, metaclass=ABCMeta):
 
         rate_df = pd.read_csv(
             csv,
-            date_parser=lambda s: datetime.strptime(s, "%Y-%m-%d"),
-            parse_dates=['Date'],
             decimal=",",
             delimiter=";",
             na_values="-",
             skiprows=6,  # Titre, Code série, Unité, Magnitude, Méthode d'observation, Source
             names=[self.extract_code(u) for u in unit_str.split(";")]
         )
+        rate_df['Date'] = parse_dates(rate_df['Date'], ISO_DATE_FORMAT)
         rate_df = rate_df[['Date'] + self.cfg.exchange_rate_currencies]
         rate_df = rate_df.sort_values(by=['Date'], ascending=True)
-        today = get_today()
-        while rate_df.iloc[-1]['Date'] < today:
-            rate_df = rate_df.append({'Date': rate_df.iloc[-1]['Date'] + pd.DateOffset(1)},
-                                     ignore_index=True)
 
         target = self.cfg.exchange_rate_csv_path
         summary.add_source(csv)
-        summary.add_target(target)
+
+        if self.database is not None:
+            # the rates are only extended until today when exported, see `database.export`
+            self.database.write_exchange_rates(rate_df)
+            summary.add_target(self.database.path)
+            return
 
         logging.debug(f"Saving exchange rates to {target}")
         logging.debug(rate_df.tail())
-        rate_df.to_csv(target, index=False, date_format="%Y-%m-%d")
+        with file_lock(target):
+            self.write_rates(target, rate_df)
+        summary.add_target(target)
+
+    def write_rates(self, target: Path, rate_df: DataFrame) -> None:
+        """
+        Merge new exchange rates into the exchange rate file.
+
+        The rates of the new dates are inserted and the rates of the existing dates are replaced,
+        while the other dates of the file are kept, so that an export only needs to cover the
+        days since the previous import. Since these days are at the end of the file, only the
+        rows starting at the first changed date are rewritten. The whole file is rewritten if it
+        does not exist yet or if the watched currencies changed.
+
+        :param target: the exchange rate file
+        :param rate_df: the new exchange rates, sorted by date
+        """
+        columns = ['Date'] + self.cfg.exchange_rate_currencies
+        data = target.read_bytes() if target.exists() else b''
+        existing_df = pd.read_csv(io.BytesIO(data)) if data else DataFrame(columns=columns)
+        if list(existing_df.columns) != columns:
+            existing_df = DataFrame(columns=columns)
+        existing_df['Date'] = parse_dates(existing_df['Date'], ISO_DATE_FORMAT)
+
+        rate_df = pd.concat([existing_df, rate_df], ignore_index=True)
+        rate_df = rate_df.drop_duplicates(subset=['Date'], keep='last')
+        rate_df = rate_df.sort_values(by=['Date'], kind='stable', ignore_index=True)
+        rate_df = extend_rates(rate_df, get_today())
+
+        # The first row which differs from the existing file
+        n = min(len(existing_df), len(rate_df))
+        same = np.ones(n, dtype=bool)
+        for c in columns:
+            old, new = existing_df[c].values[:n], rate_df[c].values[:n]
+            same &= (old == new) | (pd.isna(old) & pd.isna(new))
+        changed = np.flatnonzero(~same)
+        first = changed[0] if len(changed) else n
+        if first == len(existing_df) == len(rate_df):
+            logging.debug(f"Exchange rates of {target} are up to date")
+            return
+
+        offset = row_offset(data, len(existing_df), first)
+        if offset == 0:
+            first = 0
+
+        logging.debug(f"Rewriting {len(rate_df) - first} rows of {target} from offset {offset}")
+        tail = rate_df.iloc[first:].to_csv(index=False, header=offset == 0, date_format='%Y-%m-%d')
+        write_tail(target, offset, tail)
 
     def extract_code(self, s: str) -> str:
         match = re.search(r'\((\w+)\)', s)
@@ -67,47 +119,192 @@ class ExchangeRatePipeline(Pipeline, metaclass=ABCMeta):
             return 'Date'
 
 
+def extend_rates(rate_df: DataFrame, today: datetime) -> DataFrame:
+    """
+    Extend the exchange rates until today, with one row per day after the last published rate.
+
+    The rates of these rows are left empty: as for the days without rate in the middle of the
+    table (weekends, public holidays), they are forward-filled when converting balances, i.e. the
+    last published rate applies. See `ConvertBalancePipeline.convert_balance_to_euro`.
+
+    :param rate_df: the exchange rates, sorted by date
+    :param today: the current date, its time part is ignored
+    :return: the exchange rates, ending today or later
+    """
+    if rate_df.empty:
+        return rate_df
+    missing = pd.date_range(
+        start=rate_df['Date'].iloc[-1] + pd.DateOffset(1),
+        end=pd.Timestamp(today).normalize(),
+        freq='D',
+        name='Date',
+    )
+    if missing.empty:
+        return rate_df
+    return pd.concat([rate_df, missing.to_frame(index=False)], ignore_index=True)
+
+
+def row_offset(data: bytes, rows: int, row: int) -> int:
+    """
+    Find where a row starts in the content of a CSV file.
+
+    :param data: the content of the CSV file, made of a header and one line per row
+    :param rows: the number of rows of the file
+    :param row: the index of the row to find
+    :return: the offset of the row, or 0 if the rows are not one per line
+    """
+    line_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n'))
+    return int(line_ends[row]) + 1 if len(line_ends) == rows + 1 else 0
+
+
 def get_today():  # faciliate testing
     return datetime.today()
 
 
+class ExchangeRateStore:
+    """
+    Exchange rates of the watched currencies against EUR, as stored in `exchange-rate.csv`.
+
+    The rates are loaded once and indexed by date, so that the balances of all the accounts can be
+    converted without reading the file again. A lookup returns the rate of the requested day or,
+    if there is no rate that day (weekends, public holidays), the last published rate before it.
+    """
+
+    def __init__(self, dates: np.ndarray, rates: Dict[str, np.ndarray]):
+        """
+        :param dates: the days having rates, sorted in ascending order
+        :param rates: the rates per currency symbol, one rate per day
+        """
+        self.dates = dates
+        self.rates = rates
+
+    @classmethod
+    def load(cls, csv: Path) -> "ExchangeRateStore":
+        df = pd.read_csv(csv)
+        df["Date"] = parse_dates(df["Date"], ISO_DATE_FORMAT)
+        return cls.from_frame(df)
+
+    @classmethod
+    def from_frame(cls, df: DataFrame) -> "ExchangeRateStore":
+        """
+        :param df: the exchange rates, with one column "Date" and one column per currency
+        """
+        df = df.sort_values(by=["Date"], kind="stable", ignore_index=True)
+        # forward fill: propagate last valid observation forward to next valid
+        df = df.fillna(method="ffill")
+        dates = df["Date"].values.astype("datetime64[D]")
+        rates = {c: df[c].to_numpy(dtype="float64") for c in df.columns if c != "Date"}
+        return cls(dates, rates)
+
+    def lookup(self, currency: str, dates: pd.Series) -> np.ndarray:
+        """
+        Look up the exchange rates of a currency.
+
+        :param currency: the currency symbol, e.g. "USD"
+        :param dates: the dates of the rates, their time part is ignored
+        :return: the rates, NaN for the dates before the first known rate
+        :raises KeyError: if the currency is not stored
+        """
+        days = pd.to_datetime(dates).values.astype("datetime64[D]")
+        if currency == "EUR":
+            return np.ones(len(days))
+        rates = self.rates[currency]
+        if len(rates) == 0:
+            return np.full(len(days), np.nan)
+        i = np.searchsorted(self.dates, days, side="right") - 1
+        result = rates[np.maximum(i, 0)]
+        result[i < 0] = np.nan
+        return result
+
+
 class ConvertBalancePipeline(Pipeline, metaclass=ABCMeta):
+    # The exchange rates shared by the pipelines of the same run, loaded from the exchange rate
+    # file if not provided.
+    rates: Optional[ExchangeRateStore] = None
+
+    # The manifest of the previous conversions, if only the rows which changed since then should
+    # be converted. Otherwise, the whole balance history is converted.
+    manifest: Optional[ConvertManifest] = None
+
     def run(self, balance_csv: Path, summary: Summary) -> None:
         logging.debug(f"Running {self.__class__.__name__} on {balance_csv}")
 
-        balance_df = pd.read_csv(balance_csv, parse_dates=["Date"])
+        # keep the dates as they are written in the balance file
+        balance_df = pd.read_csv(balance_csv, dtype={"Date": "str"})
+        rates = self.find_rates(balance_df)
 
         converted_balance_file = self.cfg.root_dir / self.account.converted_balance_filename
-        converted_balance_df = self.convert_balance_to_euro(balance_df)
+        summary.add_source(balance_csv)
 
-        self.write_balance(converted_balance_file, converted_balance_df)
+        first, offset = 0, 0
+        if self.manifest is not None:
+            hashes = pd.util.hash_pandas_object(
+                balance_df[["Date", "Amount"]].assign(Rate=rates), index=False
+            ).to_numpy()
+            rows = self.manifest.rows(self.account.id)
+            first = self.manifest.first_changed_row(self.account.id, hashes)
+            if first > 0 and converted_balance_file.exists():
+                offset = row_offset(converted_balance_file.read_bytes(), rows, first)
+            if offset == 0:
+                first = 0
+            self.manifest.update(self.account.id, hashes)
+            if first == len(balance_df) == rows and offset > 0:
+                logging.debug(f"Balance of account {self.account.id} is already converted")
+                return
 
-        summary.add_source(balance_csv)
+        converted_balance_df = self.to_euro(balance_df.iloc[first:], rates[first:])
+        self.write_balance(converted_balance_file, converted_balance_df, offset)
         summary.add_target(converted_balance_file)
 
-    def convert_balance_to_euro(self, balance_df: DataFrame) -> DataFrame:
-        balance_df = balance_df.copy()
-        balance_df["_DateOnly"] = pd.to_datetime(balance_df["Date"]).dt.date  # remove time part
+    def run_on_database(self, summary: Summary) -> None:
+        """
+        Convert the balance of the account stored in the database. The whole balance history is
+        converted: the converted balances are replaced in place, without rewriting any file.
+        """
+        balance_df = self.database.read_balances(self.account.currency_symbol, self.account.id)
+        if balance_df.empty:
+            return
+        # rounded as in the converted balance files, see `write_balance`
+        converted_balance_df = self.convert_balance_to_euro(balance_df).round({"Amount": 2})
+        self.database.insert_balances(self.account.id, "EUR", converted_balance_df, replace=True)
+        summary.add_source(self.database.path)
+        summary.add_target(self.database.path)
 
-        exchange_rate_df = pd.read_csv(self.cfg.exchange_rate_csv_path, parse_dates=["Date"])
-        exchange_rate_df.rename(columns={"Date": "_ExDate"}, inplace=True)
-        # forward fill: propagate last valid observation forward to next valid
-        exchange_rate_df = exchange_rate_df.fillna(method="ffill")
-        exchange_rate_df["EUR"] = 1.0
+    def find_rates(self, balance_df: DataFrame) -> np.ndarray:
+        if self.rates is None and self.database is not None:
+            self.rates = ExchangeRateStore.from_frame(
+                self.database.read_exchange_rates(self.cfg.exchange_rate_currencies)
+            )
+        elif self.rates is None:
+            self.rates = ExchangeRateStore.load(self.cfg.exchange_rate_csv_path)
+        return self.rates.lookup(self.account.currency_symbol, balance_df["Date"])
+
+    def convert_balance_to_euro(self, balance_df: DataFrame) -> DataFrame:
+        return self.to_euro(balance_df, self.find_rates(balance_df))
 
+    def to_euro(self, balance_df: DataFrame, rates: np.ndarray) -> DataFrame:
         logging.debug(f"Converting the balance of account {self.account.id} from {self.account.currency_symbol} to EUR")  # noqa
-        result_df = pd.merge(balance_df, exchange_rate_df,
-                             left_on="_DateOnly",
-                             right_on=exchange_rate_df["_ExDate"].dt.date,
-                             how="left")
+        result_df = balance_df[["Date", "Amount"]].copy()
 
         # amount in EUR = amount in currency / exchange rate
         # e.g. amount in EUR = 100 USD / 1.0956 = 91.29 EUR
-        result_df["Amount"] = result_df["Amount"] / result_df[self.account.currency_symbol]
+        result_df["Amount"] = result_df["Amount"] / rates
         result_df["Currency"] = "EUR"
-        result_df = result_df[["Date", "Amount", "Currency"]]
 
         return result_df
 
-    def write_balance(self, csv: Path, df: DataFrame) -> DataFrame:
-        df.to_csv(csv, index=None, columns=["Date", "Amount", "Currency"], float_format="%.2f")
+    def write_balance(self, csv: Path, df: DataFrame, offset: int = 0) -> None:
+        """
+        Write the converted balance.
+
+        :param csv: the converted balance file
+        :param df: the converted rows
+        :param offset: the offset where the rows are written, the content before it is kept
+        """
+        tail = df.to_csv(
+            index=None,
+            header=offset == 0,
+            columns=["Date", "Amount", "Currency"],
+            float_format="%.2f",
+        )
+        write_tail(csv, offset, tail)
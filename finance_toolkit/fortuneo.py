@@ -3,39 +3,14 @@ from pathlib import Path
 import pandas as pd
 from pandas import DataFrame
 
-from .account import Account
+from .account import FortuneoAccount  # noqa: F401, re-exported for compatibility
+from .dates import FR_DATE_FORMAT, parse_dates
 from .pipeline import TransactionPipeline
 
 
-class FortuneoAccount(Account):
-    def __init__(
-        self,
-        account_type: str,
-        account_id: str,
-        account_num: str,
-        currency: str = "EUR",
-    ):
-        super().__init__(
-            account_type=account_type,
-            account_id=account_id,
-            account_num=account_num,
-            currency=currency,
-            patterns=[
-                r"HistoriqueOperations_(\d+)_du_\d{2}_\d{2}_\d{4}_au_\d{2}_\d{2}_\d{4}\.csv"
-            ],
-        )
-
-
 class FortuneoTransactionPipeline(TransactionPipeline):
     def guess_meta(self, df: DataFrame) -> DataFrame:
-        for i, row in df.iterrows():
-            for c in self.cfg.autocomplete:
-                if c.match(row.Label):
-                    df.loc[i, "Type"] = c.tx_type
-                    df.loc[i, "MainCategory"] = c.main_category
-                    df.loc[i, "SubCategory"] = c.sub_category
-                    break
-        return df
+        return self.autocomplete(df)
 
     def read_new_transactions(self, csv: Path) -> DataFrame:
         # encoding: we don't know the exact encoding used by Fortuneo,
@@ -58,9 +33,8 @@ class FortuneoTransactionPipeline(TransactionPipeline):
         ]
 
         # Parse dates manually due to encoding problem
-        tx["Date opération"].apply(lambda s: pd.to_datetime(s, format="%d/%m/%Y"))
-        tx["Date valeur"].apply(lambda s: pd.to_datetime(s, format="%d/%m/%Y"))
-        tx = tx.astype({"Date opération": "datetime64", "Date valeur": "datetime64"})
+        tx["Date opération"] = parse_dates(tx["Date opération"], FR_DATE_FORMAT)
+        tx["Date valeur"] = parse_dates(tx["Date valeur"], FR_DATE_FORMAT)
 
         tx = tx.fillna("")
         tx["Amount"] = tx.apply(
@@ -0,0 +1,75 @@
+"""
+Columnar copies of the merged ledger.
+
+The `merge` command writes the merged transactions and balances as CSV files (`total.csv` and
+`balance.csv`). Optionally, it also writes them in the Arrow IPC file format (Feather V2) with
+typed columns, so that they can be loaded without parsing dates and floats from text. The files
+are not compressed, which allows reading them memory-mapped.
+
+This requires the optional dependency `pyarrow`, e.g. `pip install finance-toolkit[columnar]`.
+"""
+from pathlib import Path
+from typing import List
+
+from pandas import DataFrame
+
+TOTAL_CATEGORICAL_COLUMNS = ["Month", "Account", "Type", "MainCategory", "SubCategory"]
+BALANCE_CATEGORICAL_COLUMNS = ["Account", "AccountId", "AccountType"]
+
+
+def total_path(root_dir: Path) -> Path:
+    return root_dir / "total.feather"
+
+
+def balance_path(root_dir: Path) -> Path:
+    return root_dir / "balance.feather"
+
+
+def _feather():
+    try:
+        from pyarrow import feather
+    except ImportError as e:
+        raise ImportError(
+            "The columnar ledger requires pyarrow, install it with:"
+            " pip install finance-toolkit[columnar]"
+        ) from e
+    return feather
+
+
+def write_columnar(df: DataFrame, path: Path, categorical_columns: List[str]):
+    df = df.reset_index(drop=True)
+    df = df.astype({c: "category" for c in categorical_columns if c in df.columns})
+    _feather().write_feather(df, str(path), compression="uncompressed")
+
+
+def read_columnar(path: Path) -> DataFrame:
+    table = _feather().read_table(str(path), memory_map=True)
+    return table.to_pandas()
+
+
+def write_total(df: DataFrame, root_dir: Path):
+    write_columnar(df, total_path(root_dir), TOTAL_CATEGORICAL_COLUMNS)
+
+
+def write_balances(df: DataFrame, root_dir: Path):
+    write_columnar(df, balance_path(root_dir), BALANCE_CATEGORICAL_COLUMNS)
+
+
+def load_total(root_dir: Path) -> DataFrame:
+    """
+    Load the merged transactions written by `merge --columnar`.
+
+    :param root_dir: the root directory of the finance data
+    :return: the transactions, as stored in `total.csv`
+    """
+    return read_columnar(total_path(root_dir))
+
+
+def load_balances(root_dir: Path) -> DataFrame:
+    """
+    Load the merged balances written by `merge --columnar`.
+
+    :param root_dir: the root directory of the finance data
+    :return: the balances, as stored in `balance.csv`
+    """
+    return read_columnar(balance_path(root_dir))
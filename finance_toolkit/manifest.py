@@ -0,0 +1,378 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+@dataclass
+class ManifestEntry:
+    mtime_ns: int
+    size: int
+    sha256: str
+    rows: int
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+
+def sha256sum(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MergeManifest:
+    """
+    Manifest of the monthly transaction files merged by the last `merge` command.
+
+    For each file, the manifest records its modification time, size, content hash and row count,
+    together with the validation errors found while reading it. The validated rows of each file
+    are cached as a Feather file in the cache directory, next to the manifest, so that the next
+    `merge` only re-reads the files which changed since then, and only writes the rows of these
+    files. A file is considered unchanged when its modification time and size are the same, or
+    when its content hash is the same.
+
+    The manifest is bound to a fingerprint of the configuration used for validating the rows
+    (categories, accounts): it is discarded when the fingerprint changes. It is only written
+    again when a file changed, was added or was removed. The cache requires the optional
+    dependency `pyarrow`, see module `ledger`: without it, every file is read on each `merge`.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: Path, cache_dir: Path, fingerprint: str):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+        self.entries: Dict[str, ManifestEntry] = {}
+        # the rows of the files read or used by this process, the others are read on demand
+        self.frames: Dict[str, DataFrame] = {}
+        # the keys of the files whose rows are not written into the cache directory yet
+        self._changed: Set[str] = set()
+        # true when the entries differ from the files on disk
+        self.dirty = True
+
+    @classmethod
+    def load(cls, path: Path, cache_dir: Path, fingerprint: str) -> "MergeManifest":
+        manifest = cls(path, cache_dir, fingerprint)
+        if _feather() is None or not path.exists():
+            return manifest
+        try:
+            # the manifest is plain JSON, the cached rows are only read once it is validated
+            data = json.loads(path.read_text())
+            if data["version"] != cls.VERSION or data["fingerprint"] != fingerprint:
+                logging.debug(f"Manifest {path} is outdated, ignore it")
+                return manifest
+            entries = {
+                k: ManifestEntry(
+                    mtime_ns=v["mtime_ns"],
+                    size=v["size"],
+                    sha256=v["sha256"],
+                    rows=v["rows"],
+                    errors=[(line, err) for line, err in v["errors"]],
+                )
+                for k, v in data["files"].items()
+            }
+        except Exception as e:  # corrupted manifest, start from scratch
+            logging.debug(f"Failed to load manifest {path}: {e}")
+            return manifest
+
+        manifest.entries = {k: e for k, e in entries.items() if manifest.frame_path(k).exists()}
+        manifest.dirty = len(manifest.entries) != len(entries)
+        return manifest
+
+    def frame_path(self, key: str) -> Path:
+        """Returns the path of the cached rows of a file, named after the hash of its key."""
+        return self.cache_dir / f"{hashlib.sha256(key.encode()).hexdigest()}.feather"
+
+    def frame(self, key: str) -> DataFrame:
+        """Returns the validated rows of a file, see `lookup` and `update`."""
+        if key not in self.frames:
+            self.frames[key] = _feather().read_feather(str(self.frame_path(key)))
+        return self.frames[key]
+
+    def lookup(
+        self, key: str, path: Path, stat: Optional[os.stat_result] = None
+    ) -> Optional[ManifestEntry]:
+        """
+        Look up the entry of an unchanged file.
+
+        :param key: the key of the file in the manifest, i.e. its path relative to the root
+        :param path: the path of the file
+        :param stat: the stat information of the file, read from the disk if not provided
+        :return: the entry if the file did not change since the last merge, None otherwise
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if stat is None:
+            stat = path.stat()
+        if entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            return entry
+        if entry.size == stat.st_size and entry.sha256 == sha256sum(path):
+            entry.mtime_ns = stat.st_mtime_ns
+            self.dirty = True
+            return entry
+        return None
+
+    def update(
+        self,
+        key: str,
+        path: Path,
+        df: DataFrame,
+        errors: List[Tuple[int, str]],
+        stat: Optional[os.stat_result] = None,
+    ):
+        if stat is None:
+            stat = path.stat()
+        self.entries[key] = ManifestEntry(
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            sha256=sha256sum(path),
+            rows=len(df),
+            errors=errors,
+        )
+        # Feather files only store the default index, use it for all the rows
+        self.frames[key] = df.reset_index(drop=True)
+        self._changed.add(key)
+        self.dirty = True
+
+    def retain(self, keys: List[str]):
+        """Forget the files which do not exist anymore."""
+        keys = set(keys)
+        removed = set(self.entries) - keys
+        if not removed and self.frames.keys() <= keys:
+            return
+        for key in removed:
+            self.frame_path(key).unlink(missing_ok=True)
+        self.entries = {k: e for k, e in self.entries.items() if k in keys}
+        self.frames = {k: df for k, df in self.frames.items() if k in keys}
+        self._changed &= keys
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        feather = _feather()
+        if feather is None:
+            logging.debug("The merge cache requires pyarrow, it is not written")
+            return
+        self.cache_dir.mkdir(exist_ok=True)
+        for key in sorted(self._changed):
+            target = self.frame_path(key)
+            tmp = target.with_name(target.name + ".tmp")
+            feather.write_feather(self.frames[key], str(tmp))
+            os.replace(tmp, target)
+        self._changed.clear()
+
+        data = {
+            "version": self.VERSION,
+            "fingerprint": self.fingerprint,
+            "files": {k: asdict(e) for k, e in sorted(self.entries.items())},
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data, indent=2))
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+def _feather():
+    """Returns the Feather module of pyarrow, or None if pyarrow is not installed."""
+    try:
+        from pyarrow import feather
+    except ImportError:
+        return None
+    return feather
+
+
+class ConvertManifest:
+    """
+    Manifest of the balances converted to EUR by the last `convert` command.
+
+    For each account, the manifest records a 64-bit hash per converted row of the balance file,
+    computed from the date, the amount and the exchange rate of the row. The next `convert` only
+    converts the rows starting at the first row whose hash changed: the new balances, the balances
+    inserted before existing ones, or the balances whose exchange rate changed.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.accounts: Dict[str, List[int]] = {}
+
+    @classmethod
+    def load(cls, path: Path) -> "ConvertManifest":
+        manifest = cls(path)
+        if not path.exists():
+            return manifest
+        try:
+            data = json.loads(path.read_text())
+            if data["version"] != cls.VERSION:
+                logging.debug(f"Manifest {path} is outdated, ignore it")
+                return manifest
+            manifest.accounts = {k: list(v) for k, v in data["accounts"].items()}
+        except Exception as e:  # corrupted manifest, start from scratch
+            logging.debug(f"Failed to load manifest {path}: {e}")
+        return manifest
+
+    def rows(self, account_id: str) -> int:
+        """Returns the number of rows converted by the last `convert` for the given account."""
+        return len(self.accounts.get(account_id, []))
+
+    def first_changed_row(self, account_id: str, hashes: np.ndarray) -> int:
+        """
+        Find the first row which changed since the last `convert`.
+
+        :param account_id: the id of the account
+        :param hashes: the hashes of the rows of the balance file
+        :return: the index of the first changed row, the number of rows if none changed
+        """
+        previous = np.array(self.accounts.get(account_id, []), dtype="uint64")
+        n = min(len(previous), len(hashes))
+        changed = np.flatnonzero(previous[:n] != hashes[:n])
+        return int(changed[0]) if len(changed) else n
+
+    def update(self, account_id: str, hashes: np.ndarray):
+        self.accounts[account_id] = [int(h) for h in hashes]
+
+    def save(self):
+        data = {"version": self.VERSION, "accounts": dict(sorted(self.accounts.items()))}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, self.path)
+
+
+def transaction_hashes(df: DataFrame) -> np.ndarray:
+    """
+    Compute a 64-bit hash per transaction, from its date, its label and its amount: the columns
+    identifying duplicated transactions in the monthly files.
+
+    :param df: the transactions, their dates being timestamps or strings
+    :return: the hashes, as unsigned integers
+    """
+    keys = DataFrame(
+        {
+            "Date": pd.to_datetime(df["Date"]).dt.strftime("%Y-%m-%d").to_numpy(),
+            "Label": df["Label"].astype(str).to_numpy(),
+            # in cents, so that the amounts read from the files have the same hashes
+            "Amount": np.round(df["Amount"].to_numpy(dtype="float64") * 100),
+        }
+    )
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+class TransactionIndex:
+    """
+    Index of the transactions written into the monthly files, made of the sorted hashes of the
+    transactions of each account, see `transaction_hashes`.
+
+    The `move` command consults the index before writing new transactions: the transactions
+    already written are skipped, so re-importing a download neither reads nor rewrites any monthly
+    file. The index of an account also records the modification time and size of its monthly
+    files, so that it is rebuilt from the files when they are modified by something else than
+    `move`. The hashes are stored in a NumPy archive next to the index.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Path, cache_path: Path, root_dir: Path):
+        self.path = path
+        self.cache_path = cache_path
+        self.root_dir = root_dir
+        self.hashes: Dict[str, np.ndarray] = {}
+        self.files: Dict[str, Dict[str, List[int]]] = {}
+        self._lock = threading.Lock()
+        # the accounts whose index was checked against their monthly files during this run, with
+        # the name of their monthly files
+        self._checked: Dict[str, str] = {}
+
+    @classmethod
+    def load(cls, path: Path, cache_path: Path, root_dir: Path) -> "TransactionIndex":
+        index = cls(path, cache_path, root_dir)
+        if not path.exists() or not cache_path.exists():
+            return index
+        try:
+            data = json.loads(path.read_text())
+            if data["version"] != cls.VERSION:
+                logging.debug(f"Index {path} is outdated, ignore it")
+                return index
+            with np.load(cache_path) as archive:
+                hashes = {k: archive[k] for k in archive.files}
+        except Exception as e:  # corrupted index, start from scratch
+            logging.debug(f"Failed to load index {path}: {e}")
+            return index
+
+        index.files = {k: v for k, v in data["accounts"].items() if k in hashes}
+        index.hashes = {k: hashes[k] for k in index.files}
+        return index
+
+    def monthly_files(self, filename: str) -> Dict[str, List[int]]:
+        """Returns the modification time and size of the monthly files having the given name."""
+        files = {}
+        for p in sorted(self.root_dir.glob(f"20??-??/20??-??.{filename}")):
+            stat = p.stat()
+            files[p.relative_to(self.root_dir).as_posix()] = [stat.st_mtime_ns, stat.st_size]
+        return files
+
+    def _check(self, account_id: str, filename: str):
+        if account_id in self._checked:
+            return
+        self._checked[account_id] = filename
+        files = self.monthly_files(filename)
+        if account_id in self.files and self.files[account_id] == files:
+            return
+
+        logging.debug(f"Rebuilding the transaction index of account {account_id}")
+        dfs = [
+            pd.read_csv(
+                self.root_dir / f,
+                usecols=["Date", "Label", "Amount"],
+                dtype={"Date": "str", "Label": "str"},
+            )
+            for f in files
+        ]
+        hashes = transaction_hashes(pd.concat(dfs)) if dfs else np.array([], dtype="uint64")
+        self.hashes[account_id] = np.unique(hashes)
+        self.files[account_id] = files
+
+    def select_new(self, account_id: str, filename: str, df: DataFrame) -> DataFrame:
+        """
+        Select the transactions which are not written yet, and add them to the index.
+
+        :param account_id: the id of the account
+        :param filename: the name of the monthly files of the account, without the month
+        :param df: the transactions
+        :return: the transactions which are not in the index
+        """
+        hashes = transaction_hashes(df)
+        with self._lock:
+            self._check(account_id, filename)
+            known = self.hashes[account_id]
+            i = np.minimum(np.searchsorted(known, hashes), max(len(known) - 1, 0))
+            new = known[i] != hashes if len(known) else np.ones(len(df), dtype=bool)
+            self.hashes[account_id] = np.union1d(known, hashes[new])
+        # a copy, the caller completes the new transactions
+        return df[new].copy()
+
+    def save(self):
+        """Save the index, once the new transactions are written into the monthly files."""
+        with self._lock:
+            for account_id, filename in self._checked.items():
+                self.files[account_id] = self.monthly_files(filename)
+            data = {"version": self.VERSION, "accounts": dict(sorted(self.files.items()))}
+            tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+            with tmp.open("wb") as f:
+                np.savez(f, **self.hashes)
+            os.replace(tmp, self.cache_path)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, self.path)
@@ -1,8 +1,10 @@
 import re
+import threading
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Set, Dict, Pattern
+from typing import List, Set, Dict, Iterable, Optional, Pattern
 
 from .account import Account
 
@@ -44,6 +46,44 @@ class TxType(str, Enum):
         return {m.value for m in TxType}
 
 
+class Storage(str, Enum):
+    # The data are stored as CSV files in the finance root: one file per account and per month
+    # for the transactions, one file per account and per currency for the balances.
+    CSV = "csv"
+
+    # The data are stored in a SQLite database in the finance root, see module `database`.
+    SQLITE = "sqlite"
+
+
+class LazyPattern:
+    """
+    Regular expression compiled on first use.
+
+    Compiling the patterns is the most expensive part of loading a configuration with many
+    auto-complete entries. Completions are loaded with a lazy pattern instead, so that only the
+    patterns actually used are compiled.
+    """
+
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = pattern
+        # as `re.compile`, which matches str patterns as Unicode unless told otherwise
+        self.flags = flags if flags & re.ASCII else flags | re.UNICODE
+        self._compiled: Optional[Pattern] = None
+
+    def match(self, s: str):
+        if self._compiled is None:
+            self._compiled = re.compile(self.pattern, self.flags)
+        return self._compiled.match(s)
+
+    def __eq__(self, o: object) -> bool:
+        if not isinstance(o, (LazyPattern, re.Pattern)):
+            return NotImplemented
+        return self.pattern == o.pattern and self.flags == o.flags
+
+    def __repr__(self):
+        return f"LazyPattern({self.pattern!r})"
+
+
 @dataclass
 class TxCompletion:
     regex: Pattern
@@ -70,13 +110,90 @@ class TxCompletion:
         :return: a new completion
         """
         return TxCompletion(
-            regex=re.compile(pattern["expr"]),
+            regex=LazyPattern(pattern["expr"]),
             tx_type=pattern["type"],
             main_category=pattern["cat"].split("/")[0],
             sub_category=pattern["cat"].split("/")[1],
         )
 
 
+def required_literal(regex: Pattern) -> str:
+    """
+    Extract the longest literal required by a simple pattern, e.g. "FLUNCH" for ".*FLUNCH.*". A
+    label which does not contain this literal cannot match the pattern.
+
+    :param regex: the compiled pattern
+    :return: the literal, or an empty string if the pattern is too complex to be analyzed
+    """
+    pattern = regex.pattern
+    if regex.flags & re.IGNORECASE or any(c in pattern for c in "|()[]\\"):
+        return ""
+    runs, run, i = [], "", 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c in "*?{":
+            # the previous character is optional
+            runs.append(run[:-1])
+            run = ""
+            if c == "{":
+                i = pattern.find("}", i)
+                if i < 0:
+                    return ""
+        elif c in "+.^$":
+            runs.append(run)
+            run = ""
+        else:
+            run += c
+        i += 1
+    runs.append(run)
+    return max(runs, key=len)
+
+
+class TxCompleter:
+    """
+    Auto-completion engine resolving the first matching completion of transaction labels.
+
+    Each completion is indexed by the longest literal required by its pattern, so only the
+    completions whose literal appears in the label are evaluated, in the order of the
+    configuration. Results are memoized per label because the same merchants appear again and
+    again across months.
+    """
+
+    def __init__(self, completions: List[TxCompletion], cache_size: int = 65536):
+        self.completions: List[TxCompletion] = list(completions)
+        self.literals: List[str] = [required_literal(c.regex) for c in self.completions]
+        self._find = lru_cache(maxsize=cache_size)(self._find_uncached)
+
+    def is_built_from(self, completions: List[TxCompletion]) -> bool:
+        return len(self.completions) == len(completions) and all(
+            a is b for a, b in zip(self.completions, completions)
+        )
+
+    def find(self, label: str) -> int:
+        """
+        Find the completion matching the given label.
+
+        :param label: the label of the transaction
+        :return: the index of the first matching completion, or -1 if nothing matches
+        """
+        if not isinstance(label, str):
+            return -1
+        return self._find(label)
+
+    def find_all(self, labels: Iterable[str]) -> List[int]:
+        return [self.find(label) for label in labels]
+
+    def cache_info(self):
+        """Returns the hits and misses of the label cache."""
+        return self._find.cache_info()
+
+    def _find_uncached(self, label: str) -> int:
+        for i, literal in enumerate(self.literals):
+            if literal in label and self.completions[i].match(label):
+                return i
+        return -1
+
+
 @dataclass
 class AccountPath:
     account: Account
@@ -113,6 +230,7 @@ class Configuration:
         download_dir: Path,
         root_dir: Path,
         exchange_rate_cfg: ExchangeRateConfig,
+        storage: Storage = Storage.CSV,
     ):
         self.accounts: List[Account] = accounts
         self.category_set: Set[str] = set(categories)
@@ -121,6 +239,24 @@ class Configuration:
         self.download_dir: Path = download_dir
         self.root_dir: Path = root_dir
         self.exchange_rate_cfg: ExchangeRateConfig = exchange_rate_cfg
+        self.storage: Storage = storage
+        self._completer: Optional[TxCompleter] = None
+
+    @property
+    def completer(self) -> TxCompleter:
+        """
+        Returns the auto-completion engine of this configuration. The engine is rebuilt when the
+        list of completions changes.
+        """
+        if self._completer is None or not self._completer.is_built_from(self.autocomplete):
+            self._completer = TxCompleter(self.autocomplete)
+        return self._completer
+
+    def __getstate__(self) -> Dict:
+        # the completer is rebuilt on demand, its label cache is not worth sending to workers
+        state = self.__dict__.copy()
+        state["_completer"] = None
+        return state
 
     def as_dict(self) -> Dict[str, Account]:
         return {a.id: a for a in self.accounts}
@@ -138,6 +274,30 @@ class Configuration:
     def exchange_rate_csv_path(self) -> Path:
         return self.root_dir / "exchange-rate.csv"
 
+    @property
+    def merge_manifest_path(self) -> Path:
+        return self.root_dir / ".merge-manifest.json"
+
+    @property
+    def merge_cache_dir(self) -> Path:
+        return self.root_dir / ".merge-cache"
+
+    @property
+    def convert_manifest_path(self) -> Path:
+        return self.root_dir / ".convert-manifest.json"
+
+    @property
+    def transaction_index_path(self) -> Path:
+        return self.root_dir / ".transaction-index.json"
+
+    @property
+    def transaction_index_cache_path(self) -> Path:
+        return self.root_dir / ".transaction-index.npz"
+
+    @property
+    def database_path(self) -> Path:
+        return self.root_dir / "finance.db"
+
     @property
     def exchange_rate_currencies(self) -> List[str]:
         return self.exchange_rate_cfg.watched_currencies
@@ -149,12 +309,16 @@ class Summary:
         self.sources = set()
         self.targets = set()
         self.action = action
+        # pipelines may report to the same summary from different threads
+        self._lock = threading.Lock()
 
     def add_target(self, target: Path) -> None:
-        self.targets.add(target)
+        with self._lock:
+            self.targets.add(target)
 
     def add_source(self, source: Path) -> None:
-        self.sources.add(source)
+        with self._lock:
+            self.sources.add(source)
 
     def __repr__(self) -> str:
         if self.sources:
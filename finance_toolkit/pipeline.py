@@ -1,20 +1,168 @@
 import logging
+import os
+import threading
 from abc import ABCMeta, abstractmethod
+from bisect import bisect_left
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
 from .account import Account
+from .database import Database
+from .manifest import TransactionIndex
 from .models import AccountPath, Configuration, Summary
 
 
+# Columns of the monthly transaction files, as written by `TransactionPipeline.append_transactions`
+TRANSACTION_FILE_COLUMNS = [
+    "Date",
+    "Label",
+    "Amount",
+    "Currency",
+    "Type",
+    "MainCategory",
+    "SubCategory",
+]
+
+# Columns of the balance files, as written by `BalancePipeline.write_balance`
+BALANCE_FILE_COLUMNS = ["Date", "Amount", "Currency"]
+
+_file_locks: Dict[Path, threading.Lock] = {}
+_file_locks_guard = threading.Lock()
+
+
+def file_lock(path: Path) -> threading.Lock:
+    """
+    Returns the lock of the given file. Pipelines running concurrently hold it while they
+    read-modify-write the file, so that two sources targeting the same file are serialized.
+    """
+    with _file_locks_guard:
+        return _file_locks.setdefault(path.resolve(), threading.Lock())
+
+
+def write_tail(path: Path, offset: int, tail: str) -> None:
+    """Replace the content of a file after the given offset."""
+    with path.open('r+b' if offset else 'wb') as f:
+        f.seek(offset)
+        f.truncate()
+        f.write(tail.encode())
+
+
+def read_last_date(csv: Path, columns: List[str], block_size: int = 4096) -> Optional[pd.Timestamp]:
+    """
+    Read the date of the last row of a CSV file, without reading the whole file: only its header
+    and its last block are read.
+
+    :param csv: the CSV file, having the date in its first column
+    :param columns: the expected columns of the file
+    :return: the date, or None if the file has other columns, has no rows, or does not end with
+        a complete row
+    """
+    with csv.open("rb") as f:
+        header = f.readline()
+        if header != (",".join(columns) + "\n").encode():
+            return None
+        size = f.seek(0, os.SEEK_END)
+        start = max(len(header), size - block_size)
+        f.seek(start)
+        block = f.read()
+    if not block.endswith(b"\n"):
+        return None
+    lines = block[:-1].rsplit(b"\n", 1)
+    if len(lines) == 1 and start > len(header):
+        return None  # the last row is larger than the block
+    try:
+        return pd.Timestamp(lines[-1].split(b",", 1)[0].decode())
+    except ValueError:
+        return None
+
+
+def balance_date_format(written: List[str], new_dates: pd.Series) -> Optional[str]:
+    """
+    Find the format of the dates of a balance file, for writing new balances into it.
+
+    Pandas writes the dates of a column without their time if all of them are at midnight, with
+    their time otherwise. The new balances must be written as the whole file would be.
+
+    :param written: the dates written in the file
+    :param new_dates: the dates of the new balances
+    :return: the format, or None if the new balances change the format of the file
+    """
+    if new_dates.isna().any():
+        return None
+    if all(len(d) == 10 for d in written) and (new_dates == new_dates.dt.normalize()).all():
+        return "%Y-%m-%d"
+    if all(len(d) == 19 for d in written) and (new_dates == new_dates.dt.floor("s")).all():
+        return "%Y-%m-%d %H:%M:%S"
+    return None
+
+
+class SourceCache:
+    """
+    Cache of parsed downloads, kept between the commands of the server, see module `server`.
+
+    Downloads stay in the download directory after being imported, so each `move` reads the same
+    files again: an unchanged download is only parsed by the first one. Entries are keyed by
+    account, path, modification time and size, so a modified file is parsed again. Only the
+    most recent entries are kept.
+    """
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, Tuple[DataFrame, ...]]" = OrderedDict()
+
+    def get(
+        self, account: Account, path: Path, read: Callable[[Path], Tuple[DataFrame, ...]]
+    ) -> Tuple[DataFrame, ...]:
+        """
+        Get the parsed content of a download, reading it if needed.
+
+        :param account: the account of the pipeline reading the file
+        :param path: the path of the download
+        :param read: the function parsing the download
+        :return: a copy of the parsed frames, which can be modified by the caller
+        """
+        stat = path.stat()
+        key = (account, str(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            frames = self._entries.get(key)
+            if frames is not None:
+                self._entries.move_to_end(key)
+        if frames is None:
+            frames = read(path)
+            with self._lock:
+                self._entries[key] = frames
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return tuple(df.copy() for df in frames)
+
+
 class Pipeline(metaclass=ABCMeta):
+    # When set, parsed downloads are reused by the next runs, see `SourceCache`.
+    sources: Optional[SourceCache] = None
+
+    # When set, the data are stored in this database instead of CSV files, see module `database`.
+    database: Optional[Database] = None
+
     def __init__(self, account: Account, cfg: Configuration):
         self.account = account
         self.cfg = cfg
 
+    def read_raw_cached(self, csv: Path) -> Tuple[DataFrame, DataFrame]:
+        """
+        Read the raw download via `read_raw`, going through the source cache if any. Only the
+        pipelines of companies providing the balances and the transactions in the same file
+        define `read_raw`, returning these two data-frames.
+        """
+        if self.sources is None:
+            return self.read_raw(csv)
+        return self.sources.get(self.account, csv, self.read_raw)
+
     @abstractmethod
     def run(self, path: Path, summary: Summary) -> None:
         """
@@ -26,10 +174,25 @@ class Pipeline(metaclass=ABCMeta):
 
 
 class TransactionPipeline(Pipeline, metaclass=ABCMeta):
+    # When set, new transactions are buffered and written at the end of the run, see
+    # `TransactionBuffer`. Otherwise, they are written immediately.
+    buffer: Optional["TransactionBuffer"] = None
+
+    # When set, the transactions already written into the monthly files are skipped without
+    # reading these files.
+    index: Optional[TransactionIndex] = None
+
     def run(self, source: Path, summary: Summary) -> None:
-        # read
-        tx = self.read_new_transactions(source)
+        self.write_new_transactions(source, self.read_new_transactions(source), summary)
+
+    def write_new_transactions(self, source: Path, tx: DataFrame, summary: Summary) -> None:
+        """
+        Complete the new transactions read from a source, then write them into monthly files.
 
+        :param source: the source path where the transactions were read
+        :param tx: the new transactions, see `read_new_transactions`
+        :param summary: the summary containing results of different pipelines
+        """
         # add custom columns if needed
         if "MainCategory" not in tx.columns:
             tx["MainCategory"] = ""
@@ -39,21 +202,59 @@ class TransactionPipeline(Pipeline, metaclass=ABCMeta):
             tx["Type"] = ""
 
         summary.add_source(source)
+        if self.index is not None:
+            tx = self.index.select_new(self.account.id, self.account.filename, tx)
+            if tx.empty:
+                logging.debug(f"Transactions of {source} are already written")
+                return
 
         # process
         tx = self.guess_meta(tx)
         tx["Month"] = tx.Date.apply(lambda date: date.strftime("%Y-%m"))
 
         # write
+        if self.database is not None:
+            self.database.insert_transactions(self.account.id, tx)
+            summary.add_target(self.database.path)
+            return
         for m in tx["Month"].unique():
             d = self.cfg.root_dir / m
             d.mkdir(exist_ok=True)
             target = d / f"{m}.{self.account.filename}"
-            self.append_transactions(target, tx[tx["Month"] == m])
+            if self.buffer is None:
+                with file_lock(target):
+                    self.append_transactions(target, tx[tx["Month"] == m])
+            else:
+                self.buffer.add(self, target, tx[tx["Month"] == m])
             summary.add_target(target)
 
     def append_transactions(self, csv: Path, new_transactions: DataFrame):
+        """
+        Write new transactions into a monthly file, skipping the ones already written.
+
+        Monthly files are sorted by date. When all the new transactions happen after the last
+        row of the file, which is the usual case when importing the latest download, they are
+        appended to the file. Otherwise, the whole file is read, merged and rewritten.
+
+        :param csv: the monthly file
+        :param new_transactions: the new transactions of the month
+        """
         df = new_transactions.copy()
+        last_date = read_last_date(csv, TRANSACTION_FILE_COLUMNS) if csv.exists() else None
+        if last_date is not None and (df["Date"] > last_date).all():
+            logging.debug(f"Appending {len(df)} transactions to {csv}")
+            df = df.drop_duplicates(subset=["Date", "Label", "Amount"], keep="last")
+            df = df.sort_values(by=["Date", "Label"])
+            df.to_csv(
+                csv,
+                mode="a",
+                header=False,
+                columns=TRANSACTION_FILE_COLUMNS,
+                index=None,
+                date_format="%Y-%m-%d",
+            )
+            return
+
         if csv.exists():
             existing = pd.read_csv(csv, parse_dates=["Date"])
 
@@ -68,21 +269,13 @@ class TransactionPipeline(Pipeline, metaclass=ABCMeta):
                     Currency=lambda row: self.account.currency_symbol
                 )
 
-            df = df.append(existing, sort=False)
+            df = pd.concat([df, existing], sort=False)
 
         df = df.drop_duplicates(subset=["Date", "Label", "Amount"], keep="last")
         df = df.sort_values(by=["Date", "Label"])
         df.to_csv(
             csv,
-            columns=[
-                "Date",
-                "Label",
-                "Amount",
-                "Currency",
-                "Type",
-                "MainCategory",
-                "SubCategory",
-            ],
+            columns=TRANSACTION_FILE_COLUMNS,
             index=None,
             date_format="%Y-%m-%d",
         )
@@ -96,6 +289,45 @@ class TransactionPipeline(Pipeline, metaclass=ABCMeta):
         """
         return df
 
+    def autocomplete(self, df: DataFrame) -> DataFrame:
+        """
+        Complete the type and the categories of transactions using the auto-completion rules of
+        the configuration. Each distinct label is resolved once, then the results are assigned to
+        all the matching rows in bulk. The first matching rule wins.
+
+        :param df: the DataFrame for transactions
+        :return: the same DataFrame, completed
+        """
+        completer = self.cfg.completer
+        if df.empty or not completer.completions:
+            return df
+
+        codes, labels = pd.factorize(df["Label"])
+        # the extra slot maps missing labels (code -1) to "no completion" (-1)
+        found = np.array(completer.find_all(labels) + [-1], dtype=int)
+        indices = found[codes]
+        mask = indices >= 0
+        if not mask.any():
+            return df
+
+        matched = indices[mask]
+        completions = completer.completions
+        df.loc[mask, "Type"] = np.array([c.tx_type for c in completions], dtype=object)[matched]
+        df.loc[mask, "MainCategory"] = np.array(
+            [c.main_category for c in completions], dtype=object
+        )[matched]
+        df.loc[mask, "SubCategory"] = np.array(
+            [c.sub_category for c in completions], dtype=object
+        )[matched]
+        return df
+
+    def select_transactions(self, raw: Tuple[DataFrame, DataFrame]) -> DataFrame:
+        """
+        Select the new transactions from the raw content of a download, see `read_raw`.
+        """
+        _, tx = raw
+        return tx
+
     @abstractmethod
     def read_new_transactions(self, csv: Path) -> DataFrame:
         """
@@ -118,6 +350,44 @@ class TransactionPipeline(Pipeline, metaclass=ABCMeta):
         pass
 
 
+class TransactionBuffer:
+    """
+    Buffer of new transactions, grouped by target file.
+
+    Importing several overlapping downloads of the same account targets the same monthly files
+    again and again. Instead of reading, deduplicating, sorting and writing a monthly file once
+    per download, the transaction pipelines add their new transactions to this buffer, which
+    writes each target exactly once when flushed. The result is the same as appending the
+    downloads one after another: on duplicates, existing transactions win over new ones, and
+    earlier downloads win over later ones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[Path, Tuple[TransactionPipeline, List[DataFrame]]] = {}
+
+    @property
+    def targets(self) -> List[Path]:
+        return sorted(self._pending)
+
+    def add(self, pipeline: TransactionPipeline, target: Path, new_transactions: DataFrame):
+        with self._lock:
+            _, dfs = self._pending.setdefault(target, (pipeline, []))
+            dfs.append(new_transactions)
+
+    def flush_target(self, target: Path):
+        with self._lock:
+            pipeline, dfs = self._pending.pop(target)
+        # newest first, so that `drop_duplicates(keep="last")` keeps the oldest
+        new_transactions = pd.concat(reversed(dfs), sort=False)
+        with file_lock(target):
+            pipeline.append_transactions(target, new_transactions)
+
+    def flush(self):
+        for target in self.targets:
+            self.flush_target(target)
+
+
 class NoopTransactionPipeline(TransactionPipeline):
     def run(self, source: Path, summary: Summary) -> None:
         pass
@@ -128,13 +398,23 @@ class NoopTransactionPipeline(TransactionPipeline):
 
 class BalancePipeline(Pipeline, metaclass=ABCMeta):
     def run(self, path: Path, summary: Summary):
-        new_lines = self.read_new_balances(path)
+        self.write_new_balances(path, self.read_new_balances(path), summary)
+
+    def write_new_balances(self, path: Path, new_lines: DataFrame, summary: Summary):
+        summary.add_source(path)
+        if self.database is not None:
+            self.database.insert_balances(
+                self.account.id, self.account.currency_symbol, new_lines
+            )
+            summary.add_target(self.database.path)
+            return
 
         original_balance_file = self.cfg.root_dir / self.account.balance_filename
-        original_balance_df = self.insert_balance(original_balance_file, new_lines)
-        self.write_balance(original_balance_file, original_balance_df)
+        with file_lock(original_balance_file):
+            if not self.upsert_balance(original_balance_file, new_lines):
+                original_balance_df = self.insert_balance(original_balance_file, new_lines)
+                self.write_balance(original_balance_file, original_balance_df)
 
-        summary.add_source(path)
         summary.add_target(original_balance_file)
 
     def read_balance(self, path: Path) -> DataFrame:
@@ -163,15 +443,75 @@ class BalancePipeline(Pipeline, metaclass=ABCMeta):
                     Currency=lambda row: self.account.currency_symbol
                 )
 
-            df = df.append(existing, sort=False)
+            df = pd.concat([df, existing], sort=False)
 
         df = df.drop_duplicates(subset=["Date"], keep="last")
         df = df.sort_values(by="Date")
         df = df.reset_index(drop=True)
         return df
 
+    def upsert_balance(self, csv: Path, new_lines: DataFrame) -> bool:
+        """
+        Insert new balances into a balance file in place.
+
+        The rows of the file are sorted by date: the position of each new balance is found by
+        binary search, and only the rows after the first inserted balance are rewritten. In the
+        usual case, the new balance is the most recent one and it is appended to the file. As
+        for `insert_balance`, the balances already written for the same dates are kept.
+
+        :param csv: the balance file
+        :param new_lines: the new balances
+        :return: false if the file cannot be updated in place, e.g. because it does not exist,
+            has other columns, or would be written with another date format. The whole file
+            should be rewritten instead, see `insert_balance`.
+        """
+        data = csv.read_bytes() if csv.exists() else b""
+        header = (",".join(BALANCE_FILE_COLUMNS) + "\n").encode()
+        if not data.startswith(header) or len(data) == len(header) or not data.endswith(b"\n"):
+            return False
+        rows = data[len(header):-1].split(b"\n")
+        dates = [r.split(b",", 1)[0].decode() for r in rows]
+        if any(a >= b for a, b in zip(dates, dates[1:])):
+            return False
+        if new_lines.empty:
+            return True
+        date_format = balance_date_format(dates, new_lines["Date"])
+        if date_format is None:
+            return False
+
+        new_df = new_lines.drop_duplicates(subset=["Date"], keep="last")
+        new_dates = new_df["Date"].dt.strftime(date_format).tolist()
+        positions = [bisect_left(dates, d) for d in new_dates]
+        inserted = [p == len(dates) or dates[p] != d for p, d in zip(positions, new_dates)]
+        if not any(inserted):
+            logging.debug(f"Balances of {csv} are up to date")
+            return True
+
+        new_df = new_df[inserted]
+        new_dates = [d for d, i in zip(new_dates, inserted) if i]
+        new_rows = new_df.to_csv(
+            header=False,
+            index=None,
+            columns=BALANCE_FILE_COLUMNS,
+            float_format="%.2f",
+            date_format=date_format,
+        ).encode().splitlines()
+        first = min(p for p, i in zip(positions, inserted) if i)
+        tail = sorted(zip(dates[first:] + new_dates, rows[first:] + new_rows))
+        offset = len(header) + sum(len(r) + 1 for r in rows[:first])
+        logging.debug(f"Writing {len(new_df)} balances to {csv} from offset {offset}")
+        write_tail(csv, offset, "".join(r.decode() + "\n" for _, r in tail))
+        return True
+
     def write_balance(self, csv: Path, df: DataFrame) -> DataFrame:
-        df.to_csv(csv, index=None, columns=["Date", "Amount", "Currency"], float_format="%.2f")
+        df.to_csv(csv, index=None, columns=BALANCE_FILE_COLUMNS, float_format="%.2f")
+
+    def select_balances(self, raw: Tuple[DataFrame, DataFrame]) -> DataFrame:
+        """
+        Select the new balances from the raw content of a download, see `read_raw`.
+        """
+        balances, _ = raw
+        return balances
 
     @abstractmethod
     def read_new_balances(self, csv: Path) -> DataFrame:
@@ -186,6 +526,58 @@ class GeneralBalancePipeline(BalancePipeline):
         pass
 
 
+class IngestPipeline(Pipeline):
+    """
+    Pipeline importing both the transactions and the balances of a download.
+
+    For companies providing both in the same file (see `read_raw`), the download is read once and
+    its content is dispatched to the transaction pipeline and the balance pipeline. Otherwise,
+    the two pipelines run one after another, each reading the download on its own.
+    """
+
+    def __init__(
+        self,
+        transactions: TransactionPipeline,
+        balances: BalancePipeline,
+        single_pass: bool,
+    ):
+        super().__init__(transactions.account, transactions.cfg)
+        self.transactions = transactions
+        self.balances = balances
+        self.single_pass = single_pass
+
+    def run(self, path: Path, summary: Summary) -> None:
+        self.write(path, *self.read(path), summary)
+
+    def read(self, path: Path) -> Tuple[Optional[DataFrame], Optional[DataFrame]]:
+        """
+        Read the new transactions and the new balances of a download, without writing anything.
+
+        :return: the new transactions and the new balances, None when the account does not
+            import them, see `NoopTransactionPipeline` and `GeneralBalancePipeline`
+        """
+        if not self.single_pass:
+            return (
+                self.transactions.read_new_transactions(path),
+                self.balances.read_new_balances(path),
+            )
+        raw = self.transactions.read_raw_cached(path)
+        return self.transactions.select_transactions(raw), self.balances.select_balances(raw)
+
+    def write(
+        self,
+        path: Path,
+        transactions: Optional[DataFrame],
+        balances: Optional[DataFrame],
+        summary: Summary,
+    ) -> None:
+        """Write the content of a download, see `read`."""
+        if transactions is not None:
+            self.transactions.write_new_transactions(path, transactions, summary)
+        if balances is not None:
+            self.balances.write_new_balances(path, balances, summary)
+
+
 class AccountParser:
     def __init__(self, cfg: Configuration):
         self.accounts = cfg.as_dict()
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 from .account import (
     Account,
@@ -14,24 +15,65 @@ from .caisse_epargne import (
     CaisseEpargneTransactionPipeline,
     CaisseEpargneBalancePipeline,
 )
+from .database import Database
 from .fortuneo import FortuneoAccount, FortuneoTransactionPipeline
+from .manifest import ConvertManifest, TransactionIndex
 from .models import Configuration
 from .pipeline import (
+    TransactionBuffer,
     TransactionPipeline,
     NoopTransactionPipeline,
     BalancePipeline,
     GeneralBalancePipeline,
     AccountParser,
+    IngestPipeline,
+    SourceCache,
 )
-from .exchange_rate import ExchangeRatePipeline, ConvertBalancePipeline
+from .exchange_rate import ExchangeRatePipeline, ConvertBalancePipeline, ExchangeRateStore
 from .revolut import RevolutAccount, RevolutTransactionPipeline, RevolutBalancePipeline
 
 
 class PipelineFactory:
-    def __init__(self, cfg: Configuration):
+    def __init__(
+        self,
+        cfg: Configuration,
+        buffer: Optional[TransactionBuffer] = None,
+        sources: Optional[SourceCache] = None,
+        rates: Optional[ExchangeRateStore] = None,
+        convert_manifest: Optional[ConvertManifest] = None,
+        database: Optional[Database] = None,
+        index: Optional[TransactionIndex] = None,
+    ):
+        """
+        :param cfg: the configuration
+        :param buffer: the buffer of the new transactions, if they should be written at the end of
+            the run rather than immediately
+        :param sources: the cache of parsed downloads, if they should be reused by the next runs
+        :param rates: the exchange rates, if they should be shared by pipelines
+        :param convert_manifest: the manifest of the previous conversions, if only the changed
+            balances should be converted
+        :param database: the database storing the data, if they are not stored as CSV files
+        :param index: the index of the transactions already written, if they should be skipped
+            without reading the monthly files
+        """
         self.cfg = cfg
+        self.buffer = buffer
+        self.sources = sources
+        self.rates = rates
+        self.convert_manifest = convert_manifest
+        self.database = database
+        self.index = index
+        self._parser: Optional[AccountParser] = None
 
     def new_transaction_pipeline(self, account: Account) -> TransactionPipeline:
+        pipeline = self._new_transaction_pipeline(account)
+        pipeline.buffer = self.buffer
+        pipeline.sources = self.sources
+        pipeline.database = self.database
+        pipeline.index = self.index
+        return pipeline
+
+    def _new_transaction_pipeline(self, account: Account) -> TransactionPipeline:
         if isinstance(account, BnpAccount):
             return BnpTransactionPipeline(account, self.cfg)
         if isinstance(account, BoursoramaAccount):
@@ -47,6 +89,12 @@ class PipelineFactory:
         return NoopTransactionPipeline(account, self.cfg)
 
     def new_balance_pipeline(self, account: Account) -> BalancePipeline:
+        pipeline = self._new_balance_pipeline(account)
+        pipeline.sources = self.sources
+        pipeline.database = self.database
+        return pipeline
+
+    def _new_balance_pipeline(self, account: Account) -> BalancePipeline:
         if isinstance(account, BnpAccount):
             return BnpBalancePipeline(account, self.cfg)
         if isinstance(account, BoursoramaAccount):
@@ -59,12 +107,29 @@ class PipelineFactory:
             return RevolutBalancePipeline(account, self.cfg)
         return GeneralBalancePipeline(account, self.cfg)
 
+    def new_ingest_pipeline(self, account: Account) -> IngestPipeline:
+        transactions = self.new_transaction_pipeline(account)
+        balances = self.new_balance_pipeline(account)
+        # Companies providing transactions and balances in the same download, see `read_raw`
+        single_pass = isinstance(
+            account, (BnpAccount, BoursoramaAccount, CaisseEpargneAccount)
+        ) or (isinstance(account, RevolutAccount) and not account.skip_integration)
+        return IngestPipeline(transactions, balances, single_pass)
+
     def new_exchange_rate_pipeline(self) -> ExchangeRatePipeline:
-        return ExchangeRatePipeline(None, self.cfg)
+        pipeline = ExchangeRatePipeline(None, self.cfg)
+        pipeline.database = self.database
+        return pipeline
 
-    def new_convert_balance_pipeline(self, account: Account) -> BalancePipeline:
-        return ConvertBalancePipeline(account, self.cfg)
+    def new_convert_balance_pipeline(self, account: Account) -> ConvertBalancePipeline:
+        pipeline = ConvertBalancePipeline(account, self.cfg)
+        pipeline.rates = self.rates
+        pipeline.manifest = self.convert_manifest
+        pipeline.database = self.database
+        return pipeline
 
     def parse_balance_pipeline(self, path: Path) -> BalancePipeline:
-        account = AccountParser(self.cfg).parse(path)
-        return self.new_balance_pipeline(account)
+        # the accounts are indexed once, the same factory usually parses many paths
+        if self._parser is None:
+            self._parser = AccountParser(self.cfg)
+        return self.new_balance_pipeline(self._parser.parse(path))
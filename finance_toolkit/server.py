@@ -0,0 +1,187 @@
+"""
+Server running the commands of a finance root, started by `finance-toolkit serve`.
+
+Every CLI call imports pandas, loads the configuration and reads the CSV files again. The server
+does it once and keeps the result in memory between commands: the configuration with its
+auto-complete matchers, the parsed downloads, the exchange rates and the merged transactions.
+Changes on disk are detected before each command, using the modification time and size of the
+files, so the results are the same as running the command in a new process.
+
+The server listens on a Unix socket in the finance root, see module `client`. Commands are run
+one at a time.
+"""
+import io
+import json
+import logging
+import os
+import socketserver
+import threading
+import traceback
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .client import HEARTBEAT_INTERVAL, ServerError, send, socket_path
+from .configurator import Configurator
+from .exchange_rate import ExchangeRateStore
+from .manifest import MergeManifest
+from .models import Configuration, Storage
+from .pipeline import SourceCache
+from .tx import convert, export, load_merge_manifest, merge, merge_fingerprint, move
+
+
+class FinanceServer:
+    def __init__(self, cfg_path: Path):
+        self.cfg_path = cfg_path
+        self.cfg: Optional[Configuration] = None
+        self.download_dir: Optional[Path] = None
+        self.rates: Optional[ExchangeRateStore] = None
+        self.manifest: Optional[MergeManifest] = None
+        self.sources = SourceCache()
+        self._stats: Dict[Path, Optional[Tuple[int, int]]] = {}
+
+    def _changed(self, path: Path) -> bool:
+        """Returns true if the file changed since the last call for the same path."""
+        try:
+            stat = path.stat()
+            current = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            current = None
+        changed = path not in self._stats or self._stats[path] != current
+        self._stats[path] = current
+        return changed
+
+    def configuration(self) -> Configuration:
+        if self._changed(self.cfg_path) or self.cfg is None:
+            logging.info(f"Loading configuration {self.cfg_path}")
+            try:
+                self.cfg = Configurator.load(self.cfg_path)
+            except Exception:
+                del self._stats[self.cfg_path]  # load it again on the next command
+                raise
+            self.download_dir = self.cfg.download_dir
+            self.manifest = None
+        return self.cfg
+
+    def exchange_rates(self, cfg: Configuration) -> Optional[ExchangeRateStore]:
+        path = cfg.exchange_rate_csv_path
+        if self._changed(path) or self.rates is None:
+            try:
+                self.rates = ExchangeRateStore.load(path) if path.exists() else None
+            except Exception:
+                del self._stats[path]
+                raise
+        return self.rates
+
+    def merge_manifest(self, cfg: Configuration) -> MergeManifest:
+        # the monthly files are checked by the manifest itself, see `MergeManifest.lookup`
+        if self.manifest is None or self.manifest.fingerprint != merge_fingerprint(cfg):
+            self.manifest = load_merge_manifest(cfg)
+        return self.manifest
+
+    def handle(self, command: str, options: Dict, download_dir: Optional[str] = None) -> str:
+        """
+        Run a command.
+
+        :param command: the name of the command, e.g. "merge"
+        :param options: the options of the command
+        :param download_dir: the download directory of the client, if overridden
+        :return: the output of the command
+        """
+        cfg = self.configuration()
+        cfg.download_dir = Path(download_dir).expanduser() if download_dir else self.download_dir
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            if command == "categories":
+                prefix = options["prefix"]
+                for c in cfg.categories(lambda s: s.startswith(prefix)):
+                    print(c)
+            elif command == "move":
+                move(cfg, jobs=options["jobs"], sources=self.sources)
+            elif command == "convert":
+                # the rates of the database are read by the command, see `exchange_rates`
+                rates = None if cfg.storage == Storage.SQLITE else self.exchange_rates(cfg)
+                convert(cfg, full=options["full"], rates=rates)
+            elif command == "merge":
+                merge(
+                    cfg,
+                    columnar=options["columnar"],
+                    jobs=options["jobs"],
+                    manifest=self.merge_manifest(cfg),
+                )
+            elif command == "export":
+                export(cfg)
+            else:
+                raise ValueError(f"Unknown command: {command!r}")
+        return output.getvalue()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        logging.info(f"Running {request['command']!r} with options {request['options']}")
+        response = {}
+        worker = threading.Thread(target=self.run, args=(request, response))
+        worker.start()
+        try:
+            # tell the client that the command is still running, see `client.TIMEOUT`
+            while worker.join(HEARTBEAT_INTERVAL) or worker.is_alive():
+                self.wfile.write(b"\n")
+                self.wfile.flush()
+        except OSError:  # the client is gone, the command completes anyway
+            worker.join()
+            return
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+    def run(self, request: Dict, response: Dict):
+        try:
+            output = self.server.finance.handle(
+                request["command"], request["options"], request.get("download_dir")
+            )
+            response.update(ok=True, output=output)
+        except Exception:
+            logging.exception(f"Failed to run {request['command']!r}")
+            response.update(ok=False, error=traceback.format_exc())
+
+
+def new_server(cfg_path: Path) -> socketserver.UnixStreamServer:
+    """
+    Create a server for the finance root of the given configuration file.
+
+    :raises RuntimeError: if a server is already running for this finance root
+    """
+    path = socket_path(cfg_path.parent)
+    if path.exists():
+        try:
+            running = send(cfg_path.parent, "categories", {"prefix": ""}) is not None
+        except ServerError:
+            running = True
+        if running:
+            raise RuntimeError(f"A server is already running on {path}")
+        path.unlink(missing_ok=True)  # left by a server which was killed
+
+    finance = FinanceServer(cfg_path)
+    finance.configuration()
+
+    # the socket gives access to personal finance data, only the owner can connect
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(str(path), RequestHandler)
+    finally:
+        os.umask(umask)
+    server.finance = finance
+    return server
+
+
+def serve(cfg_path: Path):
+    server = new_server(cfg_path)
+    path = socket_path(cfg_path.parent)
+    print(f"Serving {cfg_path.parent} on {path}, press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        path.unlink(missing_ok=True)
@@ -1,209 +1,27 @@
 """Finance Tools"""
 
-import os
+import hashlib
+import json
+import logging
 from pathlib import Path
 import re
-from typing import List, Dict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-import yaml
 from pandas import DataFrame, Series
 
-from .account import (
-    Account,
-    DegiroAccount,
-    OctoberAccount,
-)
-from .bnp import BnpAccount
-from .boursorama import BoursoramaAccount
-from .caisse_epargne import CaisseEpargneAccount
-from .fortuneo import FortuneoAccount
-from .models import Configuration, Summary, TxCompletion, TxType, ExchangeRateConfig
-from .pipeline import AccountParser
+from . import ledger
+from .account import Account, FileRouter
+from .catalog import Catalog
+from .configurator import Configurator  # noqa: F401, re-exported for compatibility
+from .database import Database, export as export_database, open_database
+from .exchange_rate import ExchangeRateStore
+from .manifest import ConvertManifest, MergeManifest, TransactionIndex
+from .models import Configuration, Summary, TxType
+from .pipeline import AccountParser, IngestPipeline, SourceCache, TransactionBuffer
 from .pipeline_factory import PipelineFactory
-from .revolut import RevolutAccount
-
-
-class Configurator:
-    """
-    Configurator parses and validates user configuration.
-    """
-
-    @classmethod
-    def load_accounts(cls, raw: Dict) -> List[Account]:
-        accounts = []
-        for symbolic_name, fields in raw.items():
-            company = fields["company"]
-            if company == "BNP":
-                if "expr" in fields:
-                    print(
-                        "BNP Paribas has its own naming convention for downloaded files,"
-                        f" you cannot overwrite it: expr={fields['expr']!r}"
-                    )
-                accounts.append(
-                    BnpAccount(
-                        account_type=fields["type"],
-                        account_id=symbolic_name,
-                        account_num=fields["id"],
-                    )
-                )
-            elif company == "Boursorama":
-                if "expr" in fields:
-                    print(
-                        "Boursorama has its own naming convention for downloaded files,"
-                        f" you cannot overwrite it: expr={fields['expr']!r}"
-                    )
-                accounts.append(
-                    BoursoramaAccount(
-                        account_type=fields["type"],
-                        account_id=symbolic_name,
-                        account_num=fields["id"],
-                    )
-                )
-            elif company == "Caisse d'Epargne":
-                if "expr" in fields:
-                    print(
-                        "Caisse d'Epargne has its own naming convention for downloaded files,"
-                        f" you cannot overwrite it: expr={fields['expr']!r}"
-                    )
-                accounts.append(
-                    CaisseEpargneAccount(
-                        account_type=fields["type"],
-                        account_id=symbolic_name,
-                        account_num=fields["id"],
-                    )
-                )
-            elif company == "Degiro":
-                accounts.append(
-                    DegiroAccount(
-                        account_type=fields["type"],
-                        account_id=symbolic_name,
-                        account_num=fields["id"],
-                    )
-                )
-            elif company == "Fortuneo":
-                if "expr" in fields:
-                    print(
-                        "Fortuneo has its own naming convention for downloaded files,"
-                        f" you cannot overwrite it: expr={fields['expr']!r}"
-                    )
-                accounts.append(
-                    FortuneoAccount(
-                        account_type=fields["type"],
-                        account_id=symbolic_name,
-                        account_num=fields["id"],
-                    )
-                )
-            elif company == "Revolut":
-                if "expr" in fields:
-                    print(
-                        "Revolut has its own naming convention for downloaded files,"
-                        f" you cannot overwrite it: expr={fields['expr']!r}"
-                    )
-                accounts.append(
-                    RevolutAccount(
-                        account_type=fields["type"],
-                        account_id=symbolic_name,
-                        account_num=fields["id"],
-                        currency=fields["currency"],
-                        extra_patterns=(
-                            fields["expressions"] if "expressions" in fields else None
-                        ),
-                    )
-                )
-            elif company == "October":
-                if "expr" in fields:
-                    print(
-                        "October has its own naming convention for downloaded files,"
-                        f" you cannot overwrite it: expr={fields['expr']!r}"
-                    )
-                accounts.append(
-                    OctoberAccount(
-                        account_type=fields["type"],
-                        account_id=symbolic_name,
-                        account_num=fields["id"],  # full id required by data lookup
-                    )
-                )
-            else:
-                accounts.append(
-                    Account(
-                        account_type=fields["type"],
-                        account_id=symbolic_name,
-                        account_num=fields["id"],
-                        patterns=["unknown"],
-                        currency=fields["currency"],
-                    )
-                )
-
-        # Validate no duplicate Caisse d'Epargne account IDs (suffixes)
-        cls._validate_no_duplicate_caisse_epargne_accounts(accounts)
-
-        accounts.sort(key=lambda a: a.id)
-        return accounts
-
-    @classmethod
-    def _validate_no_duplicate_caisse_epargne_accounts(cls, accounts: List[Account]):
-        """
-        Validate that no two Caisse d'Epargne accounts have the same account number (suffix).
-        Since account numbers are suffixes, duplicates would cause ambiguous file matching.
-        """
-        ce_accounts = [a for a in accounts if isinstance(a, CaisseEpargneAccount)]
-        seen_nums: Dict[str, List[str]] = {}
-        for account in ce_accounts:
-            if account.num not in seen_nums:
-                seen_nums[account.num] = []
-            seen_nums[account.num].append(account.id)
-
-        dup_details = [
-            f"  - Account ID suffix '{num}' is used by: {', '.join(ids)}"
-            for num, ids in seen_nums.items()
-            if len(ids) > 1
-        ]
-        if dup_details:
-            raise ValueError(
-                "Duplicate Caisse d'Epargne account ID suffixes found. "
-                "This would cause ambiguous file matching.\n" + "\n".join(dup_details)
-            )
-
-    @classmethod
-    def load_categories(cls, raw: List[str]) -> List[str]:
-        return [] if raw is None else raw
-
-    @classmethod
-    def load_autocomplete(cls, raw: List) -> List[TxCompletion]:
-        return [] if raw is None else [TxCompletion.load(p) for p in raw]
-
-    @classmethod
-    def load_exchange_rates(cls, raw: Dict) -> ExchangeRateConfig:
-        return ExchangeRateConfig(watched_currencies=raw["watched-currencies"])
-
-    @classmethod
-    def parse_yaml(cls, path: Path) -> Configuration:
-        data = yaml.safe_load(path.read_text())
-        accounts = cls.load_accounts(data["accounts"])
-        categories = cls.load_categories(data["categories"])
-        categories_to_rename = data["categories_to_rename"]
-        autocomplete = cls.load_autocomplete(data["auto-complete"])
-        download_dir = Path(data["download-dir"]).expanduser()
-        root_dir = path.parent
-        exchange_rate_cfg = cls.load_exchange_rates(data["exchange-rate"])
-        return Configuration(
-            accounts=accounts,
-            categories=categories,
-            categories_to_rename=categories_to_rename,
-            autocomplete=autocomplete,
-            download_dir=download_dir,
-            root_dir=root_dir,
-            exchange_rate_cfg=exchange_rate_cfg,
-        )
-
-    @classmethod
-    def load(cls, path: Path) -> Configuration:
-        cfg = cls.parse_yaml(path)
-        # override download directory
-        if os.getenv("DOWNLOAD_DIR"):
-            cfg.download_dir = Path(os.getenv("DOWNLOAD_DIR")).expanduser()
-        return cfg
 
 
 LABELS = {
@@ -228,18 +46,55 @@ def validate_tx(row: Series, cfg: Configuration) -> str:
     return ""  # no error
 
 
-def read_transactions(path: Path, cfg: Configuration) -> DataFrame:
+def parse_transactions(path: Path, cfg: Configuration) -> Tuple[DataFrame, List[Tuple[int, str]]]:
+    """
+    Read transactions from a monthly CSV file and drop the invalid ones.
+
+    :return: the valid transactions, and the line-numbered errors of the invalid ones
+    """
     df = pd.read_csv(path, parse_dates=["Date"])
+    df, errors = validate_transactions(df, cfg)
+    return df, [(i + 2, err) for i, err in errors]  # base-1 (+1) and header (+1)
+
+
+def validate_transactions(
+    df: DataFrame, cfg: Configuration
+) -> Tuple[DataFrame, List[Tuple[int, str]]]:
+    """
+    Drop the invalid transactions.
+
+    :return: the valid transactions, and the errors of the invalid ones with their position
+    """
+    tx_types = df["Type"].astype(str)
+    categories = df["MainCategory"].astype(str) + "/" + df["SubCategory"].astype(str)
+
+    # same rules as `validate_tx`, evaluated on all the rows at once
+    unknown_type = ~df["Type"].isin(TxType.values())
+    unknown_category = (df["Type"] == TxType.EXPENSE.value) & ~categories.isin(cfg.category_set)
+    invalid = unknown_type | unknown_category
+    if not invalid.any():
+        return df, []
+
     errors = []
-    for idx, row in df.iterrows():
-        err = validate_tx(row, cfg)
-        if err:
-            df.drop(idx, inplace=True)
-            errors.append((idx + 2, err))  # base-1 (+1) and header (+1)
+    for i in np.flatnonzero(invalid.to_numpy()):
+        if unknown_type.iat[i]:
+            err = f"Unknown transaction type: {tx_types.iat[i]}"
+        else:
+            err = f"Category {categories.iat[i]!r} does not exist."
+        errors.append((int(i), err))
+    return df[~invalid], errors
+
+
+def print_errors(path: Path, errors: List[Tuple[int, str]]):
     if errors:
         print(f"{path}:")
         for line, err in errors:
             print(f"  - Line {line}: {err}")
+
+
+def read_transactions(path: Path, cfg: Configuration) -> DataFrame:
+    df, errors = parse_transactions(path, cfg)
+    print_errors(path, errors)
     return df
 
 
@@ -253,25 +108,66 @@ def rename_categories(df: DataFrame, cfg: Configuration) -> DataFrame:
 
 
 def merge_bank_tx(dfs: List[DataFrame], cfg: Configuration) -> DataFrame:
-    merged_df = dfs[0]
-    for df in dfs[1:]:
-        merged_df = merged_df.append(df, sort=False)
-
+    merged_df = pd.concat(dfs, sort=False, ignore_index=True)
     merged_df = rename_categories(merged_df, cfg)
+    return merged_df
+
+
+BALANCE_DTYPES = {
+    "Date": "datetime64[ns]",
+    "Account": "object",
+    "AccountId": "object",
+    "Amount": "float64",
+    "AccountType": "object",
+}
 
-    return merged_df.reset_index(drop=True)
+
+def read_stored_transactions(database: Database, cfg: Configuration) -> DataFrame:
+    """
+    Read the transactions of the database and drop the invalid ones, as `read_transactions` does
+    for a monthly file.
+    """
+    df = database.read_transactions()
+    valid_df, errors = validate_transactions(df, cfg)
+    if errors:
+        print(f"{database.path}:")
+        for i, err in errors:
+            row = df.iloc[i]
+            print(f"  - {row.Account} {row.Date:%Y-%m-%d} {row.Label!r}: {err}")
+    return valid_df[MONTHLY_COLUMNS]
+
+
+def read_stored_balances(database: Database, cfg: Configuration) -> DataFrame:
+    """
+    Read the balances in EUR stored in the database, as `merge_balances` does for the balance
+    files.
+    """
+    accounts = cfg.as_dict()
+    m = database.read_balances("EUR")
+    m["AccountId"] = [accounts[a].num if a in accounts else "unknown" for a in m["Account"]]
+    m["AccountType"] = [accounts[a].type if a in accounts else "unknown" for a in m["Account"]]
+    m = m[list(BALANCE_DTYPES)].astype(BALANCE_DTYPES)
+    m = m.sort_values(by=["Date", "Account"])
+    return m.reset_index(drop=True)
 
 
 def merge_balances(paths: List[Path], cfg: Configuration) -> DataFrame:
-    m = pd.DataFrame(columns=["Date", "Account", "AccountId", "Amount", "AccountType"])
+    parser = AccountParser(cfg)
+    return merge_account_balances([(path, parser.parse(path)) for path in paths], cfg)
+
 
-    for path in paths:
-        pipeline = PipelineFactory(cfg).parse_balance_pipeline(path)
-        df = pipeline.read_balance(path)
-        m = m.append(df, sort=False)
+def merge_account_balances(files: List[Tuple[Path, Account]], cfg: Configuration) -> DataFrame:
+    cols = list(BALANCE_DTYPES)
+    factory = PipelineFactory(cfg)
+    dfs = [
+        factory.new_balance_pipeline(account).read_balance(path)[cols]
+        for path, account in files
+    ]
 
+    # concatenate once: appending in the loop would copy the accumulated rows every time
+    m = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame(columns=cols)
+    m = m.astype(BALANCE_DTYPES)
     m = m.sort_values(by=["Date", "Account"])
-    m = m[["Date", "Account", "AccountId", "Amount", "AccountType"]]
     return m.reset_index(drop=True)
 
 
@@ -280,39 +176,268 @@ def merge_balances(paths: List[Path], cfg: Configuration) -> DataFrame:
 # --------------------
 
 
-def move(cfg: Configuration):
-    paths = [child for child in cfg.download_dir.iterdir() if child.is_file()]
+def load_transaction_index(cfg: Configuration) -> TransactionIndex:
+    return TransactionIndex.load(
+        cfg.transaction_index_path, cfg.transaction_index_cache_path, cfg.root_dir
+    )
+
+
+def read_file(
+    path: Path, router: FileRouter, factory: PipelineFactory
+) -> List[Tuple[IngestPipeline, Tuple[Optional[DataFrame], Optional[DataFrame]]]]:
+    """Read a download for each of its accounts, see `IngestPipeline.read`."""
+    pipelines = [factory.new_ingest_pipeline(account) for account in router.route(path)]
+    return [(pipeline, pipeline.read(path)) for pipeline in pipelines]
+
+
+def write_file(
+    path: Path,
+    contents: List[Tuple[IngestPipeline, Tuple[Optional[DataFrame], Optional[DataFrame]]]],
+    factory: PipelineFactory,
+    summary: Summary,
+):
+    for pipeline, (transactions, balances) in contents:
+        pipeline.write(path, transactions, balances, summary)
+
+    if re.match(r"Webstat_Export_(.+)\.csv", path.name):
+        factory.new_exchange_rate_pipeline().run(path, summary)
+
+
+def move_file(path: Path, router: FileRouter, factory: PipelineFactory, summary: Summary):
+    write_file(path, read_file(path, router, factory), factory, summary)
+
+
+def move(cfg: Configuration, jobs: int = 1, sources: Optional[SourceCache] = None):
+    """
+    Import the files of the download directory into the finance root.
+
+    :param cfg: the configuration
+    :param jobs: the number of threads reading the downloads and writing the monthly files
+        concurrently. The downloads are written one after another in the order of their paths,
+        so that the result does not depend on the number of jobs.
+    :param sources: the cache of parsed downloads, if they should be reused by the next moves.
+        Each download is parsed once per move, so a cache is useless within a single command.
+    """
+    paths = sorted(child for child in cfg.download_dir.iterdir() if child.is_file())
     summary = Summary(cfg)
-    factory = PipelineFactory(cfg)
-    for path in paths:
-        for account in cfg.accounts:
-            if account.match(path):
-                factory.new_transaction_pipeline(account).run(path, summary)
-                factory.new_balance_pipeline(account).run(path, summary)
-
-        if re.match(r"Webstat_Export_(.+)\.csv", path.name):
-            factory.new_exchange_rate_pipeline().run(path, summary)
+    # monthly files are written once at the end, whatever the number of downloads targeting them
+    buffer = TransactionBuffer()
+    router = FileRouter(cfg.accounts)
+    with open_database(cfg) as database:
+        # the database has its own index of the transactions, see module `database`
+        index = None if database is not None else load_transaction_index(cfg)
+        factory = PipelineFactory(cfg, buffer, sources, database=database, index=index)
+        if jobs <= 1:
+            for path in paths:
+                move_file(path, router, factory, summary)
+            buffer.flush()
+        else:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                futures = [executor.submit(read_file, p, router, factory) for p in paths]
+                # on duplicates, the first download wins: write them in the same order as jobs=1
+                for path, future in zip(paths, futures):
+                    write_file(path, future.result(), factory, summary)
+                futures = [executor.submit(buffer.flush_target, t) for t in buffer.targets]
+                for future in futures:
+                    future.result()
+        if index is not None:
+            index.save()
+    logging.debug(f"Auto-complete label cache: {cfg.completer.cache_info()}")
     print(summary)
 
 
-def convert(cfg: Configuration):
-    parser = AccountParser(cfg)
+def convert(
+    cfg: Configuration,
+    full: bool = False,
+    rates: Optional[ExchangeRateStore] = None,
+    catalog: Optional[Catalog] = None,
+):
+    """
+    Convert the balances of the non-EUR accounts into EUR.
+
+    :param cfg: the configuration
+    :param full: convert the whole balance history of each account, instead of the balances
+        which changed since the last conversion
+    :param rates: the exchange rates, read from the exchange rate file (or the database) if not
+        provided
+    :param catalog: the data files of the finance root, scanned if not provided. The converted
+        balance files are added to it.
+    """
     summary = Summary(cfg, action="convert")
-    factory = PipelineFactory(cfg)
+    with open_database(cfg) as database:
+        if database is not None:
+            factory = PipelineFactory(cfg, rates=rates, database=database)
+            for account in cfg.accounts:
+                if account.is_currency_conversion_needed:
+                    factory.new_convert_balance_pipeline(account).run_on_database(summary)
+            print(summary)
+            return
+
+    if catalog is None:
+        catalog = Catalog.scan(cfg)
+    results = [f for f in catalog.balances() if f.is_currency_conversion_needed]
+    if results:
+        # the exchange rates are read once for all the accounts
+        if rates is None:
+            rates = ExchangeRateStore.load(cfg.exchange_rate_csv_path)
+        if full:
+            manifest = ConvertManifest(cfg.convert_manifest_path)
+        else:
+            manifest = ConvertManifest.load(cfg.convert_manifest_path)
+        factory = PipelineFactory(cfg, rates=rates, convert_manifest=manifest)
+        for result in results:
+            factory.new_convert_balance_pipeline(result.account).run(result.path, summary)
+        manifest.save()
+        for target in summary.targets:
+            catalog.add(target)
+    print(summary)
+
+
+def merge_fingerprint(cfg: Configuration) -> str:
+    """
+    Returns the fingerprint of the configuration used for reading monthly transactions. Cached
+    transactions are only valid for the same fingerprint.
+    """
+    data = {
+        "accounts": sorted(cfg.as_dict()),
+        "categories": sorted(cfg.category_set),
+        "types": sorted(TxType.values()),
+    }
+    return hashlib.sha256(json.dumps(data).encode()).hexdigest()
+
+
+MONTHLY_COLUMNS = [
+    "Date",
+    "Account",
+    "Label",
+    "Amount",
+    "Type",
+    "MainCategory",
+    "SubCategory",
+]
+
+
+def read_monthly_file(
+    path: Path, account_id: str, cfg: Configuration
+) -> Tuple[DataFrame, List[Tuple[int, str]]]:
+    logging.debug(f"Reading transactions from {path}")
+    df, errors = parse_transactions(path, cfg)
+    df["Account"] = account_id
+    return df[MONTHLY_COLUMNS], errors
+
+
+# configuration of the current worker process, see `read_monthly_files`
+_worker_cfg: Optional[Configuration] = None
+
+
+def _init_worker(cfg: Configuration):
+    global _worker_cfg
+    _worker_cfg = cfg
+
+
+def _read_monthly_file_in_worker(args: Tuple[Path, str]):
+    path, account_id = args
+    return read_monthly_file(path, account_id, _worker_cfg)
+
+
+def read_monthly_files(
+    files: List[Tuple[Path, str]], cfg: Configuration, jobs: int = 1
+) -> List[Tuple[DataFrame, List[Tuple[int, str]]]]:
+    """
+    Read monthly files, possibly in parallel.
+
+    :param files: the paths of the files, together with the id of their account
+    :param cfg: the configuration
+    :param jobs: the number of processes reading the files
+    :return: the transactions and the errors of each file, in the same order as the input
+    """
+    if jobs <= 1 or len(files) <= 1:
+        return [read_monthly_file(path, account_id, cfg) for path, account_id in files]
 
-    for path in cfg.root_dir.glob("balance.*.csv"):
-        result = parser.parse_path(path)
-        if result and result.is_currency_conversion_needed:
-            factory.new_convert_balance_pipeline(result.account).run(
-                result.path, summary
+    # the configuration is sent once per worker, and not once per file
+    with ProcessPoolExecutor(
+        max_workers=min(jobs, len(files)), initializer=_init_worker, initargs=(cfg,)
+    ) as executor:
+        return list(executor.map(_read_monthly_file_in_worker, files, chunksize=8))
+
+
+def load_merge_manifest(cfg: Configuration) -> MergeManifest:
+    return MergeManifest.load(cfg.merge_manifest_path, cfg.merge_cache_dir, merge_fingerprint(cfg))
+
+
+def read_monthly_transactions(
+    cfg: Configuration,
+    jobs: int = 1,
+    manifest: Optional[MergeManifest] = None,
+    catalog: Optional[Catalog] = None,
+) -> List[DataFrame]:
+    """
+    Read the transactions of all the monthly CSV files, sorted by path. Only the files changed
+    since the last merge are read, the other ones are taken from the merge manifest.
+
+    :param cfg: the configuration
+    :param jobs: the number of processes reading the changed files
+    :param manifest: the merge manifest, loaded from the finance root if not provided
+    :param catalog: the data files of the finance root, scanned if not provided
+    """
+    if manifest is None:
+        manifest = load_merge_manifest(cfg)
+    if catalog is None:
+        catalog = Catalog.scan(cfg)
+    files = catalog.monthly()
+
+    changed = [f for f in files if not manifest.lookup(f.key, f.path, f.stat)]
+    results = read_monthly_files([(f.path, f.account.id) for f in changed], cfg, jobs)
+    for f, (df, errors) in zip(changed, results):
+        manifest.update(f.key, f.path, df, errors, f.stat)
+
+    dfs = []
+    for f in files:
+        print_errors(f.path, manifest.entries[f.key].errors)
+        dfs.append(manifest.frame(f.key))
+
+    manifest.retain([f.key for f in files])
+    manifest.save()
+    return dfs
+
+
+def merge(
+    cfg: Configuration,
+    columnar: bool = False,
+    jobs: int = 1,
+    manifest: Optional[MergeManifest] = None,
+    catalog: Optional[Catalog] = None,
+):
+    """
+    Merge the monthly transactions into `total.csv` and the balances in euro into `balance.csv`.
+    When the data are stored in the database, they are read from it instead of CSV files.
+
+    :param cfg: the configuration
+    :param columnar: also write the results in a columnar format, see module `ledger`
+    :param jobs: the number of processes reading the monthly transactions
+    :param manifest: the merge manifest, loaded from the finance root if not provided
+    :param catalog: the data files of the finance root, scanned if not provided
+    """
+    with open_database(cfg) as database:
+        if database is None:
+            if catalog is None:
+                catalog = Catalog.scan(cfg)
+            bank_transactions = read_monthly_transactions(cfg, jobs, manifest, catalog)
+            # note: we only scan euro-related CSV files because euro is the base currencye
+            b = merge_account_balances(
+                [(f.path, f.account) for f in catalog.balances("EUR")], cfg
             )
-    print(summary)
+        else:
+            bank_transactions = [read_stored_transactions(database, cfg)]
+            b = read_stored_balances(database, cfg)
 
+    tx = merge_bank_tx(bank_transactions, cfg)
+    tx = tx.sort_values(by=["Date", "Account", "Label", "Amount"])
+    tx["Month"] = tx["Date"].apply(lambda d: d.strftime("%Y-%m"))
 
-def merge(cfg: Configuration):
-    bank_transactions = []
-    cols = [
+    tx_cols = [
         "Date",
+        "Month",
         "Account",
         "Label",
         "Amount",
@@ -320,32 +445,27 @@ def merge(cfg: Configuration):
         "MainCategory",
         "SubCategory",
     ]
-    for path in cfg.root_dir.glob("20[1-9]*/*.csv"):
-        account = AccountParser(cfg).parse(path)
-        df = read_transactions(path, cfg)
-        df["Account"] = account.id
-        bank_transactions.append(df[cols])
+    tx.to_csv(cfg.root_dir / "total.csv", columns=tx_cols, index=False)
+    b.to_csv(cfg.root_dir / "balance.csv", index=False)
 
-    tx = merge_bank_tx(bank_transactions, cfg)
-    tx = tx.sort_values(by=["Date", "Account", "Label", "Amount"])
-    tx["Month"] = tx["Date"].apply(lambda d: d.strftime("%Y-%m"))
+    if columnar:
+        ledger.write_total(tx[tx_cols], cfg.root_dir)
+        ledger.write_balances(b, cfg.root_dir)
+    print("Merge done")
 
-    tx.to_csv(
-        cfg.root_dir / "total.csv",
-        columns=[
-            "Date",
-            "Month",
-            "Account",
-            "Label",
-            "Amount",
-            "Type",
-            "MainCategory",
-            "SubCategory",
-        ],
-        index=False,
-    )
 
-    # note: we only scan euro-related CSV files because euro is the base currencye
-    b = merge_balances([p for p in cfg.root_dir.glob("balance.*.EUR.csv")], cfg)
-    b.to_csv(cfg.root_dir / "balance.csv", index=False)
-    print("Merge done")
+def export(cfg: Configuration):
+    """
+    Export the data of the database as CSV files, using the layout of the finance root.
+
+    :param cfg: the configuration
+    """
+    summary = Summary(cfg, action="export")
+    with open_database(cfg) as database:
+        if database is None:
+            print("Nothing to export: the data are stored as CSV files, see option 'storage'.")
+            return
+        summary.add_source(database.path)
+        for target in export_database(database, cfg):
+            summary.add_target(target)
+    print(summary)
@@ -4,8 +4,7 @@ from tempfile import TemporaryDirectory
 
 import pytest
 
-from finance_toolkit.tx import Configuration
-from finance_toolkit.models import ExchangeRateConfig
+from finance_toolkit.models import Configuration, ExchangeRateConfig
 
 
 @pytest.fixture(scope="session")
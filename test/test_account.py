@@ -1,10 +1,16 @@
+import re
 from pathlib import Path
 
+import pytest
+
 from finance_toolkit.account import (
     Account,
     DegiroAccount,
+    FileRouter,
     OctoberAccount,
+    literal_prefix,
 )
+from finance_toolkit.caisse_epargne import CaisseEpargneAccount
 from finance_toolkit.bnp import BnpAccount
 from finance_toolkit.boursorama import BoursoramaAccount
 from finance_toolkit.fortuneo import FortuneoAccount
@@ -256,3 +262,113 @@ def test_revolut_account_match_dollar():
         account.match(Path("account-statement_2021-01-01_2022-05-27_en_edf123.csv"))
         is False
     )
+
+
+# ---------- Class: FileRouter ----------
+
+
+def new_router_accounts():
+    return [
+        BnpAccount("CHQ", "astark-BNP-CHQ", "****1234"),
+        BnpAccount("LVA", "astark-BNP-LVA", "****0170"),
+        BoursoramaAccount("CHQ", "astark-BRS-CHQ", "001234"),
+        BoursoramaAccount("LVR", "astark-BRS-LVR", "005678"),
+        CaisseEpargneAccount("CHQ", "astark-CEP-CHQ", "6789"),
+        DegiroAccount("STK", "astark-DGR-STK", "****0002"),
+        FortuneoAccount("CHQ", "astark-FTN-CHQ", "12345"),
+        OctoberAccount("CWL", "astark-OCT-CWL", "astark"),
+        RevolutAccount("cash", "astark-REV-EUR", "abc", "EUR"),
+        RevolutAccount(
+            "cash",
+            "astark-REV-USD",
+            "abc",
+            "USD",
+            extra_patterns=[r"account-statement_(.+)_en_(\w+)\.csv"],
+        ),
+    ]
+
+
+@pytest.mark.parametrize(
+    "filename",
+    [
+        "E1851234.csv",
+        "E0790170.csv",
+        "E0799999.csv",
+        "export-operations-11-06-2022_09-52-55.csv",
+        "123456789_01112025_07122025.csv",
+        "Portfolio.csv",
+        "HistoriqueOperations_12345_du_14_01_2019_au_14_12_2019.csv",
+        "remboursements-astark.xlsx",
+        "account-statement_2022-06-01_2022-07-14_undefined-undefined_e85fa6.csv",
+        "account-statement_2022-06-01_2022-07-14_en_e85fa6.csv",
+        "Revolut-EUR-Statement-2022.csv",
+        "Webstat_Export_20240107.csv",
+        "photo.jpg",
+    ],
+)
+def test_file_router_route(filename):
+    accounts = new_router_accounts()
+    router = FileRouter(accounts)
+    assert router.regex is not None
+    path = Path("download") / filename
+    assert router.route(path) == [a for a in accounts if a.match(path)]
+
+
+def test_file_router_route_without_combined_regex():
+    accounts = new_router_accounts()
+    accounts.append(
+        RevolutAccount("cash", "astark-REV-GBP", "abc", "GBP", extra_patterns=[r"(\w)\1\.csv"])
+    )
+    router = FileRouter(accounts)
+    assert router.regex is None
+    assert router.route(Path("aa.csv")) == [accounts[-1]]
+    assert router.route(Path("E1851234.csv")) == [accounts[0]]
+    assert router.route(Path("photo.jpg")) == []
+
+
+@pytest.mark.parametrize(
+    "filename, expected",
+    [
+        ("foo.csv", True),
+        ("bar.csv", True),
+        ("baz.csv", False),
+        ("Report-2024.csv", True),
+        ("Reports-2024.csv", True),
+        ("Repor-2024.csv", False),
+    ],
+)
+def test_file_router_route_alternation_and_optional_characters(filename, expected):
+    accounts = new_router_accounts()
+    accounts.append(
+        RevolutAccount(
+            "cash",
+            "astark-REV-GBP",
+            "abc",
+            "GBP",
+            extra_patterns=[r"foo\.csv|bar\.csv", r"Reports?-\d{4}\.csv"],
+        )
+    )
+    router = FileRouter(accounts)
+    path = Path("download") / filename
+    assert accounts[-1].match(path) is expected
+    assert router.route(path) == [a for a in accounts if a.match(path)]
+
+
+@pytest.mark.parametrize(
+    "expr, prefix",
+    [
+        (r"E\d{,3}1234\.csv", "E"),
+        (r"export-operations-(?P<date>\d{2}-\d{2}-\d{4})_.+\.csv", "export-operations-"),
+        (r"HistoriqueOperations_(\d+)_du_.+\.csv", "HistoriqueOperations_"),
+        (r"\d*6789_\d{8}_\d{8}\.csv", ""),
+        (r"Portfolio.csv", "Portfolio"),
+        (r"Reports?-.+", "Report"),
+        (r"ab?\.csv", "a"),
+        (r"foo\.csv|bar\.csv", ""),
+        (r"foo(\.csv|\.txt)", "foo"),
+        (r"foo[|]\.csv", "foo"),
+        (r"foo\|bar\.csv", "foo"),
+    ],
+)
+def test_literal_prefix(expr, prefix):
+    assert literal_prefix(re.compile(expr)) == prefix
@@ -11,8 +11,7 @@ from finance_toolkit.bnp import (
     BnpBalancePipeline,
     BnpTransactionPipeline,
 )
-from finance_toolkit.models import Summary, TxType
-from finance_toolkit.tx import TxCompletion
+from finance_toolkit.models import Summary, TxCompletion, TxType
 
 
 def test_bnp_pipeline_integrate(cfg):
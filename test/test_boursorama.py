@@ -12,9 +12,8 @@ from finance_toolkit.boursorama import (
     BoursoramaBalancePipeline,
     BoursoramaTransactionPipeline,
 )
-from finance_toolkit.models import Summary, TxType
+from finance_toolkit.models import Summary, TxCompletion, TxType
 from finance_toolkit.pipeline import PipelineDataError
-from finance_toolkit.tx import TxCompletion
 
 
 def test_boursorama_pipeline_integrate(cfg):
@@ -2,14 +2,15 @@ import re
 from pathlib import Path
 
 import pandas as pd
+import pytest
 from pandas.testing import assert_frame_equal
 
 from finance_toolkit.caisse_epargne import (
     CaisseEpargneAccount,
     CaisseEpargneTransactionPipeline,
 )
-from finance_toolkit.models import Summary, TxType
-from finance_toolkit.tx import TxCompletion
+from finance_toolkit.models import Summary, TxCompletion, TxType
+from finance_toolkit.pipeline import PipelineDataError
 
 
 def test_caisse_epargne_account_pattern():
@@ -149,3 +150,27 @@ def test_caisse_epargne_transaction_pipeline_run(cfg):
     # And the summary is correct
     assert csv in summary.sources
     assert tx202411 in summary.targets
+
+
+def test_caisse_epargne_transaction_pipeline_read_raw_missing_date_column(cfg):
+    csv = cfg.root_dir / "12345678_01112024_30112024.csv"
+    csv.write_text(
+        """\
+Date de comptabilisation;Libelle simplifie;Libelle operation;Debit;Credit
+14/11/2024;SUPERMARCHE;CB SUPERMARCHE CENTRAL FACT 141124;-45,50;
+""",
+        encoding="ISO-8859-1",
+    )
+    account = CaisseEpargneAccount("CHQ", "test-CEP-CHQ", "12345678")
+    cfg.accounts.append(account)
+
+    with pytest.raises(PipelineDataError) as e:
+        CaisseEpargneTransactionPipeline(account, cfg).read_raw(csv)
+
+    assert e.value.path == csv
+    assert e.value.headers == (
+        "Date de comptabilisation;Libelle simplifie;Libelle operation;Debit;Credit"
+    )
+    assert str(e.value.pandas_error) == (
+        "Missing date columns: ['Date operation', 'Date de valeur']"
+    )
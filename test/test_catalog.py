@@ -0,0 +1,92 @@
+from unittest.mock import patch
+
+import pytest
+
+from finance_toolkit import tx
+from finance_toolkit.account import BnpAccount, RevolutAccount
+from finance_toolkit.catalog import Catalog
+
+
+@pytest.fixture
+def accounts(cfg):
+    chq = BnpAccount("CHQ", "astark-BNP-CHQ", "****1234")
+    usd = RevolutAccount("cash", "astark-REV-USD", "abc123", "USD")
+    cfg.accounts.extend([chq, usd])
+    (cfg.root_dir / "2024-01").mkdir()
+    (cfg.root_dir / "2024-01" / "2024-01.astark-BNP-CHQ.csv").write_text(
+        """\
+Date,Label,Amount,Currency,Type,MainCategory,SubCategory
+2024-01-02,L1,-1.0,EUR,transfer,,
+"""
+    )
+    (cfg.root_dir / "balance.astark-BNP-CHQ.EUR.csv").write_text(
+        """\
+Date,Amount,Currency
+2024-01-02,100.00,EUR
+"""
+    )
+    (cfg.root_dir / "balance.astark-REV-USD.USD.csv").write_text(
+        """\
+Date,Amount,Currency
+2024-01-02,10.00,USD
+"""
+    )
+    return chq, usd
+
+
+def test_scan(cfg, accounts):
+    chq, usd = accounts
+    (cfg.root_dir / "2024-01" / "2024-01.unknown-CHQ.csv").write_text("Date\n")
+    (cfg.root_dir / "2024-01" / ".2024-01.astark-BNP-CHQ.csv.lock").touch()
+    (cfg.root_dir / ".transaction-index.json").write_text("{}")
+    (cfg.root_dir / "total.csv").write_text("Date\n")
+    (cfg.root_dir / "docs").mkdir()
+    (cfg.root_dir / "docs" / "notes.csv").write_text("Date\n")
+
+    catalog = Catalog.scan(cfg)
+
+    assert [(f.key, f.account.id, f.is_known, f.month) for f in catalog.monthly()] == [
+        ("2024-01/2024-01.astark-BNP-CHQ.csv", chq.id, True, "2024-01"),
+        ("2024-01/2024-01.unknown-CHQ.csv", "unknown", False, "2024-01"),
+    ]
+    balances = [
+        (f.key, f.account.id, f.currency, f.is_original, f.is_currency_conversion_needed)
+        for f in catalog.balances()
+    ]
+    assert balances == [
+        ("balance.astark-BNP-CHQ.EUR.csv", chq.id, "EUR", True, False),
+        ("balance.astark-REV-USD.USD.csv", usd.id, "USD", True, True),
+    ]
+    assert [f.key for f in catalog.balances("EUR")] == ["balance.astark-BNP-CHQ.EUR.csv"]
+    assert catalog.exchange_rate_file.path == cfg.exchange_rate_csv_path
+
+    stat = (cfg.root_dir / "balance.astark-BNP-CHQ.EUR.csv").stat()
+    assert catalog.balance_files["balance.astark-BNP-CHQ.EUR.csv"].stat.st_size == stat.st_size
+
+
+def test_convert_adds_converted_balances(cfg, accounts):
+    catalog = Catalog.scan(cfg)
+    tx.convert(cfg, catalog=catalog)
+
+    converted = catalog.balance_files["balance.astark-REV-USD.EUR.csv"]
+    assert converted.account.id == "astark-REV-USD"
+    assert not converted.is_original
+    assert converted.stat.st_size == converted.path.stat().st_size
+
+
+def test_convert_and_merge_share_catalog(cfg, accounts):
+    catalog = Catalog.scan(cfg)
+    with patch("finance_toolkit.tx.Catalog.scan") as scan:
+        tx.convert(cfg, catalog=catalog)
+        tx.merge(cfg, catalog=catalog)
+    scan.assert_not_called()
+
+    assert (cfg.root_dir / "balance.csv").read_text() == """\
+Date,Account,AccountId,Amount,AccountType
+2024-01-02,astark-BNP-CHQ,****1234,100.0,CHQ
+2024-01-02,astark-REV-USD,abc123,9.13,cash
+"""
+    assert (cfg.root_dir / "total.csv").read_text() == """\
+Date,Month,Account,Label,Amount,Type,MainCategory,SubCategory
+2024-01-02,2024-01,astark-BNP-CHQ,L1,-1.0,transfer,,
+"""
@@ -0,0 +1,265 @@
+import datetime
+from pathlib import Path
+from shutil import copyfile
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from finance_toolkit import tx
+from finance_toolkit.account import (
+    BnpAccount,
+    BoursoramaAccount,
+    FortuneoAccount,
+    RevolutAccount,
+)
+from finance_toolkit.database import Database, open_database
+from finance_toolkit.models import Storage
+
+DOWNLOADS = [
+    "E0790170.csv",
+    "E1851234.csv",
+    "HistoriqueOperations_12345_du_14_01_2019_au_14_12_2019.csv",
+    "account-statement_2021-01-01_2022-05-27_undefined-undefined_abc123.csv",
+    "account-statement_2022-06-01_2022-07-14_undefined-undefined_e85fa6.csv",
+    "export-operations-11-06-2022_09-52-55.csv",
+]
+
+
+@pytest.fixture
+def database(cfg):
+    cfg.storage = Storage.SQLITE
+    # an existing database: the files of the finance root are not imported
+    Database(cfg.database_path).close()
+    with open_database(cfg) as database:
+        yield database
+
+
+@pytest.fixture
+def downloads(cfg, tmpdir):
+    download_dir = Path(tmpdir) / "download"
+    download_dir.mkdir()
+    for name in DOWNLOADS:
+        copyfile(cfg.download_dir / name, download_dir / name)
+    cfg.download_dir = download_dir
+    cfg.accounts.extend(
+        [
+            BnpAccount("CDI", "astark-BNP-CDI", "****0170"),
+            BnpAccount("CHQ", "astark-BNP-CHQ", "****1234"),
+            BoursoramaAccount("CHQ", "astark-BRS-CHQ", "001234"),
+            FortuneoAccount("CHQ", "astark-FTN-CHQ", "12345"),
+            RevolutAccount("cash", "astark-REV-EUR", "abc123", "EUR"),
+        ]
+    )
+    return download_dir
+
+
+def new_transactions(*rows) -> pd.DataFrame:
+    return pd.DataFrame(
+        [(pd.Timestamp(d), label, amount, "EUR", t, "", "") for d, label, amount, t in rows],
+        columns=["Date", "Label", "Amount", "Currency", "Type", "MainCategory", "SubCategory"],
+    )
+
+
+def test_open_database_with_csv_storage(cfg):
+    with open_database(cfg) as database:
+        assert database is None
+    assert not cfg.database_path.exists()
+
+
+def test_database_uses_wal(database):
+    assert database._conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+
+
+def test_insert_transactions_keeps_existing_ones(database):
+    n = database.insert_transactions(
+        "A", new_transactions(("2019-01-02", "L1", -1.0, "expense"))
+    )
+    assert n == 1
+
+    n = database.insert_transactions(
+        "A",
+        new_transactions(
+            ("2019-01-02", "L1", -1.0, "transfer"),  # duplicate
+            ("2019-01-01", "L2", -2.0, "expense"),
+            ("2019-01-01", "L2", -2.0, "income"),  # duplicate of the same download
+        ),
+    )
+    assert n == 1
+
+    df = database.read_transactions()
+    assert df["Date"].tolist() == [pd.Timestamp("2019-01-01"), pd.Timestamp("2019-01-02")]
+    assert df["Label"].tolist() == ["L2", "L1"]
+    assert df["Type"].tolist() == ["income", "expense"]
+    assert df["Account"].tolist() == ["A", "A"]
+
+
+def test_insert_transactions_without_label(database):
+    rows = new_transactions(("2019-01-02", np.nan, -1.0, "expense"))
+    assert database.insert_transactions("A", rows) == 1
+    assert database.insert_transactions("A", rows) == 0
+    assert database.read_transactions()["Label"].tolist() == [""]
+
+
+def test_insert_balances(database):
+    balances = pd.DataFrame({"Date": [pd.Timestamp("2019-01-01")], "Amount": [10.0]})
+    database.insert_balances("A", "USD", balances)
+    database.insert_balances("A", "USD", balances.assign(Amount=20.0))
+    database.insert_balances("A", "EUR", balances.assign(Amount=9.0), replace=True)
+    database.insert_balances("A", "EUR", balances.assign(Amount=8.0), replace=True)
+
+    assert database.read_balances("USD")["Amount"].tolist() == [10.0]
+    assert database.read_balances("EUR", "A")["Amount"].tolist() == [8.0]
+    assert database.read_balances("EUR", "B").empty
+    assert database.balance_files() == [("A", "EUR"), ("A", "USD")]
+
+
+def test_write_exchange_rates(database):
+    database.write_exchange_rates(
+        pd.DataFrame(
+            {
+                "Date": pd.to_datetime(["2024-01-01", "2024-01-02"]),
+                "USD": [np.nan, 1.0956],
+                "CNY": [np.nan, 7.8264],
+            }
+        )
+    )
+    database.write_exchange_rates(
+        pd.DataFrame({"Date": pd.to_datetime(["2024-01-02"]), "USD": [1.1], "CNY": [7.9]})
+    )
+
+    expected = pd.DataFrame(
+        {
+            "Date": pd.to_datetime(["2024-01-01", "2024-01-02"]),
+            "USD": [np.nan, 1.1],
+            "CNY": [np.nan, 7.9],
+        }
+    )
+    assert_frame_equal(database.read_exchange_rates(["USD", "CNY"]), expected)
+
+
+def test_move_and_export(cfg, downloads, capsys):
+    # Given the CSV files written by the default storage
+    tx.move(cfg)
+    files = sorted(p for p in cfg.root_dir.rglob("*.csv") if p != cfg.exchange_rate_csv_path)
+    expected = {p.relative_to(cfg.root_dir): p.read_text() for p in files}
+    for p in files:
+        p.unlink()
+
+    # When moving the same files to the database
+    cfg.storage = Storage.SQLITE
+    tx.move(cfg)
+    assert "finance.db" in capsys.readouterr().out
+    assert not any(p for p in cfg.root_dir.rglob("*.csv") if p != cfg.exchange_rate_csv_path)
+
+    # Then the export writes the same files
+    with patch("finance_toolkit.exchange_rate.get_today", return_value=datetime.datetime(2024, 1, 5)):  # noqa
+        tx.export(cfg)
+    files = sorted(p for p in cfg.root_dir.rglob("*.csv") if p != cfg.exchange_rate_csv_path)
+    assert {p.relative_to(cfg.root_dir): p.read_text() for p in files} == expected
+    assert f"- {cfg.database_path}" in capsys.readouterr().out
+
+
+def test_move_twice_keeps_transactions(cfg, downloads):
+    cfg.storage = Storage.SQLITE
+    tx.move(cfg)
+    with open_database(cfg) as database:
+        first = database.read_transactions()
+
+    tx.move(cfg)
+    with open_database(cfg) as database:
+        assert_frame_equal(database.read_transactions(), first)
+
+
+def test_convert_and_merge(cfg, database, capsys):
+    cfg.accounts.extend(
+        [
+            BnpAccount("CHQ", "astark-BNP-CHQ", "****1234"),
+            RevolutAccount("cash", "astark-REV-USD", "abc123", "USD"),
+        ]
+    )
+    database.write_exchange_rates(
+        pd.DataFrame({"Date": pd.to_datetime(["2024-01-02"]), "USD": [1.25], "CNY": [8.0]})
+    )
+    dates = pd.to_datetime(["2024-01-02", "2024-01-03"])
+    database.insert_balances(
+        "astark-BNP-CHQ", "EUR", pd.DataFrame({"Date": dates, "Amount": [100.0, 110.0]})
+    )
+    database.insert_balances(
+        "astark-REV-USD", "USD", pd.DataFrame({"Date": dates, "Amount": [10.0, 20.0]})
+    )
+    database.insert_transactions(
+        "astark-BNP-CHQ",
+        new_transactions(
+            ("2024-01-02", "L1", -1.0, "transfer"),
+            ("2024-01-03", "L2", -2.0, "unknown"),
+        ),
+    )
+
+    tx.convert(cfg)
+    assert database.read_balances("EUR", "astark-REV-USD")["Amount"].tolist() == [8.0, 16.0]
+
+    tx.merge(cfg)
+    assert (cfg.root_dir / "total.csv").read_text() == """\
+Date,Month,Account,Label,Amount,Type,MainCategory,SubCategory
+2024-01-02,2024-01,astark-BNP-CHQ,L1,-1.0,transfer,,
+"""
+    assert (cfg.root_dir / "balance.csv").read_text() == """\
+Date,Account,AccountId,Amount,AccountType
+2024-01-02,astark-BNP-CHQ,****1234,100.0,CHQ
+2024-01-02,astark-REV-USD,abc123,8.0,cash
+2024-01-03,astark-BNP-CHQ,****1234,110.0,CHQ
+2024-01-03,astark-REV-USD,abc123,16.0,cash
+"""
+    assert f"""\
+{cfg.database_path}:
+  - astark-BNP-CHQ 2024-01-03 'L2': Unknown transaction type: unknown
+""" in capsys.readouterr().out
+
+
+def test_switch_to_database_keeps_csv_files(cfg):
+    # Given the files written by the default storage
+    cfg.accounts.append(BnpAccount("CHQ", "astark-BNP-CHQ", "****1234"))
+    monthly_csv = cfg.root_dir / "2024-01" / "2024-01.astark-BNP-CHQ.csv"
+    monthly_csv.parent.mkdir()
+    monthly_csv.write_text("""\
+Date,Label,Amount,Currency,Type,MainCategory,SubCategory
+2024-01-02,L1,-1.0,EUR,transfer,,
+""")
+    balance_csv = cfg.root_dir / "balance.astark-BNP-CHQ.EUR.csv"
+    balance_csv.write_text("""\
+Date,Amount,Currency
+2024-01-02,100.00,EUR
+""")
+
+    # When switching to the database, then importing new transactions
+    cfg.storage = Storage.SQLITE
+    with open_database(cfg) as database:
+        database.insert_transactions(
+            "astark-BNP-CHQ",
+            new_transactions(
+                ("2024-01-02", "L1", -1.0, "expense"),  # already in the monthly file
+                ("2024-01-03", "L2", -2.0, "transfer"),
+            ),
+        )
+
+    # Then the files are kept by the merge and by the export
+    tx.merge(cfg)
+    assert (cfg.root_dir / "total.csv").read_text() == """\
+Date,Month,Account,Label,Amount,Type,MainCategory,SubCategory
+2024-01-02,2024-01,astark-BNP-CHQ,L1,-1.0,transfer,,
+2024-01-03,2024-01,astark-BNP-CHQ,L2,-2.0,transfer,,
+"""
+    with patch("finance_toolkit.exchange_rate.get_today", return_value=datetime.datetime(2024, 1, 5)):  # noqa
+        tx.export(cfg)
+    assert monthly_csv.read_text() == """\
+Date,Label,Amount,Currency,Type,MainCategory,SubCategory
+2024-01-02,L1,-1.0,EUR,transfer,,
+2024-01-03,L2,-2.0,EUR,transfer,,
+"""
+    assert balance_csv.read_text() == """\
+Date,Amount,Currency
+2024-01-02,100.00,EUR
+"""
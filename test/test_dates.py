@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from finance_toolkit.dates import FR_DATE_FORMAT, ISO_DATE_FORMAT, parse_dates
+
+
+def test_parse_dates():
+    values = pd.Series(["31/12/2019", "01/01/2020", "31/12/2019"], index=[3, 4, 5], name="Date")
+    expected = pd.Series(
+        pd.to_datetime(["2019-12-31", "2020-01-01", "2019-12-31"]), index=[3, 4, 5], name="Date"
+    )
+    pd.testing.assert_series_equal(parse_dates(values, FR_DATE_FORMAT), expected)
+
+
+def test_parse_dates_with_missing_values():
+    actual = parse_dates(["2019-12-31", np.nan, None], ISO_DATE_FORMAT)
+    assert actual[0] == pd.Timestamp("2019-12-31")
+    assert actual[1:].isna().all()
+
+
+def test_parse_dates_empty():
+    actual = parse_dates(pd.Series([], dtype="object"), ISO_DATE_FORMAT)
+    assert actual.empty
+    assert actual.dtype == "datetime64[ns]"
+
+
+@pytest.mark.parametrize("dtype", ["object", "float64"])
+def test_parse_dates_all_missing(dtype):
+    values = pd.Series([np.nan, np.nan], index=[1, 2], name="Date", dtype=dtype)
+    expected = pd.Series([pd.NaT, pd.NaT], index=[1, 2], name="Date", dtype="datetime64[ns]")
+    pd.testing.assert_series_equal(parse_dates(values, FR_DATE_FORMAT), expected)
+
+
+def test_parse_dates_with_wrong_format():
+    with pytest.raises(ValueError):
+        parse_dates(["2019-12-31"], FR_DATE_FORMAT)
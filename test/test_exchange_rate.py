@@ -1,6 +1,13 @@
 from pathlib import Path
 from tempfile import TemporaryDirectory
+import numpy as np
+import pandas as pd
+import pytest
+
+from finance_toolkit.exchange_rate import ExchangeRateStore, extend_rates
 from finance_toolkit.models import Summary
+from finance_toolkit.revolut import RevolutAccount
+from finance_toolkit.tx import convert
 from finance_toolkit.pipeline_factory import PipelineFactory
 from unittest.mock import patch
 import datetime
@@ -33,11 +40,261 @@ Source :;BCE (Banque Centrale Européenne) (4F0);BCE (Banque Centrale Européenn
 
             # Then
             assert (cfg.root_dir / "exchange-rate.csv").exists()
+            # the existing rates are kept
             assert (cfg.root_dir / "exchange-rate.csv").read_text() == """\
 Date,USD,CNY
+2024-01-01,,
+2024-01-02,1.0956,7.8264
+2024-01-03,1.0919,7.8057
+2024-01-04,1.0953,7.833
+2024-01-05,1.0921,7.813
+2024-01-06,,
+"""
+
+
+def test_extend_rates_ignores_time_of_today():
+    rate_df = pd.DataFrame(
+        {"Date": pd.to_datetime(["2024-01-04", "2024-01-05"]), "USD": [1.1, 1.2]}
+    )
+
+    actual = extend_rates(rate_df, datetime.datetime(2024, 1, 7, 14, 30))
+
+    assert actual["Date"].dt.strftime("%Y-%m-%d").tolist() == [
+        "2024-01-04",
+        "2024-01-05",
+        "2024-01-06",
+        "2024-01-07",
+    ]
+    assert actual["USD"].tolist()[:2] == [1.1, 1.2]
+    assert actual["USD"][2:].isna().all()
+
+
+def test_extend_rates_up_to_date():
+    rate_df = pd.DataFrame(
+        {"Date": pd.to_datetime(["2024-01-05", "2024-01-08"]), "USD": [1.1, 1.2]}
+    )
+
+    actual = extend_rates(rate_df, datetime.datetime(2024, 1, 8))
+
+    pd.testing.assert_frame_equal(actual, rate_df)
+
+
+def test_extend_rates_of_old_export():
+    rate_df = pd.DataFrame({"Date": pd.to_datetime(["1999-01-04"]), "USD": [1.1789]})
+
+    actual = extend_rates(rate_df, datetime.datetime(2024, 1, 8))
+
+    assert len(actual) == 9136
+    assert actual["Date"].iloc[-1] == pd.Timestamp("2024-01-08")
+
+
+def test_exchange_rate_store_lookup(cfg):
+    store = ExchangeRateStore.load(cfg.exchange_rate_csv_path)
+    dates = pd.Series(
+        pd.to_datetime(
+            [
+                "2023-12-31",  # before the first rate
+                "2024-01-01",  # no rate published yet
+                "2024-01-03 14:00:41",  # time part
+                "2024-01-07",  # after the last rate
+            ]
+        )
+    )
+
+    np.testing.assert_array_equal(
+        store.lookup("USD", dates), [np.nan, np.nan, 1.0919, 1.0921]
+    )
+    np.testing.assert_array_equal(store.lookup("EUR", dates), [1.0, 1.0, 1.0, 1.0])
+    with pytest.raises(KeyError):
+        store.lookup("JPY", dates)
+
+
+def test_convert_reads_exchange_rates_once(cfg):
+    for currency in ["USD", "CNY"]:
+        account = RevolutAccount("cash", f"user-REV-{currency}", "abc123", currency)
+        cfg.accounts.append(account)
+        (cfg.root_dir / account.balance_filename).write_text(
+            f"""\
+Date,Amount,Currency
+2024-01-02,100.00,{currency}
+"""
+        )
+
+    with patch.object(
+        ExchangeRateStore, "load", side_effect=ExchangeRateStore.load
+    ) as load:
+        convert(cfg)
+
+    assert load.call_count == 1
+    assert (cfg.root_dir / "balance.user-REV-USD.EUR.csv").read_text() == """\
+Date,Amount,Currency
+2024-01-02,91.27,EUR
+"""
+    assert (cfg.root_dir / "balance.user-REV-CNY.EUR.csv").read_text() == """\
+Date,Amount,Currency
+2024-01-02,12.78,EUR
+"""
+
+
+def new_rates(dates, usd, cny):
+    return pd.DataFrame({"Date": pd.to_datetime(dates), "USD": usd, "CNY": cny})
+
+
+def opened_modes(mocked_open, path):
+    return [
+        c.kwargs.get("mode", c.args[1] if len(c.args) > 1 else "r")
+        for c in mocked_open.call_args_list
+        if c.args[0] == path
+    ]
+
+
+@patch("finance_toolkit.exchange_rate.get_today", return_value=datetime.datetime(2024, 1, 9))
+def test_write_rates_rewrites_tail(_, cfg):
+    target = cfg.exchange_rate_csv_path
+    target.write_text(
+        """\
+Date,USD,CNY
+2024-01-02,1.0956,7.8264
+2024-01-03,1.0919,7.8057
+2024-01-04,1.0953,7.833
+2024-01-05,1.0921,7.813
+2024-01-06,,
+"""
+    )
+    pipeline = PipelineFactory(cfg).new_exchange_rate_pipeline()
+
+    with patch.object(Path, "open", autospec=True, side_effect=Path.open) as mocked_open:
+        pipeline.write_rates(
+            target,
+            new_rates(["2024-01-05", "2024-01-08"], [1.0921, 1.0946], [7.813, 7.8368]),
+        )
+
+    # only the rows after 2024-01-06 are written
+    assert opened_modes(mocked_open, target) == ["rb", "r+b"]
+    assert target.read_text() == """\
+Date,USD,CNY
 2024-01-02,1.0956,7.8264
 2024-01-03,1.0919,7.8057
 2024-01-04,1.0953,7.833
 2024-01-05,1.0921,7.813
 2024-01-06,,
+2024-01-08,1.0946,7.8368
+2024-01-09,,
+"""
+
+
+@patch("finance_toolkit.exchange_rate.get_today", return_value=datetime.datetime(2024, 1, 5))
+def test_write_rates_replaces_existing_dates(_, cfg):
+    target = cfg.exchange_rate_csv_path
+    pipeline = PipelineFactory(cfg).new_exchange_rate_pipeline()
+
+    pipeline.write_rates(target, new_rates(["2024-01-03"], [1.0], [7.0]))
+
+    assert target.read_text() == """\
+Date,USD,CNY
+2024-01-01,,
+2024-01-02,1.0956,7.8264
+2024-01-03,1.0,7.0
+2024-01-04,1.0953,7.833
+2024-01-05,1.0921,7.813
+"""
+
+
+@patch("finance_toolkit.exchange_rate.get_today", return_value=datetime.datetime(2024, 1, 5))
+def test_write_rates_up_to_date(_, cfg):
+    target = cfg.exchange_rate_csv_path
+    pipeline = PipelineFactory(cfg).new_exchange_rate_pipeline()
+
+    with patch.object(Path, "open", autospec=True, side_effect=Path.open) as mocked_open:
+        pipeline.write_rates(target, new_rates(["2024-01-05"], [1.0921], [7.813]))
+
+    assert opened_modes(mocked_open, target) == ["rb"]
+
+
+@patch("finance_toolkit.exchange_rate.get_today", return_value=datetime.datetime(2024, 1, 3))
+def test_write_rates_with_other_currencies(_, cfg):
+    target = cfg.exchange_rate_csv_path
+    target.write_text("Date,USD\n2024-01-02,1.0956\n")
+    pipeline = PipelineFactory(cfg).new_exchange_rate_pipeline()
+
+    pipeline.write_rates(target, new_rates(["2024-01-03"], [1.0919], [7.8057]))
+
+    assert target.read_text() == """\
+Date,USD,CNY
+2024-01-03,1.0919,7.8057
+"""
+
+
+@pytest.fixture
+def usd_account(cfg):
+    account = RevolutAccount("cash", "user-REV-USD", "abc123", "USD")
+    cfg.accounts.append(account)
+    (cfg.root_dir / account.balance_filename).write_text(
+        """\
+Date,Amount,Currency
+2024-01-02,100.00,USD
+2024-01-03 14:00:41,200.00,USD
+"""
+    )
+    return account
+
+
+def test_convert_incremental(cfg, usd_account):
+    balance_file = cfg.root_dir / usd_account.balance_filename
+    converted_file = cfg.root_dir / usd_account.converted_balance_filename
+    convert(cfg)
+    assert cfg.convert_manifest_path.exists()
+
+    # When a balance is added and the rate of an existing balance changed
+    with balance_file.open("a") as f:
+        f.write("2024-01-04,300.00,USD\n")
+    converted_file.write_text(converted_file.read_text().replace("91.27", "91.00"))
+    with patch.object(Path, "open", autospec=True, side_effect=Path.open) as mocked_open:
+        convert(cfg)
+
+    # Then only the new balance is written
+    assert opened_modes(mocked_open, converted_file) == ["rb", "r+b"]
+    assert converted_file.read_text() == """\
+Date,Amount,Currency
+2024-01-02,91.00,EUR
+2024-01-03 14:00:41,183.17,EUR
+2024-01-04,273.90,EUR
+"""
+
+    # When the exchange rates changed
+    cfg.exchange_rate_csv_path.write_text(
+        cfg.exchange_rate_csv_path.read_text().replace("1.0919", "1.0")
+    )
+    convert(cfg)
+
+    # Then the balances are converted starting at the changed rate
+    assert converted_file.read_text() == """\
+Date,Amount,Currency
+2024-01-02,91.00,EUR
+2024-01-03 14:00:41,200.00,EUR
+2024-01-04,273.90,EUR
+"""
+
+
+def test_convert_unchanged(cfg, usd_account):
+    converted_file = cfg.root_dir / usd_account.converted_balance_filename
+    convert(cfg)
+    mtime = converted_file.stat().st_mtime_ns
+
+    convert(cfg)
+
+    assert converted_file.stat().st_mtime_ns == mtime
+
+
+def test_convert_full(cfg, usd_account):
+    converted_file = cfg.root_dir / usd_account.converted_balance_filename
+    convert(cfg)
+    converted_file.write_text(converted_file.read_text().replace("91.27", "91.00"))
+
+    convert(cfg, full=True)
+
+    assert converted_file.read_text() == """\
+Date,Amount,Currency
+2024-01-02,91.27,EUR
+2024-01-03 14:00:41,183.17,EUR
 """
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from finance_toolkit import ledger
+from finance_toolkit import tx
+from finance_toolkit.bnp import BnpAccount
+
+pytest.importorskip("pyarrow")
+
+
+def test_write_and_load_total(cfg):
+    df = pd.DataFrame(
+        columns=["Date", "Month", "Account", "Label", "Amount", "Type", "MainCategory",
+                 "SubCategory"],
+        data=[
+            (pd.Timestamp("2019-08-01"), "2019-08", "userA-BNP-CHQ", "myLabel", -10.0,
+             "expense", "food", "restaurant"),
+            (pd.Timestamp("2019-08-02"), "2019-08", "userB-BRS-CHQ", "myLabel", -11.0,
+             "transfer", None, None),
+        ],
+        index=[3, 1],
+    )
+    ledger.write_total(df, cfg.root_dir)
+    actual = ledger.load_total(cfg.root_dir)
+
+    assert actual["Account"].dtype == "category"
+    assert actual["Type"].dtype == "category"
+    assert actual["Date"].dtype == "datetime64[ns]"
+    expected = df.reset_index(drop=True)
+    assert_frame_equal(actual, expected, check_categorical=False, check_dtype=False)
+
+
+def test_merge_columnar(cfg, capsys):
+    cfg.accounts.append(BnpAccount("CHQ", "astark-BNP-CHQ", "123"))
+    (cfg.root_dir / "2019-08").mkdir()
+    (cfg.root_dir / "2019-08" / "2019-08.astark-BNP-CHQ.csv").write_text(
+        """\
+Date,Label,Amount,Type,MainCategory,SubCategory
+2019-08-02,myLabel,-11.0,transfer,,
+"""
+    )
+    (cfg.root_dir / "balance.astark-BNP-CHQ.EUR.csv").write_text(
+        """\
+Date,Amount
+2019-08-04,100.00
+"""
+    )
+
+    tx.merge(cfg, columnar=True)
+
+    total_csv = pd.read_csv(cfg.root_dir / "total.csv", parse_dates=["Date"])
+    total = ledger.load_total(cfg.root_dir)
+    assert total["Label"].tolist() == total_csv["Label"].tolist()
+    assert total["Date"].tolist() == total_csv["Date"].tolist()
+    balance_csv = pd.read_csv(
+        cfg.root_dir / "balance.csv", parse_dates=["Date"], dtype={"AccountId": str}
+    )
+    balances = ledger.load_balances(cfg.root_dir)
+    assert_frame_equal(balances, balance_csv, check_categorical=False, check_dtype=False)
+    assert balances["Amount"].tolist() == [100.0]
+    assert balances["Account"].tolist() == ["astark-BNP-CHQ"]
@@ -1,5 +1,6 @@
 """Test the main() function."""
 import os
+import subprocess
 from pathlib import Path
 
 import pytest
@@ -11,8 +12,10 @@ CURRENT_USAGE = """Usage:
   finance-toolkit [options] (cat|categories) [<prefix>]
   finance-toolkit [options] convert
   finance-toolkit [options] convert-and-merge
+  finance-toolkit [options] export
   finance-toolkit [options] merge
-  finance-toolkit [options] move"""
+  finance-toolkit [options] move
+  finance-toolkit [options] serve"""
 
 CURRENT_HELP = f"""\
 Finance Toolkit, a command line interface (CLI) that helps you to better understand your personal
@@ -27,9 +30,15 @@ Arguments:
                       base currency is euro (EUR) and cannot be changed for now.
   merge               Merge staging data.
   convert-and-merge   Running the 'convert' and 'merge' commands sequentially.
+  export              Export the data of the SQLite database as CSV files (storage: sqlite).
+  serve               Keep the data of the finance root in memory and run the other commands
+                      sent to it, so that they complete faster.
 
 Options:
   --finance-root FOLDER    Folder where the configuration file is stored (default: $HOME/finances).
+  --columnar               Also write the merged data as Feather files (requires pyarrow).
+  --full                   Convert the whole balance history, not only the changed balances.
+  -j --jobs N              Number of parallel jobs for commands move and merge [default: 1].
   -X --debug               Enable debugging logs. Default: false.
 """
 
@@ -93,6 +102,30 @@ gouv/tax
     )
 
 
+def test_cat_does_not_import_data_pipelines(sample, location):
+    # Commands only reading the configuration should start instantly
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "finance_toolkit"]
+        + ["--finance-root", str(sample), "cat", "gouv"],
+        capture_output=True,
+        check=True,
+        cwd=location.parent,
+        text=True,
+    )
+    modules = {
+        line.split("|")[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+
+    assert result.stdout == "gouv/tax\n"
+    assert "yaml" in modules
+    assert "finance_toolkit.models" in modules
+    assert "pandas" not in modules
+    assert "numpy" not in modules
+    assert "finance_toolkit.tx" not in modules
+
+
 def test_categories_with_known_prefix(capsys, sample):
     sys.argv[1:] = ["--finance-root", sample, "categories", "food"]
     main()
@@ -307,3 +340,55 @@ Finished.
 """
     )
     assert captured.err == ""
+
+
+def test_convert_and_merge(capsys, sample):
+    (sample / "exchange-rate.csv").write_text(
+        """\
+Date,USD,CNY
+2024-01-02,1.25,8.0
+"""
+    )
+    (sample / "balance.astark-REV-USD.USD.csv").write_text(
+        """\
+Date,Amount,Currency
+2024-01-02,10.00,USD
+"""
+    )
+    (sample / "2024-01").mkdir()
+    (sample / "2024-01" / "2024-01.astark-REV-USD.csv").write_text(
+        """\
+Date,Label,Amount,Currency,Type,MainCategory,SubCategory
+2024-01-02,L1,-1.0,USD,transfer,,
+"""
+    )
+
+    sys.argv[1:] = ["--finance-root", str(sample), "convert-and-merge"]
+    main()
+
+    assert (sample / "balance.astark-REV-USD.EUR.csv").read_text() == """\
+Date,Amount,Currency
+2024-01-02,8.00,EUR
+"""
+    assert (sample / "balance.csv").read_text() == """\
+Date,Account,AccountId,Amount,AccountType
+2024-01-02,astark-REV-USD,astark2,8.0,CHQ
+"""
+    assert (sample / "total.csv").read_text() == """\
+Date,Month,Account,Label,Amount,Type,MainCategory,SubCategory
+2024-01-02,2024-01,astark-REV-USD,L1,-1.0,transfer,,
+"""
+    assert capsys.readouterr().out.endswith("Merge done\n")
+
+
+def test_export(capsys, sample):
+    cfg_path = sample / "finance-tools.yml"
+    cfg_path.write_text(cfg_path.read_text() + "storage: sqlite\n")
+
+    sys.argv[1:] = ["--finance-root", str(sample), "export"]
+    main()
+
+    assert (sample / "finance.db").exists()
+    captured = capsys.readouterr()
+    assert f"- {sample / 'finance.db'}" in captured.out
+    assert captured.err == ""
@@ -1,4 +1,14 @@
-from finance_toolkit.models import Summary
+import re
+
+import pytest
+
+from finance_toolkit.models import (
+    LazyPattern,
+    Summary,
+    TxCompleter,
+    TxCompletion,
+    required_literal,
+)
 
 
 # ---------- Class: Summary ----------
@@ -66,3 +76,87 @@ def test_configuration_categories(cfg):
         "food/supermarket",
         "food/work",
     ]
+
+
+# ---------- Class: TxCompleter ----------
+
+
+def new_completion(expr: str, sub_category: str) -> TxCompletion:
+    return TxCompletion(
+        tx_type="expense",
+        main_category="food",
+        sub_category=sub_category,
+        regex=re.compile(expr),
+    )
+
+
+def test_tx_completer_find_first_match():
+    completer = TxCompleter(
+        [
+            new_completion(r".*FOUJITA.*", "restaurant"),
+            new_completion(r".*(LEETCODE|GITHUB).*", "tech"),
+        ]
+    )
+    assert completer.find_all(
+        ["FOUJITA", "FOUJITA LEETCODE", "GITHUB", "UNKNOWN", float("nan")]
+    ) == [0, 0, 1, -1, -1]
+
+
+def test_tx_completer_find_with_backreference():
+    completer = TxCompleter(
+        [
+            new_completion(r".*FOUJITA.*", "restaurant"),
+            new_completion(r"(AB)\1", "tech"),
+        ]
+    )
+    assert completer.literals == ["FOUJITA", ""]
+    assert completer.find_all(["ABAB", "AB", "FOUJITA ABAB"]) == [1, -1, 0]
+
+
+def test_tx_completer_cache_info():
+    completer = TxCompleter([new_completion(r".*FOUJITA.*", "restaurant")])
+    assert completer.find_all(["FOUJITA", "FLUNCH", "FOUJITA", "FOUJITA"]) == [0, -1, 0, 0]
+    info = completer.cache_info()
+    assert info.hits == 2
+    assert info.misses == 2
+
+
+@pytest.mark.parametrize(
+    "expr, literal",
+    [
+        (r".*FLUNCH.*", "FLUNCH"),
+        (r"^CARTE \d+ FNAC.*", ""),
+        (r"PRLV SEPA.*FREE MOBILE", "FREE MOBILE"),
+        (r".*AMAZONS?.*", "AMAZON"),
+        (r".*UBER ?EATS.*", "UBER"),
+        (r".*X{2,3}Y.*", "Y"),
+        (r".*(FOO|BAR).*", ""),
+        (r"(?i).*flunch.*", ""),
+    ],
+)
+def test_required_literal(expr, literal):
+    assert required_literal(re.compile(expr)) == literal
+
+
+def test_configuration_completer(cfg):
+    c1 = new_completion(r".*FOUJITA.*", "restaurant")
+    c2 = new_completion(r".*FLUNCH.*", "restaurant")
+    cfg.autocomplete.append(c1)
+    completer = cfg.completer
+    assert cfg.completer is completer
+
+    # the completer is rebuilt when completions change
+    cfg.autocomplete.append(c2)
+    assert cfg.completer is not completer
+    assert cfg.completer.completions == [c1, c2]
+
+
+def test_tx_completion_loaded_with_lazy_pattern():
+    actual = TxCompletion.load({"expr": ".*FLUNCH.*", "type": "expense", "cat": "food/resto"})
+
+    assert isinstance(actual.regex, LazyPattern)
+    assert actual.regex._compiled is None
+    assert actual.regex == re.compile(".*FLUNCH.*")
+    assert actual.match("CB FLUNCH")
+    assert not actual.match("CB FOUJITA")
+    assert required_literal(actual.regex) == "FLUNCH"
@@ -1,9 +1,15 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+
 from finance_toolkit.account import (
     Account,
 )
 from finance_toolkit.bnp import (
     BnpAccount,
     BnpBalancePipeline,
+    BnpPipeline,
     BnpTransactionPipeline,
 )
 from finance_toolkit.boursorama import (
@@ -12,7 +18,16 @@ from finance_toolkit.boursorama import (
     BoursoramaTransactionPipeline,
 )
 from finance_toolkit.fortuneo import FortuneoAccount, FortuneoTransactionPipeline
-from finance_toolkit.pipeline import GeneralBalancePipeline, NoopTransactionPipeline
+from finance_toolkit.models import Summary
+from finance_toolkit.pipeline import (
+    GeneralBalancePipeline,
+    IngestPipeline,
+    NoopTransactionPipeline,
+    SourceCache,
+    TRANSACTION_FILE_COLUMNS,
+    TransactionBuffer,
+    read_last_date,
+)
 from finance_toolkit.revolut import (
     RevolutAccount,
     RevolutTransactionPipeline,
@@ -124,3 +139,207 @@ def test_new_balance_pipeline(cfg):
     assert isinstance(p_r1, RevolutBalancePipeline)
     assert isinstance(p_r2, RevolutBalancePipeline)
     assert isinstance(p_r3, GeneralBalancePipeline)
+
+
+# ---------- Class: TransactionPipeline ----------
+
+MONTHLY_FILE = """\
+Date,Label,Amount,Currency,Type,MainCategory,SubCategory
+2019-08-01,L1,-1.0,EUR,expense,food,restaurant
+2019-08-03,L3,-3.0,EUR,,,
+"""
+
+
+def new_transactions(*rows) -> pd.DataFrame:
+    return pd.DataFrame(
+        [(pd.Timestamp(d), label, amount, "EUR", "", "", "") for d, label, amount in rows],
+        columns=TRANSACTION_FILE_COLUMNS,
+    )
+
+
+def test_append_transactions_after_last_row(cfg):
+    csv = cfg.root_dir / "2019-08.astark-FTN-CHQ.csv"
+    csv.write_text(MONTHLY_FILE)
+    pipeline = FortuneoTransactionPipeline(FortuneoAccount("CHQ", "astark-FTN-CHQ", "12345"), cfg)
+
+    with patch("finance_toolkit.pipeline.pd.read_csv") as read_csv:
+        pipeline.append_transactions(
+            csv,
+            new_transactions(
+                ("2019-08-05", "L5", -5.0),
+                ("2019-08-04", "L4", -4.0),
+                ("2019-08-05", "L5", -5.0),
+            ),
+        )
+
+    # the existing transactions are not read
+    read_csv.assert_not_called()
+    assert csv.read_text() == MONTHLY_FILE + """\
+2019-08-04,L4,-4.0,EUR,,,
+2019-08-05,L5,-5.0,EUR,,,
+"""
+
+
+def test_append_transactions_interleaved(cfg):
+    csv = cfg.root_dir / "2019-08.astark-FTN-CHQ.csv"
+    csv.write_text(MONTHLY_FILE)
+    pipeline = FortuneoTransactionPipeline(FortuneoAccount("CHQ", "astark-FTN-CHQ", "12345"), cfg)
+
+    pipeline.append_transactions(
+        csv,
+        new_transactions(
+            ("2019-08-03", "L3", -3.0),  # already written
+            ("2019-08-02", "L2", -2.0),
+            ("2019-08-04", "L4", -4.0),
+        ),
+    )
+
+    assert csv.read_text() == """\
+Date,Label,Amount,Currency,Type,MainCategory,SubCategory
+2019-08-01,L1,-1.0,EUR,expense,food,restaurant
+2019-08-02,L2,-2.0,EUR,,,
+2019-08-03,L3,-3.0,EUR,,,
+2019-08-04,L4,-4.0,EUR,,,
+"""
+
+
+def test_read_last_date(tmpdir):
+    csv = Path(tmpdir) / "2019-08.astark-FTN-CHQ.csv"
+    csv.write_text(MONTHLY_FILE)
+    assert read_last_date(csv, TRANSACTION_FILE_COLUMNS) == pd.Timestamp("2019-08-03")
+    assert read_last_date(csv, TRANSACTION_FILE_COLUMNS, block_size=30) == pd.Timestamp(
+        "2019-08-03"
+    )
+    # the last row does not fit in the block
+    assert read_last_date(csv, TRANSACTION_FILE_COLUMNS, block_size=10) is None
+    # other columns, e.g. a file written before column "Currency"
+    assert read_last_date(csv, ["Date", "Label", "Amount"]) is None
+
+    csv.write_text("Date,Label,Amount,Currency,Type,MainCategory,SubCategory\n")
+    assert read_last_date(csv, TRANSACTION_FILE_COLUMNS) is None
+
+    csv.write_text(MONTHLY_FILE + "2019-08-04,L4")  # incomplete row
+    assert read_last_date(csv, TRANSACTION_FILE_COLUMNS) is None
+
+
+# ---------- Class: TransactionBuffer ----------
+
+
+def test_transaction_buffer(cfg, tmpdir):
+    account = RevolutAccount(RevolutAccount.TYPE_CASH, "astark-REV-EUR", "abc123", "EUR")
+    cfg.accounts.append(account)
+    sources = [
+        cfg.download_dir
+        / "account-statement_2021-01-01_2022-05-27_undefined-undefined_abc123.csv",
+        cfg.download_dir
+        / "account-statement_2022-06-01_2022-07-14_undefined-undefined_e85fa6.csv",
+    ]
+
+    # Given the transactions written immediately, one source after another
+    for source in sources + sources:
+        PipelineFactory(cfg).new_transaction_pipeline(account).run(source, Summary(cfg))
+    expected = {p: p.read_text() for p in cfg.root_dir.glob("20*/*.csv")}
+    for p in expected:
+        p.unlink()
+
+    # When the same transactions are buffered
+    buffer = TransactionBuffer()
+    factory = PipelineFactory(cfg, buffer)
+    summary = Summary(cfg)
+    for source in sources + sources:
+        factory.new_transaction_pipeline(account).run(source, summary)
+    assert not list(cfg.root_dir.glob("20*/*.csv"))
+    assert set(buffer.targets) == set(expected)
+
+    with patch.object(
+        RevolutTransactionPipeline,
+        "append_transactions",
+        autospec=True,
+        side_effect=RevolutTransactionPipeline.append_transactions,
+    ) as append:
+        buffer.flush()
+
+    # Then each target is written once, with the same content
+    assert append.call_count == len(expected)
+    assert {p: p.read_text() for p in cfg.root_dir.glob("20*/*.csv")} == expected
+    assert summary.targets == set(expected)
+    assert not buffer.targets
+
+
+# ---------- Class: IngestPipeline ----------
+
+
+def test_new_ingest_pipeline(cfg):
+    factory = PipelineFactory(cfg)
+    p1 = factory.new_ingest_pipeline(BnpAccount("CHQ", "foo-BNP-CHQ", "****0001"))
+    p2 = factory.new_ingest_pipeline(FortuneoAccount("CHQ", "foo-FTN-CHQ", "12345"))
+    p3 = factory.new_ingest_pipeline(
+        RevolutAccount(
+            account_type=RevolutAccount.TYPE_COMMODITIES,
+            account_id="foo-REV-XAU",
+            account_num="unknown",
+            currency="XAU",
+        )
+    )
+
+    assert isinstance(p1, IngestPipeline)
+    assert isinstance(p1.transactions, BnpTransactionPipeline)
+    assert isinstance(p1.balances, BnpBalancePipeline)
+    assert p1.single_pass
+    assert isinstance(p2.transactions, FortuneoTransactionPipeline)
+    assert isinstance(p2.balances, GeneralBalancePipeline)
+    assert not p2.single_pass
+    assert isinstance(p3.transactions, NoopTransactionPipeline)
+    assert not p3.single_pass
+
+
+def test_ingest_pipeline_reads_download_once(cfg):
+    account = BnpAccount("CHQ", "astark-BNP-CHQ", "****1234")
+    cfg.accounts.append(account)
+    csv = cfg.download_dir / "E1851234.csv"
+
+    with patch.object(
+        BnpPipeline, "read_raw", autospec=True, side_effect=BnpPipeline.read_raw
+    ) as read_raw:
+        PipelineFactory(cfg).new_ingest_pipeline(account).run(csv, Summary(cfg))
+
+    assert read_raw.call_count == 1
+    assert (cfg.root_dir / "2019-06" / "2019-06.astark-BNP-CHQ.csv").exists()
+    assert (cfg.root_dir / "balance.astark-BNP-CHQ.EUR.csv").exists()
+
+
+# ---------- Class: SourceCache ----------
+
+
+def test_source_cache_reused_by_next_runs(cfg):
+    account = BnpAccount("CHQ", "astark-BNP-CHQ", "****1234")
+    cfg.accounts.append(account)
+    csv = cfg.download_dir / "E1851234.csv"
+    factory = PipelineFactory(cfg, sources=SourceCache())
+
+    with patch.object(
+        BnpPipeline, "read_raw", autospec=True, side_effect=BnpPipeline.read_raw
+    ) as read_raw:
+        factory.new_ingest_pipeline(account).run(csv, Summary(cfg))
+        factory.new_ingest_pipeline(account).run(csv, Summary(cfg))
+
+    assert read_raw.call_count == 1
+    assert (cfg.root_dir / "2019-06" / "2019-06.astark-BNP-CHQ.csv").exists()
+    assert (cfg.root_dir / "balance.astark-BNP-CHQ.EUR.csv").exists()
+
+
+def test_source_cache_returns_copies(cfg):
+    account = BnpAccount("CHQ", "astark-BNP-CHQ", "****1234")
+    csv = cfg.download_dir / "E1851234.csv"
+    cache = SourceCache(max_size=1)
+    pipeline = BnpTransactionPipeline(account, cfg)
+
+    _, tx1 = cache.get(account, csv, pipeline.read_raw)
+    tx1["Label"] = "modified"
+    _, tx2 = cache.get(account, csv, pipeline.read_raw)
+    assert (tx2["Label"] != "modified").all()
+
+    # the oldest entries are evicted
+    other = BnpAccount("CHQ", "bstark-BNP-CHQ", "****1234")
+    cache.get(other, csv, pipeline.read_raw)
+    assert len(cache._entries) == 1
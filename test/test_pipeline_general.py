@@ -1,6 +1,7 @@
 from pathlib import Path
 
 import pandas as pd
+import pytest
 from pandas.testing import assert_frame_equal
 
 from finance_toolkit.account import Account
@@ -38,3 +39,86 @@ Date,Amount
         ],
     )
     assert_frame_equal(actual_balance_df, expected_balance_df)
+
+
+BALANCE_FILE = """\
+Date,Amount,Currency
+2020-11-20,100.00,EUR
+2020-11-22,98.00,EUR
+"""
+
+
+def new_balances(*rows) -> pd.DataFrame:
+    return pd.DataFrame(
+        [(pd.Timestamp(d), amount, "EUR") for d, amount in rows],
+        columns=["Date", "Amount", "Currency"],
+    )
+
+
+def new_pipeline(cfg) -> GeneralBalancePipeline:
+    account = Account(
+        account_type="CHQ",
+        account_id="anAccountId",
+        account_num="anAccountNum",
+        currency="EUR",
+        patterns=[r"unknown"],
+    )
+    return GeneralBalancePipeline(account, cfg)
+
+
+@pytest.mark.parametrize(
+    "content, rows",
+    [
+        # newest balance, appended
+        (BALANCE_FILE, [("2020-11-23", 97.0)]),
+        # balance in the middle
+        (BALANCE_FILE, [("2020-11-21", 99.0)]),
+        # existing balance, kept
+        (BALANCE_FILE, [("2020-11-22", 50.0)]),
+        # several balances, unsorted and duplicated
+        (
+            BALANCE_FILE,
+            [("2020-11-24", 1.0), ("2020-11-19", 2.0), ("2020-11-24", 3.0), ("2020-11-21", 4.0)],
+        ),
+        # dates with a time, as written for Revolut
+        (
+            "Date,Amount,Currency\n2020-11-20 10:00:00,100.00,EUR\n",
+            [("2020-11-21", 99.0), ("2020-11-19 08:30:00", 98.0)],
+        ),
+    ],
+)
+def test_upsert_balance(cfg, tmpdir, content, rows):
+    pipeline = new_pipeline(cfg)
+    csv = Path(tmpdir) / "balance.anAccountId.EUR.csv"
+    csv.write_text(content)
+    pipeline.write_balance(csv, pipeline.insert_balance(csv, new_balances(*rows)))
+    expected = csv.read_text()
+    csv.write_text(content)
+
+    assert pipeline.upsert_balance(csv, new_balances(*rows))
+    assert csv.read_text() == expected
+
+
+@pytest.mark.parametrize(
+    "content, rows",
+    [
+        # no file
+        (None, [("2020-11-23", 97.0)]),
+        # no balance
+        ("Date,Amount,Currency\n", [("2020-11-23", 97.0)]),
+        # no currency, written by a former version
+        ("Date,Amount\n2020-11-20,100.00\n", [("2020-11-23", 97.0)]),
+        # unsorted
+        ("Date,Amount,Currency\n2020-11-22,98.00,EUR\n2020-11-20,100.00,EUR\n", []),
+        # all the dates would be written with a time
+        (BALANCE_FILE, [("2020-11-23 10:00:00", 97.0)]),
+    ],
+)
+def test_upsert_balance_requires_rewrite(cfg, tmpdir, content, rows):
+    csv = Path(tmpdir) / "balance.anAccountId.EUR.csv"
+    if content is not None:
+        csv.write_text(content)
+
+    assert not new_pipeline(cfg).upsert_balance(csv, new_balances(*rows))
+    if content is not None:
+        assert csv.read_text() == content
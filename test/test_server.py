@@ -0,0 +1,135 @@
+import socket
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from finance_toolkit import client
+from finance_toolkit.__main__ import main
+from finance_toolkit.server import FinanceServer, new_server
+
+
+@pytest.fixture
+def server(sample):
+    server = new_server(sample / "finance-tools.yml")
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+    client.socket_path(sample).unlink(missing_ok=True)
+
+
+def test_send_without_server(sample):
+    assert client.send(sample, "categories", {"prefix": ""}) is None
+
+
+def test_send_with_stale_socket(sample):
+    client.socket_path(sample).touch()
+    assert client.send(sample, "categories", {"prefix": ""}) is None
+
+
+@pytest.fixture
+def silent_server(sample):
+    """A server accepting connections without ever answering, e.g. a hanging one."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.bind(str(client.socket_path(sample)))
+        s.listen()
+        yield s
+    client.socket_path(sample).unlink()
+
+
+def test_send_to_hanging_server(silent_server, sample):
+    with pytest.raises(client.ServerError, match="did not answer while running 'categories'"):
+        client.send(sample, "categories", {"prefix": ""}, timeout=0.1)
+
+
+def test_send_to_server_closing_connection(silent_server, sample):
+    def close_connection():
+        conn, _ = silent_server.accept()
+        with conn, conn.makefile("rb") as f:
+            f.readline()  # e.g. the server crashes while running the command
+
+    thread = threading.Thread(target=close_connection)
+    thread.start()
+    with pytest.raises(client.ServerError, match="closed the connection"):
+        client.send(sample, "categories", {"prefix": ""})
+    thread.join()
+
+
+def test_main_fails_when_server_hangs(silent_server, sample, capsys):
+    sys.argv[1:] = ["--finance-root", str(sample), "cat", "gouv"]
+    # the server may still run the command: it must not run again in the client process
+    with patch("finance_toolkit.client.TIMEOUT", 0.1), pytest.raises(SystemExit) as e:
+        main()
+
+    assert "did not answer while running 'categories'" in str(e.value.code)
+    assert capsys.readouterr().out == ""
+
+
+def test_send_long_command(server, sample):
+    def handle(command, options, download_dir=None):
+        time.sleep(0.5)
+        return "done\n"
+
+    with patch.object(server.finance, "handle", handle), patch(
+        "finance_toolkit.server.HEARTBEAT_INTERVAL", 0.05
+    ):
+        assert client.send(sample, "merge", {}, timeout=0.2) == "done\n"
+
+
+def test_send_categories(server, sample):
+    assert client.send(sample, "categories", {"prefix": "food/"}) == """\
+food/restaurant
+food/supermarket
+food/work
+"""
+
+
+def test_send_unknown_command(server, sample):
+    with pytest.raises(client.ServerError, match="Unknown command: 'unknown'"):
+        client.send(sample, "unknown", {})
+
+
+def test_main_sends_command_to_server(server, sample, capsys):
+    sys.argv[1:] = ["--finance-root", str(sample), "cat", "gouv"]
+    with patch("finance_toolkit.__main__.Configurator.load") as load:
+        main()
+
+    # the configuration is only loaded by the server
+    load.assert_not_called()
+    assert capsys.readouterr().out == "gouv/tax\n"
+
+
+def test_new_server_already_running(server, sample):
+    with pytest.raises(RuntimeError, match="A server is already running"):
+        new_server(sample / "finance-tools.yml")
+
+
+def test_new_server_with_stale_socket(sample):
+    client.socket_path(sample).touch()
+    server = new_server(sample / "finance-tools.yml")
+    server.server_close()
+    client.socket_path(sample).unlink()
+
+
+def test_server_reloads_changed_configuration(sample):
+    path = sample / "finance-tools.yml"
+    finance = FinanceServer(path)
+    cfg = finance.configuration()
+    assert finance.configuration() is cfg
+
+    path.write_text(path.read_text().replace("food/work", "food/office"))
+
+    assert finance.configuration() is not cfg
+    assert finance.handle("categories", {"prefix": "food/o"}) == "food/office\n"
+
+
+def test_server_keeps_merge_manifest(sample):
+    finance = FinanceServer(sample / "finance-tools.yml")
+    cfg = finance.configuration()
+
+    assert finance.merge_manifest(cfg) is finance.merge_manifest(cfg)
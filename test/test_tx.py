@@ -1,4 +1,8 @@
+import json
+import os
 import re
+from pathlib import Path
+from shutil import copyfile
 from unittest.mock import patch, call
 
 import pandas as pd
@@ -6,21 +10,23 @@ import yaml
 from pandas.testing import assert_frame_equal
 
 from finance_toolkit import tx
-from finance_toolkit.account import Account
-from finance_toolkit.models import (
-    Configuration,
-    TxCompletion,
-)
-from finance_toolkit.tx import (
+from finance_toolkit.account import (
+    Account,
     BnpAccount,
     BoursoramaAccount,
     CaisseEpargneAccount,
-    Configurator,
     DegiroAccount,
     FortuneoAccount,
     OctoberAccount,
     RevolutAccount,
 )
+from finance_toolkit.configurator import Configurator
+from finance_toolkit.manifest import transaction_hashes
+from finance_toolkit.models import (
+    Configuration,
+    Storage,
+    TxCompletion,
+)
 import pytest
 
 
@@ -87,6 +93,30 @@ Date,Label,Amount,Type,MainCategory,SubCategory
     ]
 
 
+@patch("builtins.print")
+def test_read_tx_unknown_type(mocked_print, cfg):
+    cfg.category_set.add("food/restaurant")
+
+    csv = cfg.root_dir / "2019-03.mhuang-CHQ.csv"
+    csv.write_text(
+        """\
+Date,Label,Amount,Type,MainCategory,SubCategory
+2018-04-30,myLabel,-1.0,X,food,restaurant
+2018-04-30,myLabel,-2.0,expense,food,restaurant
+2018-04-30,myLabel,-3.0,,food,unknown
+2018-04-30,myLabel,-4.0,transfer,,
+"""
+    )
+    actual_df = tx.read_transactions(csv, cfg)
+    assert actual_df.index.tolist() == [1, 3]
+    assert actual_df["Amount"].tolist() == [-2.0, -4.0]
+    assert mocked_print.mock_calls == [
+        call(f"{csv}:"),
+        call("  - Line 2: Unknown transaction type: X"),
+        call("  - Line 4: Unknown transaction type: nan"),
+    ]
+
+
 def test_read_boursorama_tx_ok(cfg):
     cfg.autocomplete.append(
         TxCompletion(
@@ -158,6 +188,121 @@ Date,Label,Amount,Type,MainCategory,SubCategory
     ]
 
 
+def move_and_collect(cfg, jobs):
+    tx.move(cfg, jobs=jobs)
+    files = sorted(p for p in cfg.root_dir.rglob("*.csv") if p != cfg.exchange_rate_csv_path)
+    contents = {p.relative_to(cfg.root_dir): p.read_text() for p in files}
+    for p in files:
+        p.unlink()
+    return contents
+
+
+def test_move_in_parallel(cfg, capsys, tmpdir):
+    download_dir = Path(tmpdir) / "download"
+    download_dir.mkdir()
+    for name in [
+        "E0790170.csv",
+        "E1851234.csv",
+        "HistoriqueOperations_12345_du_14_01_2019_au_14_12_2019.csv",
+        "account-statement_2021-01-01_2022-05-27_undefined-undefined_abc123.csv",
+        "account-statement_2022-06-01_2022-07-14_undefined-undefined_e85fa6.csv",
+        "export-operations-11-06-2022_09-52-55.csv",
+    ]:
+        copyfile(cfg.download_dir / name, download_dir / name)
+    # overlapping downloads of the same account: duplicated transactions, transactions having
+    # the same date and label, and different balances for the same date
+    for i in range(8):
+        (download_dir / f"E00{i}1234.csv").write_text(
+            f"""\
+Compte de chèques;Compte de chèques;****1234;03/07/2019;;1 000,{i % 3}0
+05/06/2019;;; SHARED;-1,00
+05/06/2019;;; LABEL;-{i % 4},50
+06/06/2019;;; LABEL {i};-{i},00
+""",
+            encoding="ISO-8859-1",
+        )
+    cfg.download_dir = download_dir
+    cfg.accounts.extend(
+        [
+            BnpAccount("CDI", "astark-BNP-CDI", "****0170"),
+            BnpAccount("CHQ", "astark-BNP-CHQ", "****1234"),
+            BoursoramaAccount("CHQ", "astark-BRS-CHQ", "001234"),
+            FortuneoAccount("CHQ", "astark-FTN-CHQ", "12345"),
+            RevolutAccount("cash", "astark-REV-EUR", "abc123", "EUR"),
+            RevolutAccount("cash", "astark-REV-USD", "abc123", "USD"),
+        ]
+    )
+    serial = move_and_collect(cfg, jobs=1)
+    serial_out = capsys.readouterr().out
+    parallel = move_and_collect(cfg, jobs=4)
+    parallel_out = capsys.readouterr().out
+
+    assert Path("balance.astark-REV-EUR.EUR.csv") in serial
+    assert serial[Path("balance.astark-BNP-CHQ.EUR.csv")] == """\
+Date,Amount,Currency
+2019-07-03,1000.00,EUR
+"""
+    assert parallel == serial
+    assert parallel_out == serial_out
+    for _ in range(3):
+        assert move_and_collect(cfg, jobs=4) == serial
+    capsys.readouterr()
+
+
+@pytest.fixture
+def fortuneo_download(cfg, tmpdir):
+    download_dir = Path(tmpdir) / "download"
+    download_dir.mkdir()
+    name = "HistoriqueOperations_12345_du_14_01_2019_au_14_12_2019.csv"
+    copyfile(cfg.download_dir / name, download_dir / name)
+    cfg.download_dir = download_dir
+    cfg.accounts.append(FortuneoAccount("CHQ", "astark-FTN-CHQ", "12345"))
+    return download_dir / name
+
+
+def test_move_skips_indexed_transactions(cfg, fortuneo_download):
+    tx.move(cfg)
+    files = sorted(cfg.root_dir.glob("20*/*.csv"))
+    contents = {p: (p.read_text(), p.stat().st_mtime_ns) for p in files}
+
+    # When importing the same download again
+    with patch("pandas.read_csv", wraps=pd.read_csv) as read_csv:
+        tx.move(cfg)
+
+    # Then the monthly files are neither read nor written
+    assert [c.args[0] for c in read_csv.call_args_list] == [fortuneo_download]
+    assert {p: (p.read_text(), p.stat().st_mtime_ns) for p in files} == contents
+
+
+def test_move_rebuilds_index_of_modified_files(cfg, fortuneo_download):
+    tx.move(cfg)
+    csv = cfg.root_dir / "2019-04" / "2019-04.astark-FTN-CHQ.csv"
+    content = csv.read_text()
+    header, first_row, *rows = content.splitlines(keepends=True)
+
+    # When a transaction is removed outside of Finance Toolkit, then imported again
+    csv.write_text(header + "".join(rows))
+    tx.move(cfg)
+
+    # Then it is written again
+    assert csv.read_text() == content
+
+
+def test_transaction_hashes():
+    written = pd.DataFrame(
+        {"Date": ["2019-04-01", "2019-04-02"], "Label": ["L1", "1234"], "Amount": [-0.1, 2.0]}
+    )
+    new = pd.DataFrame(
+        {
+            "Date": pd.to_datetime(["2019-04-01", "2019-04-02"]),
+            "Label": ["L1", "1234"],
+            "Amount": [-0.30000000000000004 + 0.2, 2],
+        }
+    )
+    assert (transaction_hashes(written) == transaction_hashes(new)).all()
+    assert transaction_hashes(written).dtype == "uint64"
+
+
 def test_merge_bank_tx(cfg):
     df1 = pd.DataFrame(
         {
@@ -367,6 +512,157 @@ def test_validate_tx(cfg):
     assert "" == err4
 
 
+@patch("builtins.print")
+def test_read_monthly_transactions_incremental(mocked_print, cfg):
+    pytest.importorskip("pyarrow")  # the merge cache is written as Feather files
+    cfg.accounts.append(BnpAccount("CHQ", "astark-BNP-CHQ", "123"))
+    cfg.category_set.add("food/restaurant")
+    (cfg.root_dir / "2019-07").mkdir()
+    (cfg.root_dir / "2019-08").mkdir()
+    csv1 = cfg.root_dir / "2019-07" / "2019-07.astark-BNP-CHQ.csv"
+    csv2 = cfg.root_dir / "2019-08" / "2019-08.astark-BNP-CHQ.csv"
+    csv1.write_text(
+        """\
+Date,Label,Amount,Type,MainCategory,SubCategory
+2019-07-01,myLabel,-1.0,expense,food,restaurant
+2019-07-02,myLabel,-2.0,expense,food,
+"""
+    )
+    csv2.write_text(
+        """\
+Date,Label,Amount,Type,MainCategory,SubCategory
+2019-08-01,myLabel,-3.0,expense,food,restaurant
+"""
+    )
+    first = tx.read_monthly_transactions(cfg)
+    assert cfg.merge_manifest_path.exists()
+    assert len(list(cfg.merge_cache_dir.glob("*.feather"))) == 2
+
+    # When a file is modified
+    csv2.write_text(
+        """\
+Date,Label,Amount,Type,MainCategory,SubCategory
+2019-08-01,myLabel,-3.0,expense,food,restaurant
+2019-08-02,myLabel,-4.0,expense,food,restaurant
+"""
+    )
+    mocked_print.reset_mock()
+    with patch("finance_toolkit.tx.parse_transactions", wraps=tx.parse_transactions) as parse:
+        second = tx.read_monthly_transactions(cfg)
+
+    # Then only the modified file is read again
+    assert parse.mock_calls == [call(csv2, cfg)]
+    assert_frame_equal(second[0], first[0])
+    assert second[1]["Amount"].tolist() == [-3.0, -4.0]
+    # And errors of unchanged files are still reported
+    assert mocked_print.mock_calls == [
+        call(f"{csv1}:"),
+        call("  - Line 3: Category 'food/nan' does not exist."),
+    ]
+
+    # Then only the rows of the modified file are written again
+    manifest = tx.load_merge_manifest(cfg)
+    frame1 = manifest.frame_path("2019-07/2019-07.astark-BNP-CHQ.csv")
+    frame2 = manifest.frame_path("2019-08/2019-08.astark-BNP-CHQ.csv")
+    mtime_ns = frame1.stat().st_mtime_ns
+    csv2.write_text(csv2.read_text() + "2019-08-03,myLabel,-5.0,expense,food,restaurant\n")
+    tx.read_monthly_transactions(cfg)
+    assert frame1.stat().st_mtime_ns == mtime_ns
+    assert len(pd.read_feather(frame2)) == 3
+
+    # When no file changed, the manifest is not written again
+    mtime_ns = cfg.merge_manifest_path.stat().st_mtime_ns
+    with patch("pyarrow.feather.write_feather") as write_feather:
+        tx.read_monthly_transactions(cfg)
+    write_feather.assert_not_called()
+    assert cfg.merge_manifest_path.stat().st_mtime_ns == mtime_ns
+
+    # When a file is removed, it is not merged anymore
+    csv1.unlink()
+    third = tx.read_monthly_transactions(cfg)
+    assert len(third) == 1
+    assert third[0]["Amount"].tolist() == [-3.0, -4.0, -5.0]
+    assert list(tx.load_merge_manifest(cfg).entries) == ["2019-08/2019-08.astark-BNP-CHQ.csv"]
+    assert not frame1.exists()
+
+
+def test_merge_from_cache(cfg):
+    pytest.importorskip("pyarrow")  # the merge cache is written as Feather files
+    cfg.accounts.append(BnpAccount("CHQ", "astark-BNP-CHQ", "123"))
+    cfg.category_set.add("food/restaurant")
+    (cfg.root_dir / "2019-07").mkdir()
+    (cfg.root_dir / "2019-07" / "2019-07.astark-BNP-CHQ.csv").write_text(
+        """\
+Date,Label,Amount,Type,MainCategory,SubCategory
+2019-07-01,myLabel,-1.0,expense,food,restaurant
+2019-07-02,myLabel,-2.0,transfer,,
+2019-07-03,myLabel,-3.0,expense,food,
+"""
+    )
+    with patch("builtins.print"):
+        tx.merge(cfg)
+        cold = (cfg.root_dir / "total.csv").read_text()
+        with patch("finance_toolkit.tx.parse_transactions") as parse:
+            tx.merge(cfg)
+        parse.assert_not_called()
+
+    assert (cfg.root_dir / "total.csv").read_text() == cold
+
+
+def test_merge_manifest_ignores_outdated_cache(cfg):
+    pytest.importorskip("pyarrow")  # the merge cache is written as Feather files
+    cfg.merge_manifest_path.write_text('{"version": 1, "fingerprint": "", "files": {}}')
+    cfg.merge_cache_dir.mkdir()
+    (cfg.merge_cache_dir / "unexpected.feather").write_bytes(b"oops")
+
+    with patch("pyarrow.feather.read_feather") as read_feather:
+        manifest = tx.load_merge_manifest(cfg)
+    read_feather.assert_not_called()
+    assert manifest.entries == {}
+
+
+def test_read_monthly_files_in_parallel(cfg):
+    cfg.category_set.add("food/restaurant")
+    files = []
+    for month in range(1, 7):
+        csv = cfg.root_dir / f"2019-{month:02d}.astark-BNP-CHQ.csv"
+        csv.write_text(
+            f"""\
+Date,Label,Amount,Type,MainCategory,SubCategory
+2019-{month:02d}-01,myLabel,-{month}.0,expense,food,restaurant
+2019-{month:02d}-02,myLabel,-{month}.5,expense,food,
+"""
+        )
+        files.append((csv, f"account-{month}"))
+
+    serial = tx.read_monthly_files(files, cfg, jobs=1)
+    parallel = tx.read_monthly_files(files, cfg, jobs=3)
+
+    assert len(parallel) == 6
+    for (df1, errors1), (df2, errors2) in zip(serial, parallel):
+        assert_frame_equal(df1, df2)
+        assert errors1 == errors2
+    assert parallel[3][0]["Account"].tolist() == ["account-4"]
+    assert parallel[3][1] == [(3, "Category 'food/nan' does not exist.")]
+
+
+def test_read_monthly_transactions_configuration_changed(cfg):
+    (cfg.root_dir / "2019-08").mkdir()
+    csv = cfg.root_dir / "2019-08" / "2019-08.astark-BNP-CHQ.csv"
+    csv.write_text(
+        """\
+Date,Label,Amount,Type,MainCategory,SubCategory
+2019-08-01,myLabel,-3.0,expense,food,restaurant
+"""
+    )
+    with patch("builtins.print"):
+        assert len(tx.read_monthly_transactions(cfg)[0]) == 0
+
+    # When the category becomes valid, the cached rows are not used anymore
+    cfg.category_set.add("food/restaurant")
+    assert len(tx.read_monthly_transactions(cfg)[0]) == 1
+
+
 # ---------- Class: Configurator ----------
 
 
@@ -661,6 +957,13 @@ def test_configurator_autocomplete_without_content():
     assert Configurator.load_autocomplete(cfg["auto-complete"]) == []
 
 
+def test_configurator_load_storage():
+    assert Configurator.load_storage(None) == Storage.CSV
+    assert Configurator.load_storage("sqlite") == Storage.SQLITE
+    with pytest.raises(ValueError):
+        Configurator.load_storage("parquet")
+
+
 def test_configurator_parse_yaml(sample):
     cfg = Configurator.parse_yaml(sample / "finance-tools.yml")
     assert cfg.accounts == [
@@ -705,3 +1008,72 @@ def test_configurator_parse_yaml(sample):
             account_num="00000001",
         ),
     ]
+
+
+def test_configurator_load_from_cache(sample):
+    path = sample / "finance-tools.yml"
+    with patch.object(
+        Configurator, "read_yaml", side_effect=Configurator.read_yaml
+    ) as read_yaml:
+        cfg1 = Configurator.load(path)
+        cfg2 = Configurator.load(path)
+
+    assert read_yaml.call_count == 1
+    # plain data, not objects
+    cached = json.loads((sample / ".finance-tools.yml.cache").read_text())
+    assert cached["data"]["categories"] == [
+        "food/restaurant",
+        "food/supermarket",
+        "food/work",
+        "gouv/tax",
+    ]
+    assert cfg2.accounts == cfg1.accounts
+    assert cfg2.category_set == cfg1.category_set
+    assert cfg2.autocomplete == cfg1.autocomplete
+    assert cfg2.root_dir == cfg1.root_dir
+
+
+def test_configurator_load_from_cache_touched(sample):
+    path = sample / "finance-tools.yml"
+    Configurator.load(path)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    # the content did not change
+    with patch.object(Configurator, "read_yaml") as read_yaml:
+        Configurator.load(path)
+    read_yaml.assert_not_called()
+
+
+def test_configurator_load_from_cache_prints_warnings(sample, capsys):
+    path = sample / "finance-tools.yml"
+    path.write_text(path.read_text().replace("    id: '12345'\n", "    id: '12345'\n    expr: x\n"))
+    warning = "Fortuneo has its own naming convention for downloaded files, you cannot overwrite it: expr='x'\n"  # noqa: E501
+
+    Configurator.load(path)
+    assert capsys.readouterr().out == warning
+
+    with patch.object(Configurator, "read_yaml") as read_yaml:
+        Configurator.load(path)
+    read_yaml.assert_not_called()
+    assert capsys.readouterr().out == warning
+
+
+def test_configurator_load_from_cache_modified(sample):
+    path = sample / "finance-tools.yml"
+    Configurator.load(path)
+    path.write_text(path.read_text().replace("food/work", "food/office"))
+
+    cfg = Configurator.load(path)
+
+    assert "food/office" in cfg.category_set
+    assert "food/work" not in cfg.category_set
+
+
+def test_configurator_load_from_corrupted_cache(sample):
+    path = sample / "finance-tools.yml"
+    (sample / ".finance-tools.yml.cache").write_bytes(b"oops")
+
+    cfg = Configurator.load(path)
+
+    assert "food/work" in cfg.category_set